@@ -0,0 +1,427 @@
+# File: analysis.py
+# Static analytics of an expanded circuit, to predict what simulating it costs.
+#
+# analyze(sim) walks the expanded assignments once as a DAG: every expression
+# object is visited a single time however often macro expansion shared it, so
+# the pass is linear in the size of the expansion even when the tree the
+# interpreter walks is exponentially larger. It reports logic depth, fanout,
+# register and node counts, and a per-step cost estimate for each engine
+# registered in backends.BACKENDS.
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from circuit_parser import Call, Concat, Number, Variable
+from simulator import Simulator
+
+# Per-step cost model of every engine in backends.BACKENDS, in nanoseconds,
+# fitted to the small and medium benchmark suites on CPython 3.11. An engine
+# pays for a number of units of work per step (nodes the interpreter
+# evaluates, lines of the generated step function, cell calls, table
+# lookups) plus a cost per input and signal for reading the stimulus and
+# recording the results. The unrolled engine pays the latter once per call
+# of k steps. The table estimate assumes a warm table, and the linear one
+# simulating step by step, as it does below linear.MIN_CHUNKED_STEPS steps or
+# when the registers are not GF(2)-linear; chunked runs cost less.
+@dataclass(frozen=True)
+class CostModel:
+    unit: str
+    ns_per_unit: float
+    ns_per_signal: float
+    per_call: bool = False      # the signal cost is paid once per call of several steps
+
+
+COST_MODELS: Dict[str, CostModel] = {
+    'interpreter': CostModel('node evaluations', 750.0, 890.0),
+    'compiled': CostModel('netlist nodes', 120.0, 300.0),
+    'hierarchical': CostModel('cell calls', 530.0, 670.0),
+    'table': CostModel('table lookup', 700.0, 20.0),
+    'unrolled': CostModel('netlist nodes', 65.0, 1900.0, per_call=True),
+    'linear': CostModel('netlist nodes', 120.0, 300.0),
+}
+
+
+@dataclass
+class StepCost:
+    """Estimated work and time of one simulated step on one engine."""
+    evaluations: int
+    unit: str
+    us: float
+
+
+# Node kinds of the shared graph; SIGNAL stands for a signal read before its
+# expression was reached (through a D register) and resolves to that node.
+_INPUT, _CONST, _NAND, _DFF, _SIGNAL = 'input', 'const', 'nand', 'd', 'signal'
+
+
+@dataclass
+class CircuitStats:
+    """Structure and cost figures of one expanded circuit."""
+    signals: int
+    inputs: int
+    registers: int                 # distinct D registers
+    nand_gates: int                # distinct NAND gates
+    expanded_nodes: int            # expression nodes counted as a tree
+    dag_nodes: int                 # distinct expression objects after expansion
+    netlist_nodes: int             # nodes left after structural hashing (the compiled netlist)
+    depth: int                     # NAND levels on the longest combinational path
+    critical_path: List[str] = field(default_factory=list)
+    output_depths: Dict[str, int] = field(default_factory=dict)
+    fanout: Dict[int, int] = field(default_factory=dict)       # fanout -> number of nodes
+    top_fanout: List[Tuple[str, int]] = field(default_factory=list)
+    costs: Dict[str, StepCost] = field(default_factory=dict)
+    unestimated: Dict[str, str] = field(default_factory=dict)  # engine -> why it has no estimate
+    combinational_loop: bool = False
+
+    @property
+    def evaluations(self) -> Dict[str, int]:
+        """Units of work per simulated step for each engine."""
+        return {engine: cost.evaluations for engine, cost in self.costs.items()}
+
+    @property
+    def step_us(self) -> Dict[str, float]:
+        """Estimated microseconds per simulated step for each engine."""
+        return {engine: cost.us for engine, cost in self.costs.items()}
+
+    @property
+    def max_fanout(self) -> int:
+        return max(self.fanout, default=0)
+
+    def to_dict(self) -> dict:
+        return {
+            'signals': self.signals,
+            'inputs': self.inputs,
+            'registers': self.registers,
+            'nand_gates': self.nand_gates,
+            'expanded_nodes': self.expanded_nodes,
+            'dag_nodes': self.dag_nodes,
+            'netlist_nodes': self.netlist_nodes,
+            'depth': self.depth,
+            'critical_path': self.critical_path,
+            'output_depths': self.output_depths,
+            'fanout': self.fanout,
+            'top_fanout': self.top_fanout,
+            'evaluations': self.evaluations,
+            'step_us': self.step_us,
+            'unestimated': self.unestimated,
+            'combinational_loop': self.combinational_loop,
+        }
+
+    def format_report(self, steps: Optional[int] = None, max_listed: int = 10) -> str:
+        lines = [
+            f"Signals: {self.signals}, inputs: {self.inputs}, D registers: {self.registers}, "
+            f"NAND gates: {self.nand_gates}",
+            f"Nodes: {self.expanded_nodes} expanded as a tree, {self.dag_nodes} in the expanded DAG, "
+            f"{self.netlist_nodes} in the netlist after structural hashing",
+            f"Logic depth: {self.depth} NAND levels"
+            + (f" ({' -> '.join(self.critical_path)})" if self.critical_path else ""),
+        ]
+        if self.combinational_loop:
+            lines.append("  Combinational loop: depths of the signals on it are not counted")
+        deepest = sorted(self.output_depths.items(), key=lambda item: (-item[1], item[0]))
+        listed = ", ".join(f"{name}={depth}" for name, depth in deepest[:max_listed])
+        more = f" (+{len(deepest) - max_listed} more)" if len(deepest) > max_listed else ""
+        lines.append(f"  Per signal: {listed}{more}")
+
+        buckets: Dict[str, int] = {}
+        for fanout, count in sorted(self.fanout.items()):
+            # 0, 1, 2, 3-4, 5-8, 9-16, ...
+            low = 1 << ((fanout - 1).bit_length() - 1) if fanout > 2 else 0
+            label = f"{low + 1}-{low * 2}" if low else str(fanout)
+            buckets[label] = buckets.get(label, 0) + count
+        lines.append("Fanout: " + ", ".join(f"{label}: {count}" for label, count in buckets.items()))
+        if self.top_fanout:
+            lines.append("  Highest: " + ", ".join(f"{label} ({fanout})" for label, fanout in self.top_fanout))
+
+        lines.append("Estimated cost per step:")
+        for engine, cost in self.costs.items():
+            total = f", {cost.us * steps / 1e6:.3g} s for {steps} steps" if steps else ""
+            lines.append(f"  {engine:<12} {cost.evaluations} {cost.unit}, ~{cost.us:.3g} us{total}")
+        for engine, reason in self.unestimated.items():
+            lines.append(f"  {engine:<12} no estimate: {reason}")
+        return "\n".join(lines)
+
+
+def _tree_sizes(expanded: Dict[str, object]) -> Tuple[int, int, int]:
+    """
+    Tree size of all expressions, nodes the interpreter evaluates per step
+    (a D reads its expression, not its default, after the first step) and
+    the number of distinct expression objects.
+    """
+    sizes: Dict[int, Tuple[int, int]] = {}
+    for root in expanded.values():
+        stack = [(root, False)]
+        while stack:
+            expr, ready = stack.pop()
+            if id(expr) in sizes:
+                continue
+            children = expr.args if isinstance(expr, Call) else expr.parts if isinstance(expr, Concat) else ()
+            if children and not ready:
+                stack.append((expr, True))
+                stack.extend((child, False) for child in children)
+                continue
+            full = 1 + sum(sizes[id(child)][0] for child in children)
+            if isinstance(expr, Call) and expr.name == 'D':
+                step = 1 + sizes[id(children[0])][1]
+            else:
+                step = 1 + sum(sizes[id(child)][1] for child in children)
+            sizes[id(expr)] = (full, step)
+    full = sum(sizes[id(root)][0] for root in expanded.values())
+    step = sum(sizes[id(root)][1] for root in expanded.values())
+    return full, step, len(sizes)
+
+
+def _macro_calls(circuit) -> int:
+    """Macro calls in the top-level assignments: the cells the hierarchical engine calls per step."""
+    calls, stack = 0, [a.expression for a in circuit.assignments.values()]
+    while stack:
+        expr = stack.pop()
+        if isinstance(expr, Call):
+            calls += expr.name in circuit.macros
+            stack.extend(expr.args)
+        elif isinstance(expr, Concat):
+            stack.extend(expr.parts)
+    return calls
+
+
+def _step_costs(sim: Simulator, interpreter_nodes: int, netlist_nodes: int, signals: int,
+                inputs: int, registers: int) -> Tuple[Dict[str, StepCost], Dict[str, str]]:
+    """Per-step cost estimate of every registered engine, and the reason for each one left out."""
+    from backends import BACKENDS
+    from transition_table import MAX_KEY_BITS
+    from unroll import DEFAULT_MAX_NODES, MAX_FRAMES
+    frames = min(MAX_FRAMES, max(1, DEFAULT_MAX_NODES // max(netlist_nodes, 1)))
+    counts = {
+        'node evaluations': interpreter_nodes,
+        'netlist nodes': netlist_nodes,
+        'cell calls': _macro_calls(sim.circuit),
+        'table lookup': 1,
+    }
+    costs: Dict[str, StepCost] = {}
+    unestimated: Dict[str, str] = {}
+    for engine in BACKENDS:
+        model = COST_MODELS.get(engine)
+        if model is None:
+            unestimated[engine] = "no cost model for this engine"
+            continue
+        if engine == 'hierarchical' and sim.circuit.widths:
+            unestimated[engine] = "the engine does not support buses"
+            continue
+        unit = model.unit
+        if engine == 'table' and registers + inputs > MAX_KEY_BITS:
+            # Too many key bits to tabulate: simulated gate by gate
+            model = COST_MODELS['compiled']
+            unit = f"{model.unit}, too many state and input bits to tabulate"
+        per_call = frames if model.per_call else 1
+        if model.per_call:
+            unit = f"{unit}, {frames} steps per call"
+        count = counts[model.unit]
+        us = (count * model.ns_per_unit + (signals + inputs) * model.ns_per_signal / per_call) / 1000
+        costs[engine] = StepCost(count, unit, us)
+    return costs, unestimated
+
+
+class _SharedGraph:
+    """Structurally hashed single-bit graph of the expanded circuit, built in one pass."""
+    def __init__(self, expanded: Dict[str, object], schedule: List[str]):
+        self.kinds: List[str] = []
+        self.fanins: List[tuple] = []
+        self.names: List[str] = []      # input or signal name, else the signal built for
+        self.roots: Dict[str, int] = {}
+        self._table: Dict[tuple, int] = {}
+        self._memo: Dict[int, int] = {}
+        # Registers are told apart by the shape of their expression, with
+        # signals by name, as in the compiled netlist
+        self._shapes: Dict[tuple, int] = {}
+        self._shape: Dict[int, int] = {}
+        self._expanded = expanded
+        for target in schedule:
+            self._owner = target
+            self.roots[target] = self._build(expanded[target])
+
+    def _add(self, kind: str, fanins: tuple, name: str, key: tuple = None) -> int:
+        key = key or ((kind,) + fanins if kind == _NAND else (kind, name))
+        node = self._table.get(key)
+        if node is None:
+            node = self._table[key] = len(self.kinds)
+            self.kinds.append(kind)
+            self.fanins.append(fanins)
+            self.names.append(name)
+        return node
+
+    def _build(self, root) -> int:
+        memo, stack = self._memo, [(root, False)]
+        while stack:
+            expr, ready = stack.pop()
+            if id(expr) in memo:
+                continue
+            if isinstance(expr, Call) and not ready:
+                stack.append((expr, True))
+                stack.extend((arg, False) for arg in expr.args)
+                continue
+            self._shape[id(expr)] = self._shapes.setdefault(
+                self._shape_key(expr), len(self._shapes))
+            if isinstance(expr, Number):
+                memo[id(expr)] = self._add(_CONST, (), str(expr.value))
+            elif isinstance(expr, Variable):
+                if expr.name not in self._expanded:
+                    memo[id(expr)] = self._add(_INPUT, (), expr.name)
+                elif expr.name in self.roots:
+                    memo[id(expr)] = self.roots[expr.name]
+                else:
+                    memo[id(expr)] = self._add(_SIGNAL, (), expr.name)
+            elif isinstance(expr, Call):
+                a, b = memo[id(expr.args[0])], memo[id(expr.args[1])]
+                if expr.name == 'D':
+                    key = (_DFF, self._shape[id(expr.args[0])], b)
+                    memo[id(expr)] = self._add(_DFF, (a, b), self._owner, key)
+                else:
+                    memo[id(expr)] = self._add(_NAND, (min(a, b), max(a, b)), self._owner)
+        return memo[id(root)]
+
+    def _shape_key(self, expr) -> tuple:
+        if isinstance(expr, Number):
+            return ('n', expr.value)
+        if isinstance(expr, Variable):
+            return ('v', expr.name)
+        if isinstance(expr, Call):
+            if expr.name not in ('NAND', 'Nand', 'D') or len(expr.args) != 2:
+                raise ValueError(f"Cannot analyze call of '{expr.name}' with {len(expr.args)} arguments.")
+            return (expr.name,) + tuple(self._shape[id(arg)] for arg in expr.args)
+        raise TypeError(f"Unknown expression type during analysis: {type(expr)}")
+
+    def resolve(self, node: int) -> int:
+        """The node a forward signal reference stands for."""
+        seen = set()
+        while self.kinds[node] == _SIGNAL and node not in seen:
+            seen.add(node)
+            node = self.roots.get(self.names[node], node)
+        return node
+
+    def label(self, node: int, signal_of: Dict[int, str]) -> str:
+        if node in signal_of:
+            return signal_of[node]
+        if self.kinds[node] == _INPUT:
+            return self.names[node]
+        return f"{self.names[node]}/{'D' if self.kinds[node] == _DFF else 'NAND'}#{node}"
+
+
+def _depths(graph: _SharedGraph, schedule: List[str], signal_of: Dict[int, str]):
+    """
+    NAND levels from the last register or input to every node, computed on
+    demand with an explicit stack. A D output starts a new path; its
+    expression is an endpoint of the path ending there. Also returns, per
+    node, the signal or input its deepest path comes through and whether a
+    combinational loop was found.
+    """
+    depth: List[Optional[int]] = [None] * len(graph.kinds)
+    via: List[Optional[str]] = [None] * len(graph.kinds)
+    on_stack = [False] * len(graph.kinds)
+    loop = False
+
+    def fanins(node):
+        kind = graph.kinds[node]
+        if kind == _NAND:
+            return graph.fanins[node]
+        if kind == _SIGNAL:
+            resolved = graph.resolve(node)
+            return (resolved,) if resolved != node else ()
+        return ()
+
+    def visit(start: int) -> int:
+        nonlocal loop
+        stack = [start]
+        while stack:
+            node = stack[-1]
+            if depth[node] is not None:
+                stack.pop()
+                continue
+            pending = [f for f in fanins(node) if depth[f] is None]
+            if pending and not on_stack[node]:
+                on_stack[node] = True
+                for f in pending:
+                    if on_stack[f]:
+                        loop = True
+                    else:
+                        stack.append(f)
+                continue
+            stack.pop()
+            on_stack[node] = False
+            kind = graph.kinds[node]
+            if kind == _NAND:
+                a, b = (depth[f] or 0 for f in graph.fanins[node])
+                deeper = graph.fanins[node][0 if a >= b else 1]
+                depth[node], via[node] = 1 + max(a, b), signal_of.get(deeper, via[deeper])
+            elif kind == _SIGNAL:
+                resolved = fanins(node)
+                depth[node] = depth[resolved[0]] or 0 if resolved else 0
+                via[node] = graph.names[node]
+            else:
+                depth[node] = 0
+                via[node] = graph.names[node] if kind == _INPUT else None
+        return depth[start]
+
+    for target in schedule:
+        visit(graph.roots[target])
+    for node, kind in enumerate(graph.kinds):
+        if kind == _DFF:
+            visit(graph.fanins[node][0])
+    return depth, via, loop
+
+
+def analyze(sim: Simulator) -> CircuitStats:
+    """Analytics of a simulator's expanded circuit, in time linear in its DAG size."""
+    expanded_nodes, interpreter_nodes, dag_nodes = _tree_sizes(sim.expanded_assignments)
+    expanded, schedule = sim.bit_level()
+    graph = _SharedGraph(expanded, schedule)
+    signal_of: Dict[int, str] = {}
+    for name in schedule:
+        signal_of.setdefault(graph.resolve(graph.roots[name]), name)
+
+    fanout = [0] * len(graph.kinds)
+    for node, kind in enumerate(graph.kinds):
+        for fanin in graph.fanins[node]:
+            fanout[graph.resolve(fanin)] += 1
+    histogram: Dict[int, int] = {}
+    real = [node for node, kind in enumerate(graph.kinds) if kind in (_INPUT, _NAND, _DFF)]
+    for node in real:
+        histogram[fanout[node]] = histogram.get(fanout[node], 0) + 1
+    top = sorted(real, key=lambda node: -fanout[node])[:5]
+
+    depth, via, loop = _depths(graph, schedule, signal_of)
+    endpoints = [(depth[graph.roots[name]], name, graph.roots[name]) for name in schedule]
+    endpoints += [(depth[graph.fanins[node][0]], f"D@{graph.label(node, signal_of)}", graph.fanins[node][0])
+                  for node, kind in enumerate(graph.kinds) if kind == _DFF]
+    critical_path: List[str] = []
+    if endpoints:
+        longest, end, node = max(endpoints, key=lambda endpoint: endpoint[0])
+        critical_path, seen = [end], {end}
+        name = via[node] if end in graph.roots else signal_of.get(graph.resolve(node), via[node])
+        while name is not None and name not in seen:
+            seen.add(name)
+            critical_path.append(name)
+            name = via[graph.resolve(graph.roots[name])] if name in graph.roots else None
+        critical_path.reverse()
+        if len(critical_path) == 1 and longest == 0:
+            critical_path = []
+
+    netlist_nodes = sum(1 for kind in graph.kinds if kind != _SIGNAL)
+    inputs, registers = graph.kinds.count(_INPUT), graph.kinds.count(_DFF)
+    costs, unestimated = _step_costs(sim, interpreter_nodes, netlist_nodes, len(expanded), inputs, registers)
+    return CircuitStats(
+        signals=len(expanded),
+        inputs=inputs,
+        registers=registers,
+        nand_gates=graph.kinds.count(_NAND),
+        expanded_nodes=expanded_nodes,
+        dag_nodes=dag_nodes,
+        netlist_nodes=netlist_nodes,
+        depth=max((endpoint[0] for endpoint in endpoints), default=0),
+        critical_path=critical_path,
+        output_depths={name: depth[graph.roots[name]] for name in schedule},
+        fanout=dict(sorted(histogram.items())),
+        top_fanout=[(graph.label(node, signal_of), fanout[node]) for node in top if fanout[node] > 1],
+        costs=costs,
+        unestimated=unestimated,
+        combinational_loop=loop,
+    )
@@ -0,0 +1,274 @@
+# File: backends.py
+# The simulation engines behind main.py and the scoring framework.
+#
+# Every engine builds from a parsed circuit and offers the interface of
+# Simulator: run(inputs, num_steps, sinks=(), record=True, coverage=None)
+# returning the '0'/'1' sequence of every assigned signal. Engines with a
+# `batch` flag also simulate many cases at once with run_packed (see
+# netlist.pack_lanes). New engines are added with register_backend.
+#
+# create_simulator(circuit, 'auto', steps, batch) picks an engine from the
+# circuit's properties (size, logic depth, D registers, feedback through D,
+# linearity) and the workload (steps, cases at once); cross_check() runs the
+# same stimulus through several engines and reports where they disagree.
+#
+# Engine modules are imported by their factories, so the registry loads
+# only the engines actually built.
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from circuit_parser import Circuit
+from simulator import Simulator
+
+AUTO = 'auto'
+
+# Compiling costs about as much as 10-15 interpreted steps of the same
+# circuit, so shorter runs are interpreted
+COMPILE_BREAK_EVEN_STEPS = 16
+# A transition table pays off once the average (state, inputs) key recurs
+TABLE_MIN_VISITS = 4
+# Unrolling costs about as much as compiling 30-60 copies of the circuit
+UNROLL_MIN_STEPS = 16384
+
+
+@dataclass
+class Backend:
+    name: str
+    factory: Callable[..., object]      # (circuit, profile=..., simulator=...) -> engine
+    description: str
+    batch: bool = False                 # has run_packed
+    reuses_simulator: bool = True       # accepts an already expanded Simulator
+
+
+BACKENDS: Dict[str, Backend] = {}
+
+
+def register_backend(backend: Backend) -> None:
+    """Adds an engine, or replaces the one of the same name."""
+    if backend.name == AUTO:
+        raise ValueError(f"'{AUTO}' is reserved for automatic selection")
+    BACKENDS[backend.name] = backend
+
+
+def _interpreter(circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None) -> Simulator:
+    return simulator if simulator is not None else Simulator(circuit, profile=profile)
+
+
+def _compiled(circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+    from netlist import CompiledSimulator
+    return CompiledSimulator(circuit, profile=profile, simulator=simulator)
+
+
+def _hierarchical(circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+    from hierarchy import HierarchicalSimulator
+    return HierarchicalSimulator(circuit, profile=profile)
+
+
+def _table(circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+    from transition_table import TransitionTableSimulator
+    return TransitionTableSimulator(circuit, profile=profile, simulator=simulator)
+
+
+def _unrolled(circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+    from unroll import UnrolledSimulator
+    return UnrolledSimulator(circuit, profile=profile, simulator=simulator)
+
+
+def _linear(circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+    from linear import LinearSimulator
+    return LinearSimulator(circuit, profile=profile, simulator=simulator)
+
+
+register_backend(Backend('interpreter', _interpreter,
+                         "Recursive evaluation of the expanded expressions; profiling counters"))
+register_backend(Backend('compiled', _compiled,
+                         "Generated straight-line Python over the NAND/D netlist", batch=True))
+register_backend(Backend('hierarchical', _hierarchical,
+                         "Each macro compiled once into a cell; no buses", batch=True, reuses_simulator=False))
+register_backend(Backend('table', _table,
+                         "Lookup of (D state, inputs) -> (next state, outputs), filled on first use", batch=True))
+register_backend(Backend('unrolled', _unrolled,
+                         "Netlist unrolled over up to 64 steps per call, hash-consed and simplified", batch=True))
+register_backend(Backend('linear', _linear,
+                         "Time-parallel chunks and O(log T) jumps for GF(2)-linear registers", batch=True))
+
+
+def engine_names() -> List[str]:
+    return [AUTO] + list(BACKENDS)
+
+
+@dataclass
+class CircuitProperties:
+    nodes: int                  # netlist nodes after structural hashing
+    nand_gates: int
+    registers: int
+    inputs: int
+    depth: int                  # NAND gates on the longest combinational path
+    feedback: bool              # some D register depends on itself through other registers
+    linear: bool                # the register update is GF(2)-affine (see linear.py)
+
+    @property
+    def key_bits(self) -> int:
+        """Bits of a transition-table key: register state plus inputs."""
+        return self.registers + self.inputs
+
+
+def circuit_properties(sim: Simulator) -> CircuitProperties:
+    """Properties of an expanded circuit that the engine choice depends on."""
+    from linear import extract_linear
+    from netlist import DFF, NAND, compile_netlist
+    netlist = compile_netlist(sim)
+    depth: List[int] = []
+    support: List[int] = []     # per node, bit r set if it reads register r in the same step
+    register_bit = {node: 1 << r for r, node in enumerate(netlist.registers)}
+    for node_id, node in enumerate(netlist.nodes):
+        if node[0] == NAND:
+            depth.append(1 + max(depth[node[1]], depth[node[2]]))
+            support.append(support[node[1]] | support[node[2]])
+        else:
+            depth.append(0)
+            support.append(register_bit.get(node_id, 0) if node[0] == DFF else 0)
+    # Feedback: a cycle in the graph of which registers each register's next value reads
+    reads = [support[netlist.nodes[node][1]] for node in netlist.registers]
+    closure = list(reads)
+    changed = True
+    while changed:
+        changed = False
+        for r, reached in enumerate(closure):
+            extended = reached
+            pending = reached
+            while pending:
+                low = pending & -pending
+                extended |= reads[low.bit_length() - 1]
+                pending ^= low
+            if extended != reached:
+                closure[r] = extended
+                changed = True
+    return CircuitProperties(
+        nodes=len(netlist.nodes),
+        nand_gates=sum(1 for node in netlist.nodes if node[0] == NAND),
+        registers=len(netlist.registers),
+        inputs=len(netlist.inputs),
+        depth=max(depth, default=0),
+        feedback=any((reached >> r) & 1 for r, reached in enumerate(closure)),
+        linear=bool(netlist.registers) and extract_linear(netlist) is not None,
+    )
+
+
+def select_engine(properties: Optional[CircuitProperties], steps: int, batch: int = 1,
+                  profile: bool = False) -> Tuple[str, str]:
+    """
+    (engine name, reason) for a workload of `batch` cases of `steps` steps.
+    `properties` may be None when needs_properties() says so.
+    """
+    if profile:
+        return 'interpreter', "profiling counters come from the interpreter"
+    if batch > 1:
+        return 'compiled', f"{batch} cases simulated bit-parallel"
+    if steps < COMPILE_BREAK_EVEN_STEPS:
+        return 'interpreter', f"{steps} steps do not repay compiling"
+    from linear import MIN_CHUNKED_STEPS
+    from transition_table import MAX_KEY_BITS
+    if properties.linear and steps >= MIN_CHUNKED_STEPS:
+        return 'linear', f"GF(2)-linear registers, {steps} steps simulated in parallel chunks"
+    if properties.key_bits <= MAX_KEY_BITS and steps >= TABLE_MIN_VISITS << properties.key_bits:
+        state = f"{properties.registers} registers" + (" with feedback" if properties.feedback else "")
+        return 'table', (f"{state} and {properties.inputs} inputs: "
+                         f"{steps} steps revisit the {1 << properties.key_bits} table keys")
+    if steps >= UNROLL_MIN_STEPS:
+        return 'unrolled', f"{steps} steps amortize unrolling several steps per call"
+    return 'compiled', f"{properties.nodes} nodes, logic depth {properties.depth}, over {steps} steps"
+
+
+def needs_properties(steps: int, batch: int = 1, profile: bool = False) -> bool:
+    """Whether select_engine looks at the circuit for this workload; short runs skip compiling it."""
+    return not profile and batch <= 1 and steps >= COMPILE_BREAK_EVEN_STEPS
+
+
+def create_simulator(circuit: Circuit, engine: str = AUTO, steps: int = 0, batch: int = 1,
+                     profile: bool = False):
+    """An engine for `circuit`: the named one, or the one select_engine picks (its name is in `.engine`)."""
+    if engine != AUTO and engine not in BACKENDS:
+        raise ValueError(f"Unknown engine '{engine}'. Choose from: {', '.join(engine_names())}")
+    simulator = None
+    reason = "requested"
+    if engine == AUTO:
+        simulator = Simulator(circuit, profile=profile)
+        properties = circuit_properties(simulator) if needs_properties(steps, batch, profile) else None
+        engine, reason = select_engine(properties, steps, batch, profile)
+    backend = BACKENDS[engine]
+    if simulator is not None and backend.reuses_simulator:
+        sim = backend.factory(circuit, profile=profile, simulator=simulator)
+    else:
+        sim = backend.factory(circuit, profile=profile)
+    sim.engine, sim.engine_reason = engine, reason
+    return sim
+
+
+def run_packed(sim, packed_inputs: Dict[str, List[int]], num_steps: int, lanes: int,
+               coverage=None) -> Dict[str, List[int]]:
+    """run_packed on any engine: scalar engines simulate the lanes one at a time."""
+    from netlist import pack_lanes, unpack_lanes
+    if hasattr(sim, 'run_packed'):
+        return sim.run_packed(packed_inputs, num_steps, lanes, coverage=coverage)
+    cases = unpack_lanes(packed_inputs, lanes)
+    results = [sim.run(case, num_steps, coverage=coverage) for case in cases]
+    return pack_lanes(results, list(results[0]) if results else [], num_steps)
+
+
+@dataclass
+class Mismatch:
+    engine: str
+    signal: str
+    step: int
+    expected: str           # the reference engine's value
+    actual: str
+
+
+@dataclass
+class CrossCheckReport:
+    reference: str
+    agreeing: List[str] = field(default_factory=list)
+    mismatches: List[Mismatch] = field(default_factory=list)
+    skipped: Dict[str, str] = field(default_factory=dict)   # engine -> why it could not run
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches
+
+    def format_report(self) -> str:
+        lines = [f"Cross-check against {self.reference}: "
+                 + (f"{', '.join(self.agreeing)} agree" if self.agreeing else "no other engine ran")]
+        for m in self.mismatches:
+            lines.append(f"  MISMATCH {m.engine}: {m.signal} at step {m.step} is {m.actual}, "
+                         f"{self.reference} gives {m.expected}")
+        for name, why in self.skipped.items():
+            lines.append(f"  skipped {name}: {why}")
+        return "\n".join(lines)
+
+
+def cross_check(circuit: Circuit, inputs: Dict[str, str], num_steps: int,
+                engines: Optional[List[str]] = None, reference: str = 'interpreter') -> CrossCheckReport:
+    """Runs the same stimulus on `engines` (default: all) and compares every signal with `reference`."""
+    report = CrossCheckReport(reference)
+    expected = create_simulator(circuit, reference).run(inputs, num_steps)
+    for name in engines or list(BACKENDS):
+        if name == reference:
+            continue
+        try:
+            actual = create_simulator(circuit, name).run(inputs, num_steps)
+        except (RuntimeError, ValueError, TypeError) as e:
+            report.skipped[name] = str(e)
+            continue
+        differences = []
+        for signal, want in expected.items():
+            got = actual.get(signal, '')
+            if got != want:
+                step = next((t for t, (a, b) in enumerate(zip(got, want)) if a != b), min(len(got), len(want)))
+                differences.append(Mismatch(name, signal, step, want[step:step + 1] or '-', got[step:step + 1] or '-'))
+        if differences:
+            report.mismatches.append(min(differences, key=lambda m: m.step))
+        else:
+            report.agreeing.append(name)
+    return report
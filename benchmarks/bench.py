@@ -0,0 +1,229 @@
+# File: benchmarks/bench.py
+# Benchmark runner: measures parse, expansion and per-step simulation time
+# plus peak memory for every available engine, and compares against a
+# saved JSON baseline.
+#
+# Usage:
+#   python -m benchmarks.bench --suite small --save-baseline baseline.json
+#   python -m benchmarks.bench --suite small --baseline baseline.json --threshold 0.25
+#   python -m benchmarks.bench --startup --max-startup-ms 100
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+# Allow running as a script from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import BACKENDS, create_simulator
+from circuit_parser import parse_file
+from benchmarks.circuits import BenchmarkCase, SUITES, build_suite
+
+# Metrics compared against the baseline; all are "lower is better".
+TIMED_METRICS = ('parse_s', 'expand_s', 'step_us', 'startup_ms')
+
+# Results key of the cold-start measurements (see measure_startup)
+STARTUP = 'startup'
+
+
+def measure(case: BenchmarkCase, engine: str, repeat: int = 3) -> Dict[str, float]:
+    """
+    Benchmarks one case on one engine. Times are the best of `repeat` runs;
+    peak memory is measured in a separate traced run so tracing does not
+    distort the timings. An engine that cannot build the circuit gets
+    {'skipped': reason}.
+    """
+    with tempfile.NamedTemporaryFile('w', suffix='.cir', delete=False) as f:
+        f.write(case.source)
+        path = f.name
+    try:
+        parse_s = expand_s = run_s = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            circuit = parse_file(path)
+            parse_s = min(parse_s, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            try:
+                sim = create_simulator(circuit, engine)
+            except (RuntimeError, ValueError, TypeError) as e:
+                return {'skipped': str(e)}
+            expand_s = min(expand_s, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            sim.run(case.inputs, case.steps)
+            run_s = min(run_s, time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            create_simulator(parse_file(path), engine).run(case.inputs, case.steps)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        os.unlink(path)
+
+    return {
+        'parse_s': parse_s,
+        'expand_s': expand_s,
+        'step_us': run_s / case.steps * 1e6,
+        'peak_kib': peak / 1024,
+    }
+
+
+def _best_wall_ms(command: List[str], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure_startup(repeat: int = 5) -> Dict[str, dict]:
+    """
+    Cold-start wall time of a one-shot CLI run (parse, simulate and print
+    a small circuit in a fresh interpreter), from the source tree and from
+    the prebuilt bundle. 'startup_ms' is the time beyond starting a bare
+    interpreter, which is reported as 'python'.
+    """
+    from bundle import build_bundle
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        circuit = os.path.join(tmp, 'toggle.cir')
+        with open(circuit, 'w') as f:
+            f.write("Q = NAND(I, D(Q, 0))\n")
+        args = [circuit, '-i', 'I=0110']
+        bundle = build_bundle(os.path.join(tmp, 'logicsim.pyz'))
+        bare = _best_wall_ms([sys.executable, '-c', 'pass'], repeat)
+        commands = {
+            'source': [sys.executable, os.path.join(root, 'main.py')] + args,
+            'bundle': [sys.executable, bundle] + args,
+        }
+        results = {'python': {'wall_ms': bare}}
+        for name, command in commands.items():
+            wall = _best_wall_ms(command, repeat)
+            results[name] = {'wall_ms': wall, 'startup_ms': wall - bare}
+    return results
+
+
+def format_startup(startup: Dict[str, dict]) -> str:
+    lines = [f"{'startup':<18} {'wall ms':>10} {'beyond python ms':>18}"]
+    for name, m in startup.items():
+        beyond = f"{m['startup_ms']:18.1f}" if 'startup_ms' in m else f"{'':>18}"
+        lines.append(f"{name:<18} {m['wall_ms']:10.1f} {beyond}")
+    return "\n".join(lines)
+
+
+def run_suite(cases: List[BenchmarkCase], engines: Optional[List[str]] = None,
+              repeat: int = 3) -> Dict[str, Dict[str, dict]]:
+    """Returns results as {case name: {engine name: metrics}}; `engines` defaults to every backend."""
+    results = {}
+    for case in cases:
+        results[case.name] = {}
+        for engine in engines or list(BACKENDS):
+            results[case.name][engine] = measure(case, engine, repeat)
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Dict[str, dict]],
+                        baseline: Dict[str, Dict[str, dict]],
+                        threshold: float) -> List[str]:
+    """
+    Lists every timed metric that is more than `threshold` (a fraction,
+    e.g. 0.25 for 25%) slower than in the baseline. Cases or engines absent
+    from the baseline are ignored.
+    """
+    regressions = []
+    for case_name, engines in results.items():
+        for engine, metrics in engines.items():
+            base = baseline.get(case_name, {}).get(engine)
+            if not base:
+                continue
+            for metric in TIMED_METRICS:
+                old, new = base.get(metric), metrics.get(metric)
+                if old and new is not None and new > old * (1 + threshold):
+                    regressions.append(
+                        f"{case_name}/{engine}: {metric} {old:.6g} -> {new:.6g} "
+                        f"(+{(new / old - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def format_results(results: Dict[str, Dict[str, dict]]) -> str:
+    lines = [f"{'case':<18} {'engine':<12} {'parse ms':>10} {'expand ms':>10} "
+             f"{'step us':>10} {'peak KiB':>10}"]
+    for case_name, engines in results.items():
+        if case_name == STARTUP:
+            continue
+        for engine, m in engines.items():
+            if 'skipped' in m:
+                lines.append(f"{case_name:<18} {engine:<12} skipped: {m['skipped']}")
+                continue
+            lines.append(f"{case_name:<18} {engine:<12} {m['parse_s'] * 1000:10.2f} "
+                         f"{m['expand_s'] * 1000:10.2f} {m['step_us']:10.1f} {m['peak_kib']:10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the logic simulator on generated circuits.")
+    parser.add_argument('--suite', choices=sorted(SUITES), default='small',
+                        help='Circuit sizes to benchmark (default: small)')
+    parser.add_argument('--steps', type=int, default=64,
+                        help='Simulation steps per case (default: 64)')
+    parser.add_argument('--engine', action='append', choices=sorted(BACKENDS),
+                        help='Engine to benchmark; can be repeated (default: every registered backend)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timing repetitions; the best is kept (default: 3)')
+    parser.add_argument('--save-baseline', metavar='PATH',
+                        help='Write the results as a JSON baseline')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='Compare against a JSON baseline and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown before a metric counts as a regression (default: 0.25)')
+    parser.add_argument('--startup', action='store_true',
+                        help='Also measure the cold start of one-shot CLI runs')
+    parser.add_argument('--max-startup-ms', type=float, metavar='MS',
+                        help='Fail if the bundle needs more than MS beyond a bare interpreter start '
+                        '(implies --startup)')
+    args = parser.parse_args(argv)
+
+    results = run_suite(build_suite(args.suite, args.steps), args.engine, args.repeat)
+    print(format_results(results))
+
+    status = 0
+    if args.startup or args.max_startup_ms is not None:
+        results[STARTUP] = measure_startup(max(args.repeat, 5))
+        print()
+        print(format_startup(results[STARTUP]))
+        startup_ms = results[STARTUP]['bundle']['startup_ms']
+        if args.max_startup_ms is not None and startup_ms > args.max_startup_ms:
+            print(f"\nBundle startup {startup_ms:.1f} ms exceeds {args.max_startup_ms:g} ms.")
+            status = 1
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# File: benchmarks/circuits.py
+# Parameterized generators for scalable benchmark circuits.
+#
+# Each generator returns a BenchmarkCase holding .cir source text plus a
+# seeded stimulus, so every engine is measured on exactly the same work.
+
+import random
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Standard gates built from NAND, shared by all generated circuits.
+GATE_MACROS = """\
+NOT(x)      := NAND(x, x)
+AND(x,y)    := NOT(NAND(x, y))
+OR(x,y)     := NAND(NOT(x), NOT(y))
+XOR(x,y)    := NAND(NAND(x, NAND(x, y)), NAND(y, NAND(x, y)))
+"""
+
+
+@dataclass
+class BenchmarkCase:
+    """A generated circuit together with the stimulus used to benchmark it."""
+    name: str
+    source: str
+    inputs: Dict[str, str]
+    steps: int
+
+
+def random_inputs(names: List[str], steps: int, seed: int = 0) -> Dict[str, str]:
+    """Seeded random bit sequences of length `steps` for each signal."""
+    rng = random.Random(seed)
+    return {name: "".join(rng.choice("01") for _ in range(steps)) for name in names}
+
+
+def ripple_carry_adder(bits: int, steps: int = 64, seed: int = 0) -> BenchmarkCase:
+    """N-bit adder S = A + B built from full adders; S<bits> is the carry out."""
+    lines = [GATE_MACROS,
+             "SUM(a,b,c)   := XOR(XOR(a, b), c)",
+             "CARRY(a,b,c) := OR(AND(a, b), AND(c, XOR(a, b)))",
+             ""]
+    carry = "0"
+    for i in range(bits):
+        lines.append(f"S{i} = SUM(A{i}, B{i}, {carry})")
+        lines.append(f"C{i} = CARRY(A{i}, B{i}, {carry})")
+        carry = f"C{i}"
+    lines.append(f"S{bits} = NOT(NOT({carry}))")
+    names = [f"A{i}" for i in range(bits)] + [f"B{i}" for i in range(bits)]
+    return BenchmarkCase(f"adder{bits}", "\n".join(lines) + "\n",
+                         random_inputs(names, steps, seed), steps)
+
+
+def bus_adder(bits: int, steps: int = 64, seed: int = 0) -> BenchmarkCase:
+    """
+    N-bit Kogge-Stone adder S[N-1:0] = A + B written with buses, so the
+    interpreter evaluates each prefix level as a few word operations.
+    """
+    lines = [GATE_MACROS,
+             f"G0[{bits - 1}:0] = AND(A[{bits - 1}:0], B[{bits - 1}:0])",
+             f"P0[{bits - 1}:0] = XOR(A[{bits - 1}:0], B[{bits - 1}:0])"]
+    level, span = 0, 1
+    while span < bits:
+        zeros = ", ".join(["0"] * span)
+        ones = ", ".join(["1"] * span)
+        top = bits - span - 1
+        lines.append(f"G{level + 1}[{bits - 1}:0] = OR(G{level}, AND(P{level}, {{G{level}[{top}:0], {zeros}}}))")
+        lines.append(f"P{level + 1}[{bits - 1}:0] = AND(P{level}, {{P{level}[{top}:0], {ones}}})")
+        level, span = level + 1, span * 2
+    lines.append(f"S[{bits - 1}:0] = XOR(P0, {{G{level}[{bits - 2}:0], 0}})")
+    lines.append(f"COUT = G{level}[{bits - 1}]")
+    names = [f"A[{i}]" for i in range(bits)] + [f"B[{i}]" for i in range(bits)]
+    return BenchmarkCase(f"bus_adder{bits}", "\n".join(lines) + "\n",
+                         random_inputs(names, steps, seed), steps)
+
+
+def comparator(bits: int, steps: int = 64, seed: int = 0) -> BenchmarkCase:
+    """N-bit magnitude comparator: GT = A > B and EQ = A == B (bit 0 is the LSB)."""
+    lines = [GATE_MACROS,
+             "XNOR(x,y) := NOT(XOR(x, y))",
+             ""]
+    gt, eq = "0", "1"
+    # Scan from the MSB down, keeping "greater so far" and "equal so far".
+    for i in reversed(range(bits)):
+        lines.append(f"G{i} = OR({gt}, AND({eq}, AND(A{i}, NOT(B{i}))))")
+        lines.append(f"E{i} = AND({eq}, XNOR(A{i}, B{i}))")
+        gt, eq = f"G{i}", f"E{i}"
+    lines.append(f"GT = NOT(NOT({gt}))")
+    lines.append(f"EQ = NOT(NOT({eq}))")
+    names = [f"A{i}" for i in range(bits)] + [f"B{i}" for i in range(bits)]
+    return BenchmarkCase(f"comparator{bits}", "\n".join(lines) + "\n",
+                         random_inputs(names, steps, seed), steps)
+
+
+def counter(bits: int, steps: int = 64, seed: int = 0) -> BenchmarkCase:
+    """N-bit binary counter incrementing whenever input I is 1."""
+    lines = [GATE_MACROS, ""]
+    enable = "I"
+    for i in range(bits):
+        lines.append(f"O{i} = XOR(D(O{i}, 0), {enable})")
+        if i < bits - 1:
+            lines.append(f"K{i} = AND(D(O{i}, 0), {enable})")
+            enable = f"K{i}"
+    return BenchmarkCase(f"counter{bits}", "\n".join(lines) + "\n",
+                         random_inputs(["I"], steps, seed), steps)
+
+
+def lfsr(bits: int, steps: int = 64, taps: List[int] = None) -> BenchmarkCase:
+    """Autonomous Fibonacci LFSR seeded with R1 = 1; the feedback XORs `taps`."""
+    if taps is None:
+        taps = [bits - 1, bits - 2] if bits > 2 else [bits - 1]
+    lines = [GATE_MACROS, ""]
+    feedback = f"D(R{taps[0]}, 0)"
+    for tap in taps[1:]:
+        feedback = f"XOR({feedback}, D(R{tap}, 0))"
+    lines.append(f"R0 = {feedback}")
+    for i in range(1, bits):
+        lines.append(f"R{i} = D(R{i - 1}, {1 if i == 1 else 0})")
+    return BenchmarkCase(f"lfsr{bits}", "\n".join(lines) + "\n", {}, steps)
+
+
+def xor_chain(depth: int, steps: int = 64, seed: int = 0) -> BenchmarkCase:
+    """A chain of `depth` XOR gates, each folding in the next input bit."""
+    lines = [GATE_MACROS, "X0 = NOT(NOT(I0))"]
+    for i in range(1, depth + 1):
+        lines.append(f"X{i} = XOR(X{i - 1}, I{i})")
+    names = [f"I{i}" for i in range(depth + 1)]
+    return BenchmarkCase(f"xor_chain{depth}", "\n".join(lines) + "\n",
+                         random_inputs(names, steps, seed), steps)
+
+
+def macro_nesting(depth: int, steps: int = 64, seed: int = 0) -> BenchmarkCase:
+    """
+    Macros nested `depth` levels deep, each level using the previous one
+    twice, so the expanded tree grows as 2**depth.
+    """
+    lines = [GATE_MACROS, "M0(x,y) := XOR(x, y)"]
+    for i in range(1, depth + 1):
+        lines.append(f"M{i}(x,y) := NAND(M{i - 1}(x, y), M{i - 1}(y, x))")
+    lines.append(f"Y = M{depth}(A, B)")
+    return BenchmarkCase(f"macro_nesting{depth}", "\n".join(lines) + "\n",
+                         random_inputs(["A", "B"], steps, seed), steps)
+
+
+# Benchmark suites: lists of (generator, size) pairs.
+SUITES = {
+    'small': [(ripple_carry_adder, 8), (bus_adder, 8), (comparator, 8), (counter, 8),
+              (lfsr, 16), (xor_chain, 64), (macro_nesting, 6)],
+    'medium': [(ripple_carry_adder, 32), (bus_adder, 32), (comparator, 32), (counter, 16),
+               (lfsr, 32), (xor_chain, 256), (macro_nesting, 9)],
+    'large': [(ripple_carry_adder, 64), (bus_adder, 64), (comparator, 64), (counter, 32),
+              (lfsr, 64), (xor_chain, 1024), (macro_nesting, 12)],
+}
+
+
+def build_suite(name: str, steps: int = 64) -> List[BenchmarkCase]:
+    """Instantiates every case of the named suite."""
+    return [generator(size, steps=steps) for generator, size in SUITES[name]]
@@ -0,0 +1,462 @@
+# File: builder.py
+# Building circuits from Python without going through .cir text.
+#
+# CircuitBuilder records gates in a compact IR: a list of node tuples, each
+# identified by its index, structurally hashed so that building the same
+# gate twice returns the same node. build() turns the IR into the Circuit
+# AST that parse_file would produce. A node read by one gate is inlined into
+# that gate's expression; a node read more than once, the next-state input
+# of a D register and chains deeper than MAX_INLINE_DEPTH become signals of
+# their own, named '_n<node>'. The simulators then see each shared gate once
+# and never recurse deeply.
+#
+# Macro bodies have no signals of their own, so there a shared gate is
+# passed as an argument instead: the body calls helper macros named
+# '_<macro>_<k>', and helper k takes the shared gates bound at level k as
+# parameters named '_n<node>', next to the parameters and earlier gates it
+# still needs. Expanding a call substitutes each argument once, so the
+# expansion keeps the sharing, and the text grows with the number of gates,
+# not with the number of paths through them.
+#
+#   b = CircuitBuilder()
+#   q = b.dff()                       # next state connected below
+#   b.drive(q, b.xor(q, b.input('I')))
+#   b.assign('T', q)
+#   Simulator(b.build()).run({'I': '0110'}, 4)
+#
+# format_circuit() writes any Circuit back as .cir text.
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from circuit_parser import Assignment, Call, Circuit, Concat, Import, Index, MacroDef, Number, Variable
+
+# IR node kinds:
+#   (SIGNAL, name)  an input, a macro parameter or a signal read by name
+#   (CONST, value)  (NAND, a, b)  (DFF, [next], default)  (CALL, macro, args)
+SIGNAL, CONST, NAND, DFF, CALL = 'signal', 'const', 'nand', 'd', 'call'
+
+Node = int
+
+# Inlined expressions are at most this deep; deeper gates are named
+MAX_INLINE_DEPTH = 64
+_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*\Z')
+_INTERNAL = re.compile(r'_n[0-9]+\Z')
+_HELPER = re.compile(r'_[A-Za-z0-9_]+_[0-9]+\Z')
+
+
+class CircuitBuilder:
+    """
+    Creates the signals, NAND and D gates and macro calls of a circuit as
+    nodes, validating names, references and arities as they are added.
+    """
+    def __init__(self, _macro_scope: bool = False, _macros: Optional[Dict[str, MacroDef]] = None):
+        self.nodes: List[tuple] = []
+        self._table: Dict[tuple, Node] = {}
+        self.macros: Dict[str, MacroDef] = {} if _macros is None else _macros
+        self.inputs: Dict[str, Node] = {}           # input name -> node, in declaration order
+        self.signals: Dict[str, Node] = {}          # assigned name -> node, in assignment order
+        self.imports: List[Import] = []
+        self._macro_scope = _macro_scope
+
+    def _add(self, node: tuple) -> Node:
+        existing = self._table.get(node)
+        if existing is not None:
+            return existing
+        self._table[node] = len(self.nodes)
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def _check(self, *nodes: Node) -> None:
+        for node in nodes:
+            if not isinstance(node, int) or not 0 <= node < len(self.nodes):
+                raise ValueError(f"Unknown node {node!r}: nodes come from this builder")
+
+    def _check_name(self, name: str) -> None:
+        if not _NAME.match(name) or name in ('NAND', 'D'):
+            raise ValueError(f"Invalid signal name '{name}'")
+        if _INTERNAL.match(name):
+            raise ValueError(f"Signal names of the form '_n<number>' are reserved for shared gates: '{name}'")
+
+    # --- Signals ---
+
+    def input(self, name: str) -> Node:
+        """Declares an input signal."""
+        if self._macro_scope:
+            raise ValueError("Macro bodies read their parameters, not inputs")
+        self._check_name(name)
+        if name in self.signals:
+            raise ValueError(f"Signal '{name}' is assigned and cannot be an input")
+        node = self.inputs.get(name)
+        if node is None:
+            node = self.inputs[name] = self._add((SIGNAL, name))
+        return node
+
+    def signal(self, name: str) -> Node:
+        """Reads an input or assigned signal by name; it may be assigned later (feedback through D)."""
+        self._check_name(name)
+        return self._add((SIGNAL, name))
+
+    def const(self, value: int) -> Node:
+        if value not in (0, 1):
+            raise ValueError(f"Constants are 0 or 1, not {value!r}")
+        return self._add((CONST, value))
+
+    def assign(self, name: str, node: Node) -> Node:
+        """Names a node as an output signal, as `name = ...` does in a .cir file."""
+        if self._macro_scope:
+            raise ValueError("Macro bodies cannot assign signals")
+        self._check(node)
+        self._check_name(name)
+        if name in self.signals:
+            raise ValueError(f"Signal '{name}' is defined more than once.")
+        if name in self.inputs:
+            raise ValueError(f"Signal '{name}' is an input and cannot be assigned")
+        self.signals[name] = node
+        return node
+
+    # --- Gates ---
+
+    def nand(self, a: Node, b: Node) -> Node:
+        self._check(a, b)
+        return self._add((NAND, min(a, b), max(a, b)))
+
+    def dff(self, next: Optional[Node] = None, default: int = 0) -> Node:
+        """A D register outputting `default` at step 0; without `next`, connect it with drive()."""
+        if default not in (0, 1):
+            raise ValueError(f"D defaults are 0 or 1, not {default!r}")
+        if next is None:
+            if self._macro_scope:
+                raise ValueError("D registers in a macro body need their next state when created")
+            self.nodes.append((DFF, [None], default))
+            return len(self.nodes) - 1
+        self._check(next)
+        return self._add((DFF, (next,), default))
+
+    def drive(self, register: Node, next: Node) -> None:
+        """Connects the next-state input of a register created without one."""
+        self._check(register, next)
+        node = self.nodes[register]
+        if node[0] != DFF or not isinstance(node[1], list):
+            raise ValueError(f"Node {register} is not a register created without its next state")
+        if node[1][0] is not None:
+            raise ValueError(f"Register {register} is already driven")
+        node[1][0] = next
+
+    def not_(self, a: Node) -> Node:
+        return self.nand(a, a)
+
+    def and_(self, a: Node, b: Node) -> Node:
+        return self.not_(self.nand(a, b))
+
+    def or_(self, a: Node, b: Node) -> Node:
+        return self.nand(self.not_(a), self.not_(b))
+
+    def xor(self, a: Node, b: Node) -> Node:
+        both = self.nand(a, b)
+        return self.nand(self.nand(a, both), self.nand(b, both))
+
+    # --- Macros ---
+
+    def define_macro(self, name: str, params: List[str], body: Callable[..., Node]) -> None:
+        """
+        Defines a macro. `body(builder, *parameter nodes)` builds its output
+        with the given builder, which shares this one's macros.
+        """
+        if not _NAME.match(name) or name in ('NAND', 'D'):
+            raise ValueError(f"Invalid macro name '{name}'")
+        if _HELPER.match(name):
+            raise ValueError(f"Macro names of the form '_<macro>_<number>' are reserved for shared gates: '{name}'")
+        if name in self.macros:
+            raise ValueError(f"Macro '{name}' is defined more than once.")
+        if len(set(params)) != len(params):
+            raise ValueError(f"Macro '{name}' has duplicate parameters")
+        scope = CircuitBuilder(_macro_scope=True, _macros=self.macros)
+        output = body(scope, *[scope.signal(param) for param in params])
+        scope._check(output)
+        definitions = scope._macro_definitions(name, list(params), output)
+        for macro in definitions[1:]:
+            if macro.name in self.macros:
+                raise ValueError(f"Macro '{macro.name}' is defined more than once.")
+        for macro in definitions:
+            self.macros[macro.name] = macro
+
+    def call(self, name: str, *args: Node) -> Node:
+        """A call of a macro defined with define_macro or imported with import_library."""
+        self._check(*args)
+        macro = self.macros.get(name)
+        if macro is None:
+            raise ValueError(f"Macro '{name}' is not defined")
+        if len(args) != len(macro.params):
+            raise ValueError(f"Macro '{name}' called with {len(args)} args, but expected {len(macro.params)}.")
+        return self._add((CALL, name, args))
+
+    def import_library(self, name: str, base_dir: Optional[str] = None) -> None:
+        """Makes the macros of a library (see library.py) available to call()."""
+        from library import link_imports
+        spec = Import(name, is_path=name.endswith('.cir'))
+        staging = Circuit(assignments={}, macros={}, imports=[spec])
+        link_imports(staging, base_dir)
+        for macro_name, macro in staging.macros.items():
+            if self.macros.get(macro_name, macro) is not macro:
+                raise ValueError(f"Macro '{macro_name}' is defined more than once (also in library '{name}').")
+            self.macros[macro_name] = macro
+        self.imports.append(spec)
+
+    # --- Conversion ---
+
+    def _macro_definitions(self, name: str, params: List[str], root: Node) -> List[MacroDef]:
+        """
+        The macro computing `root` from `params`, followed by the helper
+        macros its shared gates are bound in (see the module comment).
+        """
+        readers: Dict[Node, int] = {root: 0}
+        stack = [root]
+        while stack:
+            for arg in _fanin(self.nodes[stack.pop()]):
+                if arg not in readers:
+                    readers[arg] = 0
+                    stack.append(arg)
+                readers[arg] += 1
+        # Node ids are topological in a macro body, which cannot drive a
+        # register after creating it
+        refs: Dict[Node, object] = {}
+        depth: Dict[Node, int] = {}
+        level: Dict[Node, int] = {}        # the latest binding level an expression reads, -1 for none
+        bound: Dict[Node, object] = {}     # shared gate -> its expression
+        for node_id in sorted(readers):
+            node = self.nodes[node_id]
+            args = _fanin(node)
+            if not args:
+                refs[node_id], depth[node_id], level[node_id] = _leaf(node), 0, -1
+                continue
+            expr = _expression(node, [refs[arg] for arg in args])
+            inlined = 1 + max(depth[arg] for arg in args)
+            latest = max(level[arg] for arg in args)
+            if node_id != root and (readers[node_id] > 1 or inlined >= MAX_INLINE_DEPTH):
+                bound[node_id] = expr
+                refs[node_id], depth[node_id], level[node_id] = Variable(f"_n{node_id}"), 0, latest + 1
+            else:
+                refs[node_id], depth[node_id], level[node_id] = expr, inlined, latest
+        if not bound:
+            return [MacroDef(name, params, refs[root])]
+
+        levels: List[List[Node]] = [[] for _ in range(1 + max(level[node_id] for node_id in bound))]
+        for node_id in bound:
+            levels[level[node_id]].append(node_id)
+        helpers = [f"_{name}_{k}" for k in range(len(levels))]
+        # carried[k]: parameters and earlier gates that helper k passes on,
+        # i.e. the ones read after level k
+        passable = params + [f"_n{node_id}" for node_id in bound]
+        carried: List[List[str]] = [[] for _ in levels]
+        read = _names(refs[root])
+        for k in range(len(levels) - 1, -1, -1):
+            own = {f"_n{node_id}" for node_id in levels[k]}
+            carried[k] = [n for n in passable if n in read and n not in own]
+            read = (read - own).union(*(_names(bound[node_id]) for node_id in levels[k]))
+
+        def call(k: int) -> Call:
+            return Call(helpers[k], [Variable(n) for n in carried[k]] + [bound[node_id] for node_id in levels[k]])
+
+        definitions = [MacroDef(name, params, call(0))]
+        for k, helper in enumerate(helpers):
+            body = call(k + 1) if k + 1 < len(levels) else refs[root]
+            definitions.append(MacroDef(helper, carried[k] + [f"_n{node_id}" for node_id in levels[k]], body))
+        return definitions
+
+    def build(self) -> Circuit:
+        """The circuit as parse_file would return it for the equivalent .cir text."""
+        for node in self.nodes:
+            if node[0] == DFF and node[1][0] is None:
+                raise ValueError(f"A D register (node {self.nodes.index(node)}) is never driven")
+        known = set(self.inputs) | set(self.signals)
+        for node in self.nodes:
+            if node[0] == SIGNAL and node[1] not in known:
+                raise ValueError(f"Signal '{node[1]}' is read but neither an input nor assigned")
+
+        # Readers of every node reachable from the assigned signals
+        readers = [0] * len(self.nodes)
+        reached = [False] * len(self.nodes)
+        stack = list(self.signals.values())
+        while stack:
+            node_id = stack.pop()
+            if reached[node_id]:
+                continue
+            reached[node_id] = True
+            for arg in _fanin(self.nodes[node_id]):
+                readers[arg] += 1
+                stack.append(arg)
+        names: Dict[Node, str] = {}
+        for name, node_id in self.signals.items():
+            names.setdefault(node_id, name)
+        shared: List[Node] = []
+        for node_id, node in enumerate(self.nodes):
+            if node[0] == DFF and reached[node_id]:
+                next_node = node[1][0]
+                if self.nodes[next_node][0] not in (SIGNAL, CONST) and next_node not in names:
+                    # Feedback loops pass through a D register, so a named
+                    # next state keeps every expression a tree
+                    names[next_node] = f"_n{next_node}"
+                    shared.append(next_node)
+
+        # What a reader of each node embeds: a name, a leaf or the inlined
+        # expression. Node ids are topological except for the next state of
+        # D registers, which is always a name or a leaf.
+        refs: List[object] = [None] * len(self.nodes)
+        for node_id, name in names.items():
+            refs[node_id] = Variable(name)
+        for node_id, node in enumerate(self.nodes):
+            if refs[node_id] is None and node[0] in (SIGNAL, CONST) and reached[node_id]:
+                refs[node_id] = _leaf(node)
+        exprs: Dict[Node, object] = {}
+        depth = [0] * len(self.nodes)
+        for node_id, node in enumerate(self.nodes):
+            if not reached[node_id] or node[0] in (SIGNAL, CONST):
+                continue
+            args = _fanin(node)
+            expr = _expression(node, [refs[arg] for arg in args])
+            inlined = 1
+            for arg in args:
+                if depth[arg] >= inlined:
+                    inlined = depth[arg] + 1
+            if node_id not in names:
+                if readers[node_id] == 1 and inlined < MAX_INLINE_DEPTH:
+                    refs[node_id] = expr
+                    depth[node_id] = inlined
+                    continue
+                names[node_id] = f"_n{node_id}"
+                refs[node_id] = Variable(names[node_id])
+                shared.append(node_id)
+            exprs[node_id] = expr
+
+        assignments: Dict[str, Assignment] = {}
+        for name, node_id in self.signals.items():
+            if names[node_id] != name:
+                expr = Variable(names[node_id])
+            else:
+                expr = exprs.get(node_id) or _leaf(self.nodes[node_id])
+            assignments[name] = Assignment(name, expr)
+        for node_id in sorted(shared):
+            assignments[names[node_id]] = Assignment(names[node_id], exprs[node_id])
+        return Circuit(assignments=assignments, macros=dict(self.macros), imports=list(self.imports))
+
+    def simulator(self, engine: str = 'auto', steps: int = 0, profile: bool = False):
+        """An engine for the built circuit, see backends.create_simulator."""
+        from backends import create_simulator
+        return create_simulator(self.build(), engine, steps=steps, profile=profile)
+
+    def to_cir(self) -> str:
+        return format_circuit(self.build())
+
+
+def _fanin(node: tuple) -> Tuple[Node, ...]:
+    kind = node[0]
+    if kind == NAND:
+        return node[1:]
+    if kind == DFF:
+        return (node[1][0],)
+    if kind == CALL:
+        return node[2]
+    return ()
+
+
+def _names(expr) -> set:
+    """Names of the signals and parameters an expression reads."""
+    names, stack = set(), [expr]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Variable):
+            names.add(item.name)
+        elif isinstance(item, Call):
+            stack.extend(item.args)
+    return names
+
+
+def _leaf(node: tuple):
+    return Variable(node[1]) if node[0] == SIGNAL else Number(node[1])
+
+
+def _expression(node: tuple, args: list):
+    kind = node[0]
+    if kind == NAND:
+        return Call('NAND', args)
+    if kind == DFF:
+        return Call('D', [args[0], Number(node[2])])
+    if kind == CALL:
+        return Call(node[1], args)
+    return _leaf(node)
+
+
+# --- .cir output ---
+
+def _format_expression(expr, out: List[str]) -> None:
+    stack = [expr]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            out.append(item)
+        elif isinstance(item, Variable):
+            out.append(item.name)
+        elif isinstance(item, Number):
+            out.append('1' if item.value else '0')
+        elif isinstance(item, Index):
+            out.append(f"{item.name}[{item.msb}]" if item.msb == item.lsb
+                       else f"{item.name}[{item.msb}:{item.lsb}]")
+        elif isinstance(item, Call):
+            parts = [f"{item.name}("]
+            for i, arg in enumerate(item.args):
+                parts.extend((", ", arg) if i else (arg,))
+            parts.append(")")
+            stack.extend(reversed(parts))
+        elif isinstance(item, Concat):
+            parts = ["{"]
+            for i, part in enumerate(item.parts):
+                parts.extend((", ", part) if i else (part,))
+            parts.append("}")
+            stack.extend(reversed(parts))
+        else:
+            raise TypeError(f"Cannot write expression of type {type(item).__name__}")
+
+
+def _format_target(name: str, width: Optional[int]) -> str:
+    return f"{name}[{width - 1}:0]" if width is not None else name
+
+
+def _imported_macros(circuit: Circuit, base_dir: Optional[str]) -> set:
+    """Ids of the macros that the circuit's imports bring in."""
+    from library import load_library, resolve
+    found = set()
+    for spec in circuit.imports:
+        try:
+            found.update(id(macro) for macro in load_library(resolve(spec, base_dir), spec.name).macros.values())
+        except OSError:
+            pass
+    return found
+
+
+def format_circuit(circuit: Circuit, base_dir: Optional[str] = None) -> str:
+    """
+    .cir source for a circuit. Macros that came from an import are left to
+    the import statement; imported paths are relative to `base_dir`.
+    """
+    out: List[str] = []
+    imported = _imported_macros(circuit, base_dir) if circuit.imports else set()
+    for spec in circuit.imports:
+        out.append(f'import "{spec.name}"\n' if spec.is_path else f"import {spec.name}\n")
+    for macro in circuit.macros.values():
+        if id(macro) in imported:
+            continue
+        params = ", ".join(_format_target(param, macro.param_widths.get(param)) for param in macro.params)
+        out.append(f"{macro.name}({params}) := ")
+        _format_expression(macro.expression, out)
+        out.append("\n")
+    for assignment in circuit.assignments.values():
+        out.append(f"{_format_target(assignment.target, assignment.width)} = ")
+        _format_expression(assignment.expression, out)
+        out.append("\n")
+    return "".join(out)
+
+
+def write_circuit(circuit: Circuit, path: str, base_dir: Optional[str] = None) -> None:
+    with open(path, 'w') as f:
+        f.write(format_circuit(circuit, base_dir))
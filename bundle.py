@@ -0,0 +1,86 @@
+# File: bundle.py
+# Builds the prebuilt, fast-starting bundle of the simulator.
+#
+# The bundle is a single zip application holding every module as
+# precompiled bytecode (next to its source, which is used if the bytecode
+# does not match the running Python), grammar.lark, the macro libraries in
+# stdlib/, and the LALR parser for
+# the grammar generated as a standalone module, so loading it never imports
+# lark or builds parse tables. It runs the CLI directly:
+#
+#   python bundle.py                       # writes dist/logicsim.pyz
+#   python dist/logicsim.pyz counter.cir -i I=0110
+#
+# and the web UI loads it in one step by putting it on sys.path.
+
+import argparse
+import glob
+import importlib.util
+import io
+import os
+import sys
+import zipfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(ROOT, 'dist', 'logicsim.pyz')
+
+# Project files that are not part of the simulator itself
+_EXCLUDED = {'bundle.py', '__init__.py'}
+
+_MAIN = """import sys
+from main import main
+
+sys.exit(main())
+"""
+
+
+def standalone_parser_source() -> str:
+    """The LALR parser for grammar.lark as a standalone module (see circuit_parser)."""
+    from lark import Lark
+    from lark.tools.standalone import gen_standalone
+    with open(os.path.join(ROOT, 'grammar.lark')) as f:
+        parser = Lark(f.read(), start='start', parser='lalr')
+    out = io.StringIO()
+    gen_standalone(parser, out=out)
+    return out.getvalue()
+
+
+def _bytecode(source: str, name: str) -> bytes:
+    """An unchecked hash-based .pyc for `source`, valid wherever it is unpacked."""
+    code = compile(source, name, 'exec', dont_inherit=True)
+    source_hash = importlib.util.source_hash(source.encode())
+    return importlib._bootstrap_external._code_to_hash_pyc(code, source_hash, checked=False)
+
+
+def build_bundle(output: str = DEFAULT_OUTPUT) -> str:
+    """Writes the bundle to `output` and returns its path."""
+    modules = {os.path.basename(path)[:-3]: open(path).read()
+               for path in sorted(glob.glob(os.path.join(ROOT, '*.py')))
+               if os.path.basename(path) not in _EXCLUDED}
+    modules['_circuit_grammar'] = standalone_parser_source()
+    modules['__main__'] = _MAIN
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with zipfile.ZipFile(output + '.tmp', 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for name, source in modules.items():
+            bundle.writestr(f"{name}.py", source)
+            bundle.writestr(f"{name}.pyc", _bytecode(source, f"{name}.py"))
+        bundle.write(os.path.join(ROOT, 'grammar.lark'), 'grammar.lark')
+        for path in sorted(glob.glob(os.path.join(ROOT, 'stdlib', '*.cir'))):
+            bundle.write(path, f"stdlib/{os.path.basename(path)}")
+    os.replace(output + '.tmp', output)
+    return output
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build the prebuilt simulator bundle.")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help='Bundle path (default: dist/logicsim.pyz)')
+    args = parser.parse_args(argv)
+    path = build_bundle(args.output)
+    print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KiB, Python {sys.version_info[0]}.{sys.version_info[1]} bytecode)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+# File: buses.py
+# Width handling for multi-bit buses.
+#
+# A bus is a signal declared as NAME[MSB:0] (or read with an index); its bits
+# are named 'NAME[i]' wherever single-bit signals are expected (inputs,
+# outputs, waveforms, the compiled netlist). After macro expansion bus
+# expressions are annotated with their widths so the interpreter can evaluate
+# a bitwise NAND or D over a whole bus as one word operation, and bitblast()
+# lowers them to one single-bit expression per bit for the gate-level engines.
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from circuit_parser import Call, Concat, Index, Number, Variable
+
+_BIT_NAME = re.compile(r'^(.*)\[(\d+)\]$')
+
+
+def bit_name(name: str, bit: int) -> str:
+    return f"{name}[{bit}]"
+
+
+def split_bit_name(name: str) -> Optional[Tuple[str, int]]:
+    """('A', 3) for 'A[3]', None for a name without an index."""
+    match = _BIT_NAME.match(name)
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+def expand_bus_names(names: List[str], widths: Dict[str, int]) -> List[str]:
+    """Replaces every bus name in `names` by the names of its bits, LSB first."""
+    expanded = []
+    for name in names:
+        if name in widths:
+            expanded.extend(bit_name(name, i) for i in range(widths[name]))
+        else:
+            expanded.append(name)
+    return expanded
+
+
+def expression_width(expr, widths: Dict[str, int]) -> Optional[int]:
+    """
+    Width of an expanded expression, or None when it is made of constants
+    only and so takes the width of its context.
+    """
+    if isinstance(expr, Number):
+        return None
+    if isinstance(expr, Variable):
+        return widths.get(expr.name, 1)
+    if isinstance(expr, Index):
+        return expr.msb - expr.lsb + 1
+    if isinstance(expr, Concat):
+        return sum(expression_width(part, widths) or 1 for part in expr.parts)
+    if isinstance(expr, Call):
+        known = [w for w in (expression_width(arg, widths) for arg in expr.args) if w is not None]
+        return max(known) if known else None
+    raise TypeError(f"Unknown expression type: {type(expr)}")
+
+
+def broadcast(expr, width: int):
+    """A single-bit expression repeated across `width` bits."""
+    return Concat([expr] * width, [1] * width)
+
+
+def select_bits(expr, msb: int, lsb: int, widths: Dict[str, int]):
+    """Bits msb..lsb of an expanded expression, e.g. a bus macro argument."""
+    width = expression_width(expr, widths)
+    if width is not None and msb >= width:
+        raise ValueError(f"Bit {msb} is out of range for a {width}-bit value.")
+    return _select(expr, msb, lsb, widths)
+
+
+def _select_constant(expr, msb: int, lsb: int):
+    """Bits msb..lsb of a constant-only expression: it takes the width of the slice."""
+    return expr if msb == lsb else broadcast(expr, msb - lsb + 1)
+
+
+def _select(expr, msb: int, lsb: int, widths: Dict[str, int]):
+    if isinstance(expr, Number):
+        return _select_constant(expr, msb, lsb)
+    if isinstance(expr, Variable):
+        return Index(expr.name, msb, lsb) if expr.name in widths else expr
+    if isinstance(expr, Index):
+        return Index(expr.name, expr.lsb + msb, expr.lsb + lsb)
+    if isinstance(expr, Concat):
+        parts = []
+        top = expression_width(expr, widths)
+        for part in expr.parts:
+            part_width = expression_width(part, widths) or 1
+            low = top - part_width
+            hi, lo = min(msb, top - 1), max(lsb, low)
+            if hi >= lo:
+                parts.append(_select(part, hi - low, lo - low, widths))
+            top = low
+        return parts[0] if len(parts) == 1 else Concat(parts)
+    if isinstance(expr, Call):
+        arg_widths = [expression_width(arg, widths) for arg in expr.args]
+        if all(width is None for width in arg_widths):
+            return _select_constant(expr, msb, lsb)
+        # Single-bit arguments of a bitwise gate are broadcast, so every
+        # selected bit reads them unchanged
+        return Call(expr.name, [arg if width in (None, 1) else _select(arg, msb, lsb, widths)
+                                for arg, width in zip(expr.args, arg_widths)])
+    raise TypeError(f"Unknown expression type: {type(expr)}")
+
+
+class _WidthAnnotator:
+    """Rewrites an expanded expression so every Call and Concat records its widths."""
+    def __init__(self, widths: Dict[str, int]):
+        self.widths = widths
+        self._memo = {}   # id(node) -> (annotated node, width); keeps shared subtrees shared
+
+    def infer(self, expr):
+        result = self._memo.get(id(expr))
+        if result is None:
+            result = self._memo[id(expr)] = self._infer(expr)
+        return result
+
+    def _infer(self, expr):
+        if isinstance(expr, Number):
+            return expr, None
+        if isinstance(expr, Variable):
+            return expr, self.widths.get(expr.name, 1)
+        if isinstance(expr, Index):
+            return expr, expr.msb - expr.lsb + 1
+        if isinstance(expr, Concat):
+            parts, part_widths = [], []
+            for part in expr.parts:
+                part, width = self.infer(part)
+                parts.append(self.fit(part, width, 1) if width is None else part)
+                part_widths.append(width or 1)
+            return Concat(parts, part_widths), sum(part_widths)
+        if isinstance(expr, Call):
+            inferred = [self.infer(arg) for arg in expr.args]
+            known = {width for _, width in inferred if width is not None}
+            width = max(known) if known else None
+            if known - {1, width}:
+                raise ValueError(f"Width mismatch in {expr.name}: arguments are "
+                                 f"{' and '.join(str(w) for _, w in inferred if w is not None)} bits wide.")
+            if width is None:
+                return Call(expr.name, [arg for arg, _ in inferred]), None
+            return Call(expr.name, [self.fit(arg, w, width) for arg, w in inferred], width), width
+        raise TypeError(f"Unknown expression type: {type(expr)}")
+
+    def fit(self, expr, have: Optional[int], want: int):
+        """Adapts an expression of width `have` to `want` bits."""
+        if have == want:
+            return expr
+        if have is None:
+            return self._fix(expr, want)
+        if have == 1:
+            return broadcast(expr, want)
+        raise ValueError(f"Cannot use a {have}-bit value where {want} bits are expected.")
+
+    def _fix(self, expr, width: int):
+        """Gives a constant-only expression a concrete width."""
+        if isinstance(expr, Number):
+            return Number((1 << width) - 1 if expr.value else 0)
+        return Call(expr.name, [self._fix(arg, width) for arg in expr.args], width)
+
+
+def annotate_widths(expr, width: int, widths: Dict[str, int], target: str = ''):
+    """
+    Annotates an expanded expression assigned to a `width`-bit signal:
+    bitwise gates get their width, constants and single-bit operands are
+    broadcast, and mismatched widths raise ValueError.
+    """
+    annotator = _WidthAnnotator(widths)
+    expr, have = annotator.infer(expr)
+    if have not in (None, 1, width):
+        raise ValueError(f"Signal '{target}' is {width} bits wide but its expression is {have} bits wide.")
+    return annotator.fit(expr, have, width)
+
+
+def bitblast(expanded: Dict[str, object], widths: Dict[str, int]) -> Dict[str, object]:
+    """
+    Lowers width-annotated assignments to single-bit assignments: a bus
+    target 'Y' becomes 'Y[0]', 'Y[1]', ... and bus reads become reads of
+    individual bit signals.
+    """
+    memo = {}
+
+    def bit(expr, i):
+        key = (id(expr), i)
+        if key in memo:
+            return memo[key]
+        if isinstance(expr, Number):
+            result = Number((expr.value >> i) & 1)
+        elif isinstance(expr, Variable):
+            result = Variable(bit_name(expr.name, i)) if expr.name in widths else expr
+        elif isinstance(expr, Index):
+            result = Variable(bit_name(expr.name, expr.lsb + i))
+        elif isinstance(expr, Concat):
+            low = 0
+            for part, width in zip(reversed(expr.parts), reversed(expr.widths)):
+                if i < low + width:
+                    result = bit(part, i - low)
+                    break
+                low += width
+        elif isinstance(expr, Call):
+            result = Call(expr.name, [bit(arg, i) for arg in expr.args])
+        else:
+            raise TypeError(f"Unknown expression type: {type(expr)}")
+        memo[key] = result
+        return result
+
+    lowered = {}
+    for target, expr in expanded.items():
+        if target in widths:
+            for i in range(widths[target]):
+                lowered[bit_name(target, i)] = bit(expr, i)
+        else:
+            lowered[target] = bit(expr, 0)
+    return lowered
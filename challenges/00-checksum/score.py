@@ -2,7 +2,7 @@
 # Uses the common scoring framework
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 def find_project_root():
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,7 +17,7 @@ if root_dir and root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
 try:
-    from scoring_framework import ScoringFramework, IterativeTestGenerator
+    from scoring_framework import ScoringFramework, IterativeTestGenerator, MAX_EXHAUSTIVE_CASES
 except ImportError as e:
     print(f"Error: Could not import scoring framework: {e}")
     sys.exit(1)
@@ -29,6 +29,13 @@ def checksum(x: str) -> str:
         result ^= int(bit)
     return str(result)
 
+def checksum_reference(inputs: Dict[str, List[int]], lanes: int) -> Dict[str, List[Optional[int]]]:
+    # Bit-parallel reference: lane l of each word is test case l
+    parity = 0
+    for word in inputs['X']:
+        parity ^= word
+    return {'Y': [None] * (len(inputs['X']) - 1) + [parity]}
+
 def validate_checksum(outputs: Dict[str, str], test_case: Dict[str, Any]) -> bool:
     inputs = test_case['inputs']
     x = inputs['X']
@@ -45,9 +52,28 @@ def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected:
     print(f"Expected Y={expected_output}")
     print(f"Got      Y={actual_output}")
 
-def verify_circuit(circuit_file: str, num_bits: int = 4) -> bool:
-    framework = ScoringFramework()
-    test_cases = IterativeTestGenerator.generate_single_signal_combinations(num_bits, 'X')
+def verify_circuit(circuit_file: str, num_bits: int = 4, framework: ScoringFramework = None) -> bool:
+    framework = framework or ScoringFramework()
+    if framework.random_stimulus or 2 ** num_bits > MAX_EXHAUSTIVE_CASES:
+        return framework.run_random_test(
+            circuit_file=circuit_file,
+            signal_names=['X'],
+            steps=num_bits,
+            validator=validate_checksum,
+            error_reporter=error_reporter,
+            reference=checksum_reference
+        )
+    if not (framework.profile or framework.report_fault_coverage):
+        return framework.run_batch_test(
+            circuit_file=circuit_file,
+            signal_names=['X'],
+            steps=num_bits,
+            reference=checksum_reference,
+            error_reporter=error_reporter,
+            cache_key=f'checksum-{num_bits}'
+        )
+    # Profiling and fault coverage simulate the cases one by one
+    test_cases = IterativeTestGenerator.iter_bitstring_combinations(num_bits, ['X'], *framework.shard)
     return framework.run_circuit_test(
         circuit_file=circuit_file,
         test_cases=test_cases,
@@ -69,4 +95,4 @@ if __name__ == '__main__':
             }
         ]
     )
-    verify_circuit(args.circuit, args.bits)
+    verify_circuit(args.circuit, args.bits, framework=framework)
@@ -5,7 +5,7 @@ Scoring script for the "Palindrome Detection" challenge.
 import itertools
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 # Add project root to path for framework import
 def find_project_root():
@@ -59,6 +59,21 @@ def validate_counter(outputs: Dict[str, str], test_case: Dict[str, Any]) -> bool
 
     return actual_o0 == expected_o0 and actual_o1 == expected_o1 and actual_o2 == expected_o2
 
+def counter_reference(inputs: Dict[str, List[int]], lanes: int) -> Dict[str, List[Optional[int]]]:
+    """Bit-sliced reference: the three count bits of all lanes as words."""
+    c0 = c1 = c2 = 0
+    expected = {'O0': [], 'O1': [], 'O2': []}
+    for word in inputs['I']:
+        carry0 = c0 & word
+        c0 ^= word
+        carry1 = c1 & carry0
+        c1 ^= carry0
+        c2 ^= carry1
+        expected['O0'].append(c0)
+        expected['O1'].append(c1)
+        expected['O2'].append(c2)
+    return expected
+
 def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected: Dict[str, str]) -> None:
     """Custom error reporter for the counter challenge."""
     inputs = test_case['inputs']
@@ -89,12 +104,32 @@ def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected:
     print(f"Output O2| {expected_o2} | {actual_o2}")
 
 
-def verify_circuit(circuit_file: str) -> bool:
+def verify_circuit(circuit_file: str, framework: ScoringFramework = None) -> bool:
     """Verify the circuit works correctly for all possible 8-bit inputs."""
-    framework = ScoringFramework()
+    framework = framework or ScoringFramework()
+
+    if framework.random_stimulus:
+        return framework.run_random_test(
+            circuit_file=circuit_file,
+            signal_names=['I'],
+            steps=8,
+            validator=validate_counter,
+            error_reporter=error_reporter,
+            reference=counter_reference
+        )
+
+    if not (framework.profile or framework.report_fault_coverage):
+        return framework.run_batch_test(
+            circuit_file=circuit_file,
+            signal_names=['I'],
+            steps=8,
+            reference=counter_reference,
+            error_reporter=error_reporter,
+            cache_key='counter-8'
+        )
 
     # Generate all possible 8-bit test cases
-    test_cases = IterativeTestGenerator.generate_single_signal_combinations(8, 'I')
+    test_cases = IterativeTestGenerator.iter_bitstring_combinations(8, ['I'], *framework.shard)
 
     return framework.run_circuit_test(
         circuit_file=circuit_file,
@@ -113,4 +148,4 @@ if __name__ == '__main__':
         description='Verify palindrome detector circuit'
     )
     
-    verify_circuit(args.circuit)
\ No newline at end of file
+    verify_circuit(args.circuit, framework=framework)
\ No newline at end of file
@@ -5,7 +5,7 @@ Scoring script for the "Palindrome Detection" challenge.
 import itertools
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 # Add project root to path for framework import
 def find_project_root():
@@ -41,6 +41,14 @@ def validate_palindrome_detection(outputs: Dict[str, str], test_case: Dict[str,
     return result == expected
 
 
+def palindrome_reference(inputs: Dict[str, List[int]], lanes: int) -> Dict[str, List[Optional[int]]]:
+    """Bit-parallel reference: a lane is a palindrome if no mirrored pair of steps differs."""
+    words = inputs['I']
+    differs = 0
+    for t in range(len(words) // 2):
+        differs |= words[t] ^ words[-1 - t]
+    return {'O': [0] * 5 + [((1 << lanes) - 1) & ~differs]}
+
 def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected: Dict[str, str]) -> None:
     """Custom error reporter for palindrome detection."""
     inputs = test_case['inputs']
@@ -53,12 +61,32 @@ def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected:
     print(f"Got      O={actual_output}")
 
 
-def verify_circuit(circuit_file: str) -> bool:
+def verify_circuit(circuit_file: str, framework: ScoringFramework = None) -> bool:
     """Verify the circuit works correctly for all possible 6-bit inputs."""
-    framework = ScoringFramework()
+    framework = framework or ScoringFramework()
+    
+    if framework.random_stimulus:
+        return framework.run_random_test(
+            circuit_file=circuit_file,
+            signal_names=['I'],
+            steps=6,
+            validator=validate_palindrome_detection,
+            error_reporter=error_reporter,
+            reference=palindrome_reference
+        )
+    
+    if not (framework.profile or framework.report_fault_coverage):
+        return framework.run_batch_test(
+            circuit_file=circuit_file,
+            signal_names=['I'],
+            steps=6,
+            reference=palindrome_reference,
+            error_reporter=error_reporter,
+            cache_key='palindrome-6'
+        )
     
     # Generate all possible 6-bit test cases
-    test_cases = IterativeTestGenerator.generate_single_signal_combinations(6, 'I')
+    test_cases = IterativeTestGenerator.iter_bitstring_combinations(6, ['I'], *framework.shard)
     
     return framework.run_circuit_test(
         circuit_file=circuit_file,
@@ -77,4 +105,4 @@ if __name__ == '__main__':
         description='Verify palindrome detector circuit'
     )
     
-    verify_circuit(args.circuit)
\ No newline at end of file
+    verify_circuit(args.circuit, framework=framework)
\ No newline at end of file
@@ -6,7 +6,7 @@ Scoring script for the "Largest of Three" challenge.
 import itertools
 import os
 import sys
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 # Add project root to path for framework import
 def find_project_root():
@@ -22,7 +22,7 @@ if root_dir and root_dir not in sys.path:
     sys.path.insert(0, root_dir)
 
 try:
-    from scoring_framework import ScoringFramework, IterativeTestGenerator
+    from scoring_framework import ScoringFramework, IterativeTestGenerator, MAX_EXHAUSTIVE_CASES
 except ImportError as e:
     print(f"Error: Could not import scoring framework: {e}")
     sys.exit(1)
@@ -46,6 +46,24 @@ def max_of_three(x1: str, x2: str, x3: str) -> str:
     return x3
 
 
+def max_of_three_reference(inputs: Dict[str, List[int]], lanes: int) -> Dict[str, List[Optional[int]]]:
+    """Bit-sliced max_of_three over all lanes; step 0 holds the most significant bits."""
+    mask = (1 << lanes) - 1
+    x1, x2, x3 = inputs['X1'], inputs['X2'], inputs['X3']
+
+    def at_least(a: List[int], b: List[int]) -> int:
+        # Lanes in which a >= b, comparing from the most significant bit
+        greater, equal = 0, mask
+        for bit_a, bit_b in zip(a, b):
+            greater |= equal & bit_a & ~bit_b
+            equal &= ~(bit_a ^ bit_b)
+        return (greater | equal) & mask
+
+    pick1 = at_least(x1, x2) & at_least(x1, x3)
+    pick2 = ~pick1 & at_least(x2, x1) & at_least(x2, x3) & mask
+    pick3 = mask & ~(pick1 | pick2)
+    return {'Y': [(pick1 & a) | (pick2 & b) | (pick3 & c) for a, b, c in zip(x1, x2, x3)]}
+
 def validate_max_of_three(outputs: Dict[str, str], test_case: Dict[str, Any]) -> bool:
     """Validate that the circuit output matches the expected maximum."""
     inputs = test_case['inputs']
@@ -67,13 +85,33 @@ def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected:
     print(f"Got      Y={actual_output}")
 
 
-def verify_circuit(circuit_file: str, num_bits: int = 3) -> bool:
+def verify_circuit(circuit_file: str, num_bits: int = 3, framework: ScoringFramework = None) -> bool:
     """Verify that the circuit produces the correct output for all inputs."""
-    framework = ScoringFramework()
+    framework = framework or ScoringFramework()
+    
+    if framework.random_stimulus or 2 ** (3 * num_bits) > MAX_EXHAUSTIVE_CASES:
+        return framework.run_random_test(
+            circuit_file=circuit_file,
+            signal_names=['X1', 'X2', 'X3'],
+            steps=num_bits,
+            validator=validate_max_of_three,
+            error_reporter=error_reporter,
+            reference=max_of_three_reference
+        )
+    
+    if not (framework.profile or framework.report_fault_coverage):
+        return framework.run_batch_test(
+            circuit_file=circuit_file,
+            signal_names=['X1', 'X2', 'X3'],
+            steps=num_bits,
+            reference=max_of_three_reference,
+            error_reporter=error_reporter,
+            cache_key=f'comparison-{num_bits}'
+        )
     
-    # Generate all possible test cases
-    test_cases = IterativeTestGenerator.generate_all_bitstring_combinations(
-        num_bits, ['X1', 'X2', 'X3']
+    # Profiling and fault coverage simulate the cases one by one
+    test_cases = IterativeTestGenerator.iter_bitstring_combinations(
+        num_bits, ['X1', 'X2', 'X3'], *framework.shard
     )
     
     return framework.run_circuit_test(
@@ -101,4 +139,4 @@ if __name__ == '__main__':
         ]
     )
     
-    verify_circuit(args.circuit, args.bits)
\ No newline at end of file
+    verify_circuit(args.circuit, args.bits, framework=framework)
\ No newline at end of file
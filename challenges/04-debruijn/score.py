@@ -82,8 +82,10 @@ def error_reporter(test_case: Dict[str, Any], outputs: Dict[str, str], expected:
     else:
         print(f"Failed: {sequence}")
 
-def verify_circuit(circuit_file: str) -> bool:
-    framework = ScoringFramework()
+def verify_circuit(circuit_file: str, framework: ScoringFramework = None) -> bool:
+    framework = framework or ScoringFramework()
+    if framework.random_stimulus:
+        print("The generator has no inputs, so --random checks its single output sequence.")
     test_cases = [{'inputs': {}}]
     return framework.run_circuit_test(
         circuit_file=circuit_file,
@@ -98,4 +100,4 @@ if __name__ == '__main__':
     args = framework.create_default_cli(
         description='Verify De Bruijn sequence generator circuit'
     )
-    verify_circuit(args.circuit)
+    verify_circuit(args.circuit, framework=framework)
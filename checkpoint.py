@@ -0,0 +1,106 @@
+# File: checkpoint.py
+# Long simulations with sparse D-register checkpoints.
+#
+# Instead of keeping the value of every signal at every step, a run stores
+# only the register state every `interval` steps. Any window of any signal is
+# reconstructed on demand by re-simulating at most one interval per segment
+# from the nearest checkpoint, so memory is O(steps / interval * registers)
+# plus a few cached segments.
+
+from collections import OrderedDict
+from typing import Dict, List, Union
+
+from circuit_parser import Circuit
+from netlist import CompiledSimulator
+
+
+class CheckpointedRun:
+    """
+    Simulates `num_steps` steps of a circuit, keeping register checkpoints
+    every `interval` steps, and answers value(signal, t) and
+    window(signal, t0, t1) queries for inputs and assigned signals.
+    """
+    def __init__(self, circuit: Union[Circuit, CompiledSimulator], inputs: Dict[str, str],
+                 num_steps: int, interval: int = 4096, sinks=(), cached_segments: int = 4):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.compiled = circuit if isinstance(circuit, CompiledSimulator) else CompiledSimulator(circuit)
+        self.compiled.check_inputs(inputs)
+        netlist = self.compiled.netlist
+        self.inputs = inputs
+        self.num_steps = num_steps
+        self.interval = interval
+        self.cached_segments = cached_segments
+        self.signals = list(netlist.inputs) + list(netlist.signals)
+        self.checkpoints: List[List[int]] = []   # register state before step k * interval
+        self._first, self._step = self.compiled.step_functions()
+        self._columns = [inputs[name] for name in netlist.inputs]
+        self._segments: 'OrderedDict[int, Dict[str, List[int]]]' = OrderedDict()
+        self._run(sinks)
+
+    def _input_words(self, t: int) -> List[int]:
+        return [1 if t < len(seq) and seq[t] == '1' else 0 for seq in self._columns]
+
+    def _run(self, sinks) -> None:
+        """The initial pass: records checkpoints and feeds the sinks."""
+        inputs = list(self.compiled.netlist.inputs)
+        names = list(self.compiled.netlist.signals)
+        state, step = [], self._first
+        for t in range(self.num_steps):
+            if t % self.interval == 0:
+                self.checkpoints.append(state)
+            words = self._input_words(t)
+            values, state = step(words, state, 1)
+            step = self._step
+            if sinks:
+                sample = dict(zip(inputs, words))
+                sample.update(zip(names, values))
+                for sink in sinks:
+                    sink.sample(t, sample)
+
+    def _segment(self, index: int) -> Dict[str, List[int]]:
+        """Values of every signal for the steps of checkpoint interval `index`."""
+        segment = self._segments.get(index)
+        if segment is not None:
+            self._segments.move_to_end(index)
+            return segment
+        start = index * self.interval
+        stop = min(start + self.interval, self.num_steps)
+        input_count = len(self._columns)
+        columns = [[] for _ in self.signals]
+        state = self.checkpoints[index]
+        step = self._first if start == 0 else self._step
+        for t in range(start, stop):
+            words = self._input_words(t)
+            values, state = step(words, state, 1)
+            step = self._step
+            for column, value in zip(columns, words + list(values[:len(self.signals) - input_count])):
+                column.append(value)
+        segment = dict(zip(self.signals, columns))
+        self._segments[index] = segment
+        if len(self._segments) > self.cached_segments:
+            self._segments.popitem(last=False)
+        return segment
+
+    def _check(self, signal: str, t0: int, t1: int) -> None:
+        if signal not in self.signals:
+            raise ValueError(f"Unknown signal '{signal}'")
+        if not 0 <= t0 <= t1 <= self.num_steps:
+            raise IndexError(f"Steps {t0}..{t1} are outside the simulated range 0..{self.num_steps}")
+
+    def value(self, signal: str, t: int) -> int:
+        """The value of `signal` at step `t`."""
+        self._check(signal, t, t + 1)
+        return self._segment(t // self.interval)[signal][t % self.interval]
+
+    def window(self, signal: str, t0: int, t1: int) -> str:
+        """The values of `signal` for steps t0 <= t < t1 as a '0'/'1' string."""
+        self._check(signal, t0, t1)
+        parts = []
+        t = t0
+        while t < t1:
+            index, offset = divmod(t, self.interval)
+            count = min(t1 - t, self.interval - offset)
+            parts.append("".join(map(str, self._segment(index)[signal][offset:offset + count])))
+            t += count
+        return "".join(parts)
@@ -0,0 +1,113 @@
+# File: circuit_coverage.py
+# Toggle and D-register state coverage collected inside the simulation loop.
+#
+# Values are handled as lane words, so the same collector works for the
+# single-lane engines (values 0/1) and for bit-parallel runs: a signal's
+# rise/fall masks are ORed across steps and lanes.
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+
+@dataclass
+class CoverageReport:
+    signals: int
+    toggled: int
+    untoggled: List[str] = field(default_factory=list)
+    registers: int = 0
+    states_visited: int = 0
+    states_saturated: bool = False
+
+    @property
+    def toggle_coverage(self) -> float:
+        return self.toggled / self.signals if self.signals else 1.0
+
+    @property
+    def state_coverage(self) -> float:
+        """Fraction of the 2**registers register states that were visited."""
+        return self.states_visited / (1 << self.registers)
+
+    def to_dict(self) -> dict:
+        return {
+            'signals': self.signals,
+            'toggled': self.toggled,
+            'untoggled': self.untoggled,
+            'registers': self.registers,
+            'states_visited': self.states_visited,
+            'states_saturated': self.states_saturated,
+        }
+
+    def format_report(self, max_listed: int = 20) -> str:
+        lines = [f"Toggle coverage: {self.toggled}/{self.signals} signals rose and fell "
+                 f"({self.toggle_coverage:.1%})"]
+        if self.untoggled:
+            listed = ", ".join(self.untoggled[:max_listed])
+            more = f" (+{len(self.untoggled) - max_listed} more)" if len(self.untoggled) > max_listed else ""
+            lines.append(f"  Not toggled: {listed}{more}")
+        if self.registers:
+            bound = "at least " if self.states_saturated else ""
+            lines.append(f"State coverage: {bound}{self.states_visited} of {1 << self.registers} "
+                         f"states of {self.registers} D registers visited ({self.state_coverage:.2%})")
+        return "\n".join(lines)
+
+
+class CoverageCollector:
+    """
+    Accumulates toggle coverage for `signals` (default: every sampled signal)
+    and the set of visited D-register states, keeping at most `max_states`
+    states so memory stays bounded.
+    """
+    def __init__(self, signals: Optional[List[str]] = None, max_states: int = 1 << 16):
+        self.signals = list(signals) if signals is not None else None
+        self.max_states = max_states
+        self.rose: Dict[str, int] = {}
+        self.fell: Dict[str, int] = {}
+        self.states = set()
+        self.states_saturated = False
+        self.registers = 0
+        self._previous: Dict[str, int] = {}
+
+    def sample(self, t: int, state: Dict[str, int]) -> None:
+        """Records signal values at step `t`; t == 0 starts a new run."""
+        if self.signals is None:
+            self.signals = list(state)
+        previous = self._previous
+        if t == 0:
+            previous.clear()
+            for name in self.signals:
+                self.rose.setdefault(name, 0)
+                self.fell.setdefault(name, 0)
+        rose, fell = self.rose, self.fell
+        for name in self.signals:
+            value = state.get(name, 0)
+            last = previous.get(name)
+            if last is not None and last != value:
+                rose[name] |= value & ~last
+                fell[name] |= last & ~value
+            previous[name] = value
+
+    def sample_registers(self, t: int, registers: Sequence[int], lanes: int = 1) -> None:
+        """Records the D-register outputs at step `t`, one word per register."""
+        self.registers = len(registers)
+        if self.states_saturated:
+            return
+        states = self.states
+        if lanes == 1:
+            states.add(tuple(registers))
+        else:
+            for lane in range(lanes):
+                states.add(tuple((word >> lane) & 1 for word in registers))
+        if len(states) >= self.max_states:
+            self.states_saturated = True
+
+    def report(self) -> CoverageReport:
+        signals = self.signals or []
+        untoggled = [name for name in signals if not (self.rose.get(name) and self.fell.get(name))]
+        return CoverageReport(
+            signals=len(signals),
+            toggled=len(signals) - len(untoggled),
+            untoggled=untoggled,
+            registers=self.registers,
+            states_visited=len(self.states),
+            states_saturated=self.states_saturated,
+        )
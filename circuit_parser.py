@@ -1,9 +1,16 @@
-from lark import Lark, Transformer
-from lark.exceptions import LarkError, VisitError
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple
 import os
 
+try:
+    # The prebuilt bundle (see bundle.py) ships the LALR parser for
+    # grammar.lark as a standalone module, so runs from it never import lark.
+    from _circuit_grammar import Lark_StandAlone, Transformer, LarkError, VisitError
+except ImportError:
+    Lark_StandAlone = None
+    from lark import Transformer
+    from lark.exceptions import LarkError, VisitError
+
 # --- Abstract Syntax Tree (AST) Nodes ---
 # These classes represent the components of our language in a structured way.
 
@@ -19,23 +26,72 @@ class Variable:
 class Call:
     name: str
     args: list
+    width: int = 1   # bits computed at once; set for bus expressions after expansion
+
+@dataclass
+class Index:
+    """Bits msb..lsb of a bus; a single bit when msb == lsb."""
+    name: str
+    msb: int
+    lsb: int
+
+@dataclass
+class Concat:
+    """Bus concatenation, most significant part first."""
+    parts: list
+    widths: List[int] = field(default_factory=list)   # part widths, set after expansion
 
 @dataclass
 class Assignment:
     target: str
     expression: object
+    width: Optional[int] = None   # bus width, None for a single-bit signal
 
 @dataclass
 class MacroDef:
     name: str
     params: List[str]
     expression: object
+    param_widths: Dict[str, int] = field(default_factory=dict)   # declared bus parameters
+    # The body with every macro it calls already inlined, for library macros
+    # (see library.py); expanding a call then only substitutes the arguments.
+    template: object = field(default=None, compare=False, repr=False)
+
+@dataclass
+class Import:
+    """An import statement: a bundled library name or a quoted file path."""
+    name: str
+    is_path: bool = False
 
 @dataclass
 class Circuit:
     """A container for the entire parsed circuit."""
     assignments: Dict[str, Assignment]
     macros: Dict[str, MacroDef]
+    widths: Dict[str, int] = field(default_factory=dict)   # bus signal -> width
+    imports: List[Import] = field(default_factory=list)
+
+
+def _bus_width(name: str, bits: Optional[Tuple[int, int]]) -> int:
+    """Width of a bus declared as NAME[MSB:0]."""
+    msb, lsb = bits
+    if lsb != 0:
+        raise ValueError(f"Bus '{name}' must be declared as {name}[{msb}:0].")
+    return msb + 1
+
+
+def _collect_bus_reads(expr, params, found: Dict[str, int]) -> None:
+    """Records the highest bit read from every indexed signal, ignoring macro parameters."""
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Index):
+            if node.name not in params:
+                found[node.name] = max(found.get(node.name, 0), node.msb + 1)
+        elif isinstance(node, Call):
+            stack.extend(node.args)
+        elif isinstance(node, Concat):
+            stack.extend(node.parts)
 
 
 class CircuitTransformer(Transformer):
@@ -51,6 +107,26 @@ class CircuitTransformer(Transformer):
     def variable(self, v):
         return Variable(str(v[0]))
 
+    def range(self, r):
+        msb = int(r[0])
+        lsb = int(r[1]) if r[1] is not None else msb
+        if msb < lsb:
+            raise ValueError(f"Bit range [{msb}:{lsb}] must list the most significant bit first.")
+        return (msb, lsb)
+
+    def bus_select(self, b):
+        msb, lsb = b[1]
+        return Index(str(b[0]), msb, lsb)
+
+    def concat(self, c):
+        return Concat(list(c))
+
+    def signal(self, s):
+        return (str(s[0]), s[1])
+
+    def param(self, p):
+        return (str(p[0]), p[1])
+
     def arg_list(self, a):
         return a
 
@@ -65,16 +141,25 @@ class CircuitTransformer(Transformer):
         return Call(name, args)
 
     def assignment(self, a):
-        return Assignment(target=str(a[0]), expression=a[1])
+        name, bits = a[0]
+        width = _bus_width(name, bits) if bits is not None else None
+        return Assignment(target=name, expression=a[1], width=width)
     
     def param_list(self, p):
-        return [str(param) for param in p]
+        return list(p)
 
     def macro_definition(self, m):
         name = str(m[0])
-        params = m[1] if len(m) > 2 else []
-        expr = m[2] if len(m) > 2 else m[1]
-        return MacroDef(name, params, expr)
+        params = m[1] if m[1] is not None else []
+        expr = m[2]
+        widths = {param: _bus_width(param, bits) for param, bits in params if bits is not None}
+        return MacroDef(name, [param for param, _ in params], expr, widths)
+
+    def import_statement(self, i):
+        token = i[0]
+        if token.type == 'ESCAPED_STRING':
+            return Import(str(token)[1:-1], is_path=True)
+        return Import(str(token))
 
     def start(self, s):
         """Processes the top-level statements into a single Circuit object."""
@@ -88,31 +173,71 @@ class CircuitTransformer(Transformer):
                 if item.name in circuit.macros:
                     raise ValueError(f"Macro '{item.name}' is defined more than once.")
                 circuit.macros[item.name] = item
+            elif isinstance(item, Import):
+                circuit.imports.append(item)
+
+        # Buses are the assigned signals declared with a range plus every
+        # other signal read with an index; inputs are as wide as their
+        # highest bit read.
+        reads = {}
+        for assignment in circuit.assignments.values():
+            _collect_bus_reads(assignment.expression, (), reads)
+        for macro in circuit.macros.values():
+            _collect_bus_reads(macro.expression, macro.params, reads)
+        for target, assignment in circuit.assignments.items():
+            if assignment.width is not None:
+                circuit.widths[target] = assignment.width
+        for name, width in reads.items():
+            declared = circuit.widths.get(name)
+            if declared is not None:
+                if width > declared:
+                    raise ValueError(f"Bit {width - 1} of bus '{name}' is out of range; it is {declared} bits wide.")
+            elif name in circuit.assignments:
+                raise ValueError(f"Signal '{name}' is not a bus and cannot be indexed.")
+            else:
+                circuit.widths[name] = width
         return circuit
 
 
-def parse_file(filepath: str) -> Circuit:
+_parser = None
+
+
+def _read_grammar() -> str:
+    # Use absolute path for grammar.lark
+    grammar_path = os.path.join(os.path.dirname(__file__), 'grammar.lark')
+    with open(grammar_path, 'r') as g:
+        return g.read()
+
+
+def _get_parser():
     """
-    Reads a circuit file, parses it, and transforms it into a Circuit object.
-    Includes detailed error reporting for syntax issues.
+    Builds the parser on first use and reuses it afterwards. The grammar is
+    LALR(1), which parses far faster than Earley and can be prebuilt.
     """
-    try:
-        with open(filepath, 'r') as f:
-            content = f.read()
-        
-        # Use absolute path for grammar.lark
-        grammar_path = os.path.join(os.path.dirname(__file__), 'grammar.lark')
-        with open(grammar_path, 'r') as g:
-            grammar = g.read()
+    global _parser
+    if _parser is None:
+        if Lark_StandAlone is not None:
+            _parser = Lark_StandAlone()
+        else:
+            from lark import Lark
+            _parser = Lark(_read_grammar(), start='start', parser='lalr')
+    return _parser
+
 
-        parser = Lark(grammar, start='start')
-        tree = parser.parse(content)
+def parse_string(content: str, base_dir: Optional[str] = None, sandbox: bool = False) -> Circuit:
+    """
+    Parses circuit source text and transforms it into a Circuit object.
+    Errors are reported the same way as by parse_file. Imported file paths
+    are relative to `base_dir` (default: the working directory). For
+    untrusted sources, `sandbox` confines file imports to `base_dir` and
+    refuses them without one (see library.py).
+    """
+    try:
+        tree = _get_parser().parse(content)
         
         transformer = CircuitTransformer()
         result = transformer.transform(tree)
         
-        return result
-
     except VisitError as e:
         # This handles errors that occur during the transformation phase.
         original = e.orig_exc
@@ -130,3 +255,21 @@ def parse_file(filepath: str) -> Circuit:
         # This is a fallback for unexpected errors during the parsing/transformation phase.
         raise RuntimeError(f"{type(e).__name__}: {e}") from e
 
+    if result.imports:
+        # Only circuits that import libraries load the linker
+        from library import link_imports
+        link_imports(result, base_dir, sandbox)
+    return result
+
+
+def parse_file(filepath: str) -> Circuit:
+    """
+    Reads a circuit file, parses it, and transforms it into a Circuit object.
+    Includes detailed error reporting for syntax issues.
+    """
+    try:
+        with open(filepath, 'r') as f:
+            content = f.read()
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from e
+    return parse_string(content, os.path.dirname(os.path.abspath(filepath)))
@@ -0,0 +1,255 @@
+# File: compare.py
+# Equivalence checking of two circuits through a miter.
+#
+# Both circuits are expanded to single bits and compiled into one netlist:
+# signals are renamed 'a:NAME' and 'b:NAME', inputs are shared, and for every
+# output the two have in common a 'miter:NAME' signal is the XOR of the two
+# versions. Structural hashing merges the logic the circuits have in common,
+# so an output whose two versions hash to the same node is equivalent
+# without simulating it. The rest are checked by simulating the miter from
+# reset over many lanes at once, stopping at the first step where any miter
+# output is 1:
+#
+#   1. seeded random stimulus (a quarter of it corner cases), then
+#   2. every input sequence of `steps` steps, when there are at most
+#      2^max_exhaustive_bits of them. For a circuit without D registers a
+#      single step is a complete proof; otherwise equivalence holds for all
+#      inputs up to `steps` steps after reset.
+#
+#   python compare.py original.cir optimized.cir
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from circuit_parser import Call, Circuit, Variable, parse_file
+from netlist import Netlist, _NetlistBuilder, build_step_functions
+from scoring_framework import IterativeTestGenerator, RandomStimulusGenerator
+from simulator import Simulator
+
+
+@dataclass
+class Miter:
+    """Two circuits compiled side by side with a difference signal per shared output."""
+    netlist: Netlist
+    outputs: List[str]
+    first: Callable
+    step: Callable
+    identical: List[str] = field(default_factory=list)   # outputs equal by structure
+
+    def positions(self, prefix: str) -> List[int]:
+        """Indices in the step function's values of `prefix:OUTPUT` for every output."""
+        index = {name: i for i, name in enumerate(self.netlist.signals)}
+        return [index[f"{prefix}:{name}"] for name in self.outputs]
+
+
+@dataclass
+class Mismatch:
+    """The first difference found: an output, the step and the stimulus that led to it."""
+    output: str
+    step: int
+    inputs: Dict[str, str]        # input values from reset up to and including `step`
+    values: Dict[str, str]        # the output in each circuit over the same steps
+
+
+@dataclass
+class EquivalenceResult:
+    outputs: List[str]
+    steps: int
+    equivalent: bool              # no mismatch found
+    complete: bool                # ... for every input sequence of `steps` steps
+    method: str                   # 'structural', 'random' or 'exhaustive'
+    cases: int = 0
+    registers: int = 0
+    mismatch: Optional[Mismatch] = None
+
+    def format_report(self) -> str:
+        names = f"{len(self.outputs)} shared output{'s' if len(self.outputs) != 1 else ''}"
+        if self.mismatch is not None:
+            m = self.mismatch
+            lines = [f"NOT equivalent: output {m.output} differs at step {m.step} "
+                     f"(found by {self.method} simulation after {self.cases} cases)"]
+            lines += [f"  input  {name:<8} {seq}" for name, seq in sorted(m.inputs.items())]
+            lines += [f"  {label:<6} {m.output:<8} {seq}" for label, seq in m.values.items()]
+            return "\n".join(lines)
+        if self.method == 'structural':
+            return f"Equivalent: all {names} have identical logic."
+        if self.complete:
+            scope = "for every input" if not self.registers else f"for every input sequence of {self.steps} steps after reset"
+            return f"Equivalent {scope}: {names} agree on all {self.cases} cases."
+        return (f"No difference found in {self.cases} random cases of {self.steps} steps "
+                f"on {names} (not a proof: too many inputs for exhaustive checking).")
+
+
+def _renamed(expanded: Dict[str, object], prefix: str) -> Dict[str, object]:
+    """`expanded` with every assigned signal, and reads of it, renamed 'prefix:NAME'."""
+    memo: Dict[int, object] = {}
+
+    def rename(root):
+        stack = [(root, False)]
+        while stack:
+            expr, ready = stack.pop()
+            if id(expr) in memo:
+                continue
+            if isinstance(expr, Call):
+                if not ready:
+                    stack.append((expr, True))
+                    stack.extend((arg, False) for arg in expr.args)
+                    continue
+                memo[id(expr)] = Call(expr.name, [memo[id(arg)] for arg in expr.args])
+            elif isinstance(expr, Variable) and expr.name in expanded:
+                memo[id(expr)] = Variable(f"{prefix}:{expr.name}")
+            else:
+                memo[id(expr)] = expr
+        return memo[id(root)]
+
+    return {f"{prefix}:{name}": rename(expr) for name, expr in expanded.items()}
+
+
+def _xor(x, y):
+    both = Call('NAND', [x, y])
+    return Call('NAND', [Call('NAND', [x, both]), Call('NAND', [y, both])])
+
+
+def build_miter(a: Circuit, b: Circuit, outputs: Optional[List[str]] = None) -> Miter:
+    """The miter of two circuits over `outputs` (default: every output both assign)."""
+    sims = [Simulator(a), Simulator(b)]
+    if outputs is None:
+        in_b = set(sims[1].output_names())
+        outputs = [name for name in sims[0].output_names() if name in in_b]
+    if not outputs:
+        raise ValueError("The circuits have no outputs in common.")
+    expanded, schedule = {}, []
+    for prefix, sim in zip('ab', sims):
+        bits, order = sim.bit_level()
+        missing = [name for name in outputs if name not in bits]
+        if missing:
+            raise ValueError(f"Circuit {prefix} does not assign {', '.join(missing)}.")
+        expanded.update(_renamed(bits, prefix))
+        schedule += [f"{prefix}:{name}" for name in order]
+    for name in outputs:
+        expanded[f"miter:{name}"] = _xor(Variable(f"a:{name}"), Variable(f"b:{name}"))
+        schedule.append(f"miter:{name}")
+
+    netlist = _NetlistBuilder(expanded, schedule).build()
+    first, step = build_step_functions(netlist)
+    identical = [name for name in outputs
+                 if netlist.signals[f"a:{name}"] == netlist.signals[f"b:{name}"]]
+    return Miter(netlist, list(outputs), first, step, identical)
+
+
+def _first_difference(miter: Miter, packed: Dict[str, List[int]], steps: int, lanes: int) -> Optional[Mismatch]:
+    """Simulates one packed batch on the miter; the mismatch in the lowest failing lane, if any."""
+    mask = (1 << lanes) - 1
+    columns = [packed[name] for name in miter.netlist.inputs]
+    diffs, a_values, b_values = miter.positions('miter'), miter.positions('a'), miter.positions('b')
+    history, state, step = [], [], miter.first
+    for t in range(steps):
+        values, state = step([column[t] for column in columns], state, mask)
+        step = miter.step
+        history.append(values)
+        diff = 0
+        for i in diffs:
+            diff |= values[i]
+        if diff:
+            lane = (diff & -diff).bit_length() - 1
+            k = next(k for k, i in enumerate(diffs) if (values[i] >> lane) & 1)
+
+            def sequence(words):
+                return "".join(str((word >> lane) & 1) for word in words[:t + 1])
+
+            return Mismatch(
+                output=miter.outputs[k],
+                step=t,
+                inputs={name: sequence(packed[name]) for name in miter.netlist.inputs},
+                values={'a': sequence([v[a_values[k]] for v in history]),
+                        'b': sequence([v[b_values[k]] for v in history])},
+            )
+    return None
+
+
+def check_equivalence(a: Circuit, b: Circuit, outputs: Optional[List[str]] = None,
+                      steps: Optional[int] = None, random_cases: int = 1 << 16, lanes: int = 1024,
+                      max_exhaustive_bits: int = 20, seed: int = 0,
+                      time_budget: Optional[float] = None) -> EquivalenceResult:
+    """
+    Checks that `a` and `b` produce the same outputs for the same inputs.
+
+    :param steps: Steps simulated from reset (default: 1 without D registers, else 16).
+    :param random_cases: Random cases simulated before the exhaustive check.
+    :param lanes: Cases simulated at once; a power of two.
+    :param max_exhaustive_bits: Largest number of input bits (inputs x steps)
+        enumerated exhaustively.
+    :param time_budget: Seconds after which the random phase stops.
+    """
+    miter = build_miter(a, b, outputs)
+    registers = len(miter.netlist.registers)
+    steps = steps if steps is not None else (16 if registers else 1)
+    result = EquivalenceResult(outputs=miter.outputs, steps=steps, equivalent=True,
+                               complete=False, method='random', registers=registers)
+    if len(miter.identical) == len(miter.outputs):
+        result.complete, result.method = True, 'structural'
+        return result
+
+    inputs = list(miter.netlist.inputs)
+    exhaustive_bits = len(inputs) * steps
+    exhaustive = exhaustive_bits <= max_exhaustive_bits
+    if not exhaustive or random_cases < 1 << exhaustive_bits:
+        deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        generator = RandomStimulusGenerator(inputs, steps, seed=seed, batch_size=lanes)
+        for packed in generator.batches():
+            if result.cases >= random_cases or (deadline is not None and time.perf_counter() > deadline):
+                break
+            result.cases += lanes
+            result.mismatch = _first_difference(miter, packed, steps, lanes)
+            if result.mismatch is not None:
+                result.equivalent = False
+                return result
+
+    if exhaustive:
+        result.method, result.cases = 'exhaustive', 0
+        for packed, batch_lanes in IterativeTestGenerator.packed_batches(steps, inputs, lanes):
+            result.cases += batch_lanes
+            result.mismatch = _first_difference(miter, packed, steps, batch_lanes)
+            if result.mismatch is not None:
+                result.equivalent = False
+                return result
+        result.complete = True
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check that two circuits behave identically.")
+    parser.add_argument('original', help='Reference .cir file')
+    parser.add_argument('candidate', help='.cir file compared against it')
+    parser.add_argument('-o', '--output', action='append', metavar='SIGNAL',
+                        help='Compare only these outputs (default: every output both assign)')
+    parser.add_argument('-s', '--steps', type=int,
+                        help='Steps simulated from reset (default: 1 without D registers, else 16)')
+    parser.add_argument('--random-cases', type=int, default=1 << 16,
+                        help='Random cases before exhaustive checking (default: 65536)')
+    parser.add_argument('--max-exhaustive-bits', type=int, default=20,
+                        help='Enumerate every input sequence when inputs x steps is at most this (default: 20)')
+    parser.add_argument('--seed', type=int, default=0, help='Random stimulus seed (default: 0)')
+    parser.add_argument('--time-budget', type=float, help='Seconds before the random phase stops')
+    args = parser.parse_args(argv)
+
+    try:
+        start = time.perf_counter()
+        result = check_equivalence(parse_file(args.original), parse_file(args.candidate),
+                                   outputs=args.output, steps=args.steps, random_cases=args.random_cases,
+                                   max_exhaustive_bits=args.max_exhaustive_bits, seed=args.seed,
+                                   time_budget=args.time_budget)
+    except (RuntimeError, ValueError) as e:
+        print(f"{type(e).__name__}: {e}")
+        return 2
+    print(f"a: {args.original}\nb: {args.candidate}")
+    print(result.format_report())
+    print(f"({time.perf_counter() - start:.2f} s)")
+    return 0 if result.equivalent else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,305 @@
+# File: grading.py
+# A grading queue that runs every submission under resource limits.
+#
+# Submissions are recorded in a SQLite results store and graded by running
+# the challenge's verify_circuit (as the server's `score` method does) in a
+# separate worker process per submission, at most `jobs` at a time. Each
+# worker gets a CPU-time limit and an address-space limit, and is killed
+# when it exceeds the wall-clock timeout, so a submission that expands
+# exponentially or simulates for ever only costs its own slot. Every
+# submission ends in one of the statuses below, and the queue resumes
+# where it stopped when run again on the same store.
+#
+#   python grading.py 00-checksum alice.cir bob.cir --bits 8 --jobs 4
+#   python grading.py --results
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:   # not on Windows; workers then run without limits
+    resource = None
+
+QUEUED, RUNNING = 'queued', 'running'
+PASSED, FAILED, ERROR = 'passed', 'failed', 'error'
+TIMEOUT, MEMORY, CPU = 'timeout', 'memory exceeded', 'cpu exceeded'
+
+DEFAULT_STORE = 'grading.sqlite'
+MAX_OUTPUT = 64 * 1024   # characters of the score report kept per submission
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    challenge TEXT NOT NULL,
+    circuit TEXT NOT NULL,
+    source TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    wall_s REAL,
+    cpu_s REAL,
+    max_rss_kib INTEGER,
+    submitted REAL NOT NULL,
+    finished REAL
+)
+"""
+
+
+@dataclass
+class GradingResult:
+    id: int
+    name: str
+    challenge: str
+    status: str
+    output: str = ''
+    wall_s: Optional[float] = None
+    cpu_s: Optional[float] = None
+    max_rss_kib: Optional[int] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'challenge': self.challenge,
+            'status': self.status,
+            'output': self.output,
+            'wall_s': self.wall_s,
+            'cpu_s': self.cpu_s,
+            'max_rss_kib': self.max_rss_kib,
+        }
+
+
+class ResultStore:
+    """The submissions and their results, in a SQLite database."""
+    def __init__(self, path: str = DEFAULT_STORE):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(_SCHEMA)
+
+    def add(self, name: str, challenge: str, source: str, options: Dict[str, Any]) -> int:
+        with self._db:
+            cursor = self._db.execute(
+                "INSERT INTO submissions (name, challenge, circuit, source, options, status, submitted) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, challenge, hashlib.sha256(source.encode()).hexdigest(), source,
+                 json.dumps(options), QUEUED, time.time()))
+        return cursor.lastrowid
+
+    def pending(self) -> List[sqlite3.Row]:
+        """Queued submissions, and ones left running by an interrupted run."""
+        return self._db.execute("SELECT * FROM submissions WHERE status IN (?, ?) ORDER BY id",
+                                (QUEUED, RUNNING)).fetchall()
+
+    def mark_running(self, submission_id: int) -> None:
+        with self._db:
+            self._db.execute("UPDATE submissions SET status = ? WHERE id = ?", (RUNNING, submission_id))
+
+    def finish(self, result: GradingResult) -> None:
+        with self._db:
+            self._db.execute(
+                "UPDATE submissions SET status = ?, output = ?, wall_s = ?, cpu_s = ?, max_rss_kib = ?, "
+                "finished = ? WHERE id = ?",
+                (result.status, result.output, result.wall_s, result.cpu_s, result.max_rss_kib,
+                 time.time(), result.id))
+
+    def results(self, challenge: Optional[str] = None) -> List[GradingResult]:
+        query, args = "SELECT * FROM submissions", ()
+        if challenge is not None:
+            query, args = query + " WHERE challenge = ?", (challenge,)
+        return [GradingResult(row['id'], row['name'], row['challenge'], row['status'], row['output'] or '',
+                              row['wall_s'], row['cpu_s'], row['max_rss_kib'])
+                for row in self._db.execute(query + " ORDER BY id", args)]
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _limit_resources(cpu_seconds: Optional[float], memory_mb: Optional[int]) -> None:
+    """Limits the CPU time and address space of the calling process."""
+    if cpu_seconds is not None:
+        soft = max(1, int(cpu_seconds + 0.999))
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 1))
+    if memory_mb is not None:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def grade_submission(submission: sqlite3.Row, timeout: float, cpu_seconds: Optional[float] = None,
+                     memory_mb: Optional[int] = None) -> GradingResult:
+    """Grades one stored submission in a resource-limited worker process."""
+    result = GradingResult(submission['id'], submission['name'], submission['challenge'], ERROR)
+    job = json.dumps({'challenge': submission['challenge'], 'source': submission['source'],
+                      'options': json.loads(submission['options']),
+                      'cpu_seconds': cpu_seconds, 'memory_mb': memory_mb})
+    start = time.perf_counter()
+    # The worker applies the limits to itself: preexec_fn is unsafe while
+    # other threads of the queue are starting workers too
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, start_new_session=True)
+    try:
+        stdout, stderr = process.communicate(job, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.communicate()
+        result.status = TIMEOUT
+        result.output = f"Killed after the {timeout:g} s wall-clock timeout."
+        result.wall_s = time.perf_counter() - start
+        return result
+    result.wall_s = time.perf_counter() - start
+
+    report = None
+    for line in reversed(stdout.splitlines()):
+        if line.startswith('{'):
+            report = json.loads(line)
+            break
+    if report is not None:
+        result.status = report['status']
+        result.output = report['output'][-MAX_OUTPUT:]
+        result.cpu_s, result.max_rss_kib = report['cpu_s'], report['max_rss_kib']
+    elif process.returncode in (-signal.SIGXCPU, -signal.SIGKILL) and cpu_seconds is not None:
+        result.status = CPU
+        result.output = f"Killed after {cpu_seconds:g} s of CPU time."
+    elif 'MemoryError' in stderr:
+        result.status = MEMORY
+        result.output = f"Exceeded the {memory_mb} MiB memory limit."
+    else:
+        result.output = (stderr or f"Worker exited with status {process.returncode}")[-MAX_OUTPUT:]
+    return result
+
+
+def _worker() -> int:
+    """Worker process entry point: grades the job on stdin, reports JSON on stdout."""
+    job = json.loads(sys.stdin.read())
+    if resource is not None:
+        _limit_resources(job['cpu_seconds'], job['memory_mb'])
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    try:
+        from server import _worker_score
+        score = _worker_score(job['challenge'], job['source'], None, job['options'])
+        status, output = (PASSED if score['passed'] else FAILED), score['output']
+        if not score['passed'] and 'MemoryError' in output:
+            # verify_circuit reports simulator exceptions as a failed test
+            status = MEMORY
+    except MemoryError:
+        status, output = MEMORY, "Exceeded the memory limit."
+    except RecursionError:
+        status, output = ERROR, "RecursionError: the circuit nests too deeply."
+    except Exception as e:
+        status, output = ERROR, str(e) if isinstance(e, RuntimeError) else f"{type(e).__name__}: {e}"
+    usage = resource.getrusage(resource.RUSAGE_SELF) if resource is not None else None
+    print(json.dumps({
+        'status': status,
+        'output': output,
+        'cpu_s': usage.ru_utime + usage.ru_stime if usage else None,
+        'max_rss_kib': usage.ru_maxrss if usage else None,
+    }))
+    return 0
+
+
+class GradingQueue:
+    """
+    Grades the submissions of a ResultStore, `jobs` worker processes at a
+    time, each limited to `timeout` seconds of wall-clock time,
+    `cpu_seconds` of CPU time (default: the timeout) and `memory_mb` MiB of
+    address space.
+    """
+    def __init__(self, store: ResultStore, jobs: Optional[int] = None, timeout: float = 60.0,
+                 cpu_seconds: Optional[float] = None, memory_mb: Optional[int] = 2048):
+        self.store = store
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else timeout
+        self.memory_mb = memory_mb
+
+    def submit(self, challenge: str, source: str, name: str = '', **options) -> int:
+        """Queues a circuit source for grading; returns its submission id."""
+        return self.store.add(name or 'submission', challenge, source, options)
+
+    def run(self, on_result=None) -> List[GradingResult]:
+        """Grades every pending submission; `on_result` is called as each one finishes."""
+        pending = self.store.pending()
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {}
+            for submission in pending:
+                self.store.mark_running(submission['id'])
+                futures[pool.submit(grade_submission, submission, self.timeout, self.cpu_seconds,
+                                    self.memory_mb)] = submission
+            for future in concurrent.futures.as_completed(futures):
+                submission = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:   # e.g. the worker could not be started
+                    result = GradingResult(submission['id'], submission['name'], submission['challenge'],
+                                           ERROR, f"{type(e).__name__}: {e}")
+                self.store.finish(result)
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+        return sorted(results, key=lambda r: r.id)
+
+
+def format_result(result: GradingResult) -> str:
+    usage = f"{result.wall_s:6.2f} s" if result.wall_s is not None else " " * 8
+    if result.max_rss_kib:
+        usage += f" {result.max_rss_kib / 1024:7.1f} MiB"
+    return f"#{result.id:<5} {result.name:<24} {result.challenge:<14} {result.status:<16} {usage}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Grade circuit submissions under resource limits.")
+    parser.add_argument('challenge', nargs='?', help='Challenge to grade the circuits for, e.g. 00-checksum')
+    parser.add_argument('circuits', nargs='*', help='.cir files to queue')
+    parser.add_argument('--store', default=DEFAULT_STORE, help=f'Results database (default: {DEFAULT_STORE})')
+    parser.add_argument('--jobs', '-j', type=int, help='Submissions graded at once (default: CPU count)')
+    parser.add_argument('--timeout', type=float, default=60.0,
+                        help='Wall-clock seconds per submission (default: 60)')
+    parser.add_argument('--cpu-seconds', type=float, help='CPU seconds per submission (default: the timeout)')
+    parser.add_argument('--memory-mb', type=int, default=2048,
+                        help='Address space per submission in MiB (default: 2048)')
+    parser.add_argument('--bits', type=int, help='Bit width option of the challenge')
+    parser.add_argument('--results', action='store_true', help='List the stored results and exit')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        return _worker()
+
+    store = ResultStore(args.store)
+    try:
+        if args.results:
+            for result in store.results(args.challenge):
+                print(format_result(result))
+            return 0
+        queue = GradingQueue(store, jobs=args.jobs, timeout=args.timeout, cpu_seconds=args.cpu_seconds,
+                             memory_mb=args.memory_mb)
+        if args.circuits:
+            if args.challenge is None:
+                parser.error("a challenge is required to queue circuits")
+            options = {'bits': args.bits} if args.bits is not None else {}
+            for path in args.circuits:
+                with open(path) as f:
+                    queue.submit(args.challenge, f.read(), name=os.path.basename(path), **options)
+        results = queue.run(on_result=lambda result: print(format_result(result), flush=True))
+        return 0 if all(result.status == PASSED for result in results) else 1
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,274 @@
+# File: hierarchy.py
+# Hierarchical simulation: macros are compiled once, not inlined per call.
+#
+# Every macro called from a top-level assignment becomes a cell: its body is
+# expanded and compiled into a netlist step function a single time. The top
+# level is compiled into a netlist in which each macro call is an instance
+# node that runs its cell's step function on the instance's own register
+# state, carried in the top-level state list. Memory and compile time thus
+# grow with the number of distinct cells, not with the number of calls.
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from circuit_parser import Assignment, Call, Circuit, Number, Variable
+from netlist import (CONST, DFF, INPUT, NAND, CompiledSimulator, Netlist, _NetlistBuilder,
+                     build_step_functions, compile_netlist)
+from simulator import MacroCycleError, SimulationStats, Simulator
+
+INST = 'inst'   # (INST, cell name, argument nodes in cell input order)
+
+_CELL_OUTPUT = '@out'
+
+
+@dataclass
+class Cell:
+    """A macro compiled once into a netlist and its step functions."""
+    name: str
+    params: List[str]
+    inputs: List[str]            # netlist inputs: parameters and global signals the body reads
+    combinational: List[bool]    # whether the output reads each input in the same step
+    netlist: Netlist
+    first: Callable
+    step: Callable
+    gates: Tuple[int, int]       # NAND and D count of the flattened body
+    uses: Dict[str, int] = field(default_factory=dict)   # occurrences of each parameter in the flattened body
+
+    @property
+    def stateful(self) -> bool:
+        return bool(self.netlist.registers)
+
+
+def _tree_counts(expr, memo: dict) -> Tuple[int, int, Dict[str, int]]:
+    """
+    NAND and D count of an expanded expression counted as a tree (shared
+    subexpressions once per use), plus how often each variable is read.
+    """
+    key = id(expr)
+    if key in memo:
+        return memo[key]
+    if isinstance(expr, Variable):
+        result = (0, 0, {expr.name: 1})
+    elif isinstance(expr, Number):
+        result = (0, 0, {})
+    else:
+        nand, d, uses = int(expr.name == 'NAND'), int(expr.name == 'D'), {}
+        for arg in expr.args:
+            arg_nand, arg_d, arg_uses = _tree_counts(arg, memo)
+            nand, d = nand + arg_nand, d + arg_d
+            for name, count in arg_uses.items():
+                uses[name] = uses.get(name, 0) + count
+        result = (nand, d, uses)
+    memo[key] = result
+    return result
+
+
+def compile_cell(circuit: Circuit, name: str) -> Cell:
+    """Expands macro `name` once (inlining the macros it calls) and compiles it."""
+    macro = circuit.macros[name]
+    call = Call(name, [Variable(param) for param in macro.params])
+    sim = Simulator(Circuit({_CELL_OUTPUT: Assignment(_CELL_OUTPUT, call)}, circuit.macros))
+    netlist = compile_netlist(sim)
+
+    # Inputs in the output's combinational cone; the rest only feed registers
+    reached, stack = set(), [netlist.signals[_CELL_OUTPUT]]
+    while stack:
+        node_id = stack.pop()
+        if node_id in reached:
+            continue
+        reached.add(node_id)
+        node = netlist.nodes[node_id]
+        if node[0] == NAND:
+            stack.extend(node[1:])
+        elif node[0] == DFF:
+            stack.append(node[2])
+
+    first, step = build_step_functions(netlist)
+    nand, d, uses = _tree_counts(sim.expanded_assignments[_CELL_OUTPUT], {})
+    return Cell(
+        name=name,
+        params=list(macro.params),
+        inputs=list(netlist.inputs),
+        combinational=[node in reached for node in netlist.inputs.values()],
+        netlist=netlist,
+        first=first,
+        step=step,
+        gates=(nand, d),
+        uses={param: uses.get(param, 0) for param in macro.params},
+    )
+
+
+class _HierarchyBuilder(_NetlistBuilder):
+    """Builds the top-level netlist, turning every macro call into an instance node."""
+    def __init__(self, circuit: Circuit, cells: Dict[str, Cell]):
+        self.circuit = circuit
+        self.cells = cells
+        expressions = {target: a.expression for target, a in circuit.assignments.items()}
+        dependencies = {target: self._dependencies(expr) for target, expr in expressions.items()}
+        super().__init__(expressions, Simulator._build_schedule(dependencies)[0])
+        self.instances: List[int] = []
+        self._deferred: List[Tuple[int, int, object]] = []   # (instance node, input position, argument)
+
+    def cell(self, name: str) -> Cell:
+        if name not in self.cells:
+            self.cells[name] = compile_cell(self.circuit, name)
+        return self.cells[name]
+
+    def _arguments(self, expr: Call, cell: Cell) -> list:
+        """The expressions feeding each cell input of a call."""
+        if len(expr.args) != len(cell.params):
+            raise ValueError(
+                f"Macro '{cell.name}' called with {len(expr.args)} args, "
+                f"but expected {len(cell.params)}."
+            )
+        bound = dict(zip(cell.params, expr.args))
+        return [bound.get(name, Variable(name)) for name in cell.inputs]
+
+    def _dependencies(self, expr) -> set:
+        """Signals a top-level expression reads in the same step, through instances too."""
+        names, stack = set(), [expr]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Variable):
+                names.add(node.name)
+            elif isinstance(node, Call):
+                if node.name in self.circuit.macros:
+                    cell = self.cell(node.name)
+                    stack.extend(arg for arg, comb in zip(self._arguments(node, cell), cell.combinational) if comb)
+                else:
+                    stack.extend(node.args[1:] if node.name == 'D' else node.args)
+        return names
+
+    def _build(self, expr) -> int:
+        if not (isinstance(expr, Call) and expr.name in self.circuit.macros):
+            return super()._build(expr)
+        cell = self.cell(expr.name)
+        args = self._arguments(expr, cell)
+        # Inputs the cell only reads through registers may depend on the
+        # instance's own output, so they are connected once all signals exist
+        arg_nodes = [self._build(arg) if comb else None for arg, comb in zip(args, cell.combinational)]
+        node = len(self.netlist.nodes)
+        self.netlist.nodes.append([INST, cell.name, arg_nodes])
+        self.netlist.owners.append(self._owner)
+        self.instances.append(node)
+        self._deferred.extend((node, i, arg) for i, (arg, comb) in enumerate(zip(args, cell.combinational))
+                              if not comb)
+        return node
+
+    def _resolve_pending(self) -> None:
+        while self._pending or self._deferred:
+            super()._resolve_pending()
+            while self._deferred:
+                node, position, arg = self._deferred.pop()
+                self._owner = self.netlist.owners[node]
+                self.netlist.nodes[node][2][position] = self._build(arg)
+        for node in self.instances:
+            self.netlist.nodes[node][2] = tuple(self.netlist.nodes[node][2])
+
+
+def generate_hierarchy_source(netlist: Netlist, cells: List[Cell], first: bool = False) -> str:
+    """
+    Python source for the top-level `step(I, S, M)`, like generate_step_source.
+    S holds the top-level registers followed by the register state of every
+    stateful instance. Cell i is called as F{i} on the first step and C{i}
+    afterwards.
+    """
+    cell_index = {cell.name: i for i, cell in enumerate(cells)}
+    input_index = {node: i for i, node in enumerate(netlist.inputs.values())}
+    register_index = {node: i for i, node in enumerate(netlist.registers)}
+    lines = ["def step(I, S, M):"]
+    updates, states = [], []
+    for i, node in enumerate(netlist.nodes):
+        kind = node[0]
+        if kind == INPUT:
+            lines.append(f"    n{i} = I[{input_index[i]}]")
+        elif kind == CONST:
+            lines.append(f"    n{i} = {'M' if node[1] else '0'}")
+        elif kind == NAND:
+            lines.append(f"    n{i} = M ^ (n{node[1]} & n{node[2]})")
+        elif kind == DFF:
+            lines.append(f"    n{i} = n{node[2]}" if first else f"    n{i} = S[{register_index[i]}]")
+        else:
+            index = cell_index[node[1]]
+            cell = cells[index]
+            function = f"F{index}" if first else f"C{index}"
+            state = "()" if first else f"S[{len(netlist.registers) + len(states)}]"
+            args = "".join(f"n{arg}, " for arg in node[2])
+            if not cell.stateful:
+                lines.append(f"    n{i} = {function}(({args}), (), M)[0][0]")
+            elif all(cell.combinational):
+                lines.append(f"    v, x{i} = {function}(({args}), {state}, M)")
+                lines.append(f"    n{i} = v[0]")
+                states.append(f"x{i}")
+            else:
+                # The output only needs the combinational inputs; the next state
+                # is computed once the register-only inputs are known too
+                now = "".join(f"n{arg}, " if comb else "0, " for arg, comb in zip(node[2], cell.combinational))
+                lines.append(f"    n{i} = {function}(({now}), {state}, M)[0][0]")
+                updates.append(f"    x{i} = {function}(({args}), {state}, M)[1]")
+                states.append(f"x{i}")
+    lines.extend(updates)
+    values = "".join(f"n{node}, " for node in list(netlist.signals.values()) + netlist.registers)
+    next_state = ", ".join([f"n{netlist.nodes[r][1]}" for r in netlist.registers] + states)
+    lines.append(f"    return ({values}), [{next_state}]")
+    return "\n".join(lines) + "\n"
+
+
+def build_hierarchy_functions(netlist: Netlist, cells: List[Cell]):
+    """Compiles the (first step, later steps) pair of top-level step functions."""
+    functions = []
+    for first in (True, False):
+        namespace = {}
+        for i, cell in enumerate(cells):
+            namespace[f"F{i}"], namespace[f"C{i}"] = cell.first, cell.step
+        exec(compile(generate_hierarchy_source(netlist, cells, first), '<hierarchy>', 'exec'), namespace)
+        functions.append(namespace['step'])
+    return tuple(functions)
+
+
+class HierarchicalSimulator(CompiledSimulator):
+    """
+    Drop-in for CompiledSimulator that compiles each macro once and keeps
+    one register state per call instead of inlining every call.
+    """
+    def __init__(self, circuit: Circuit, profile: bool = False):
+        if circuit.widths:
+            raise RuntimeError("RuntimeError: Hierarchical simulation does not support buses.")
+        self.circuit = circuit
+        self.stats = SimulationStats() if profile else None
+        self.cells: Dict[str, Cell] = {}
+        with self._phase('compile'):
+            try:
+                builder = _HierarchyBuilder(circuit, self.cells)
+                self.netlist = builder.build()
+            except (ValueError, TypeError, MacroCycleError) as e:
+                raise RuntimeError(f"{type(e).__name__}: {e}") from e
+            self._first, self._step = build_hierarchy_functions(self.netlist, list(self.cells.values()))
+        self.instances = len(builder.instances)
+        self.output_names = list(circuit.assignments)
+
+    def gate_counts(self) -> Dict[str, int]:
+        """NAND and D counts of the flattened circuit, as the flat engines report them."""
+        def count(expr) -> Tuple[int, int]:
+            if isinstance(expr, Call):
+                if expr.name in self.circuit.macros:
+                    cell = self.cells[expr.name]
+                    nand, d = cell.gates
+                    for param, arg in zip(cell.params, expr.args):
+                        arg_nand, arg_d = count(arg)
+                        nand += cell.uses[param] * arg_nand
+                        d += cell.uses[param] * arg_d
+                    return nand, d
+                nand, d = int(expr.name == 'NAND'), int(expr.name == 'D')
+                for arg in expr.args:
+                    arg_nand, arg_d = count(arg)
+                    nand, d = nand + arg_nand, d + arg_d
+                return nand, d
+            return 0, 0
+
+        totals = {'NAND': 0, 'D': 0}
+        for assignment in self.circuit.assignments.values():
+            nand, d = count(assignment.expression)
+            totals['NAND'] += nand
+            totals['D'] += d
+        return totals
@@ -0,0 +1,94 @@
+# File: incremental.py
+# Incremental recompilation of edited circuits.
+#
+# An IncrementalCompiler keeps the Simulator built for the previous version of
+# a circuit. When a new version arrives it diffs the two Circuit objects by
+# statement and re-expands only the assignments whose definition changed or
+# that call a changed macro; every other expansion, and the evaluation
+# schedule when the dependency graph is unchanged, is reused.
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from circuit_parser import Circuit, Call
+from simulator import Simulator
+
+
+@dataclass
+class UpdateReport:
+    """What an IncrementalCompiler.update call had to redo."""
+    reexpanded: List[str] = field(default_factory=list)
+    reused: int = 0
+    changed_macros: Set[str] = field(default_factory=set)
+    schedule_reused: bool = False
+
+
+def called_names(expr) -> Set[str]:
+    """Names of every function or macro called within an (unexpanded) expression."""
+    names, stack = set(), [expr]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Call):
+            names.add(node.name)
+            stack.extend(node.args)
+    return names
+
+
+class IncrementalCompiler:
+    """
+    Builds Simulators for successive versions of a circuit, reusing as much
+    of the previous expansion as the edit allows.
+    """
+    def __init__(self, profile: bool = False):
+        self.profile = profile
+        self.simulator: Optional[Simulator] = None
+        self.last_update: Optional[UpdateReport] = None
+
+    def _affected_macros(self, old: Circuit, new: Circuit) -> Set[str]:
+        """
+        Macros whose expansion may differ between `old` and `new`: those whose
+        definition changed, was added or removed, plus every macro calling one
+        of them, directly or transitively.
+        """
+        changed = {name for name in old.macros.keys() | new.macros.keys()
+                   if old.macros.get(name) != new.macros.get(name)}
+        calls = {name: called_names(macro.expression) for name, macro in new.macros.items()}
+        affected = set(changed)
+        grew = True
+        while grew:
+            grew = False
+            for name, callees in calls.items():
+                if name not in affected and callees & affected:
+                    affected.add(name)
+                    grew = True
+        return affected
+
+    def update(self, circuit: Circuit) -> Simulator:
+        """Returns a Simulator for `circuit`, recompiling only what changed."""
+        previous = self.simulator
+        report = UpdateReport()
+        if previous is None:
+            simulator = Simulator(circuit, profile=self.profile)
+            report.reexpanded = list(circuit.assignments)
+        else:
+            old = previous.circuit
+            affected = self._affected_macros(old, circuit)
+            report.changed_macros = affected
+            reuse = set()
+            # Bus expressions are annotated with the widths of the signals
+            # they read, so circuits with buses are always re-expanded in full
+            buses = bool(old.widths or circuit.widths)
+            for target, assignment in circuit.assignments.items():
+                if (not buses and old.assignments.get(target) == assignment
+                        and not called_names(assignment.expression) & affected):
+                    reuse.add(target)
+                else:
+                    report.reexpanded.append(target)
+            report.reused = len(reuse)
+            simulator = Simulator(circuit, profile=self.profile,
+                                  reuse_from=previous, reuse=reuse)
+            report.schedule_reused = simulator.schedule is previous.schedule
+
+        self.simulator = simulator
+        self.last_update = report
+        return simulator
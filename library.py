@@ -0,0 +1,168 @@
+# File: library.py
+# Macro libraries: `import std` or `import "path/lib.cir"` in a circuit.
+#
+# A library is a .cir file defining only macros. It is parsed once per
+# process and linked into every circuit importing it: its macros are added
+# to the circuit's macros, and each macro that only uses single bits gets a
+# template, its body with every macro it calls already inlined. Expanding a
+# call of a library macro then substitutes the arguments into the template
+# instead of expanding the nested macro calls again. Gate counts are
+# unchanged, since the flattened result is the same.
+#
+# Bundled libraries live in stdlib/ and are imported by name.
+#
+# Untrusted sources (graded and server-scored submissions) are parsed with
+# sandbox=True: a file import must then resolve, symlinks followed, inside
+# the importing file's directory, and is refused when the source has no
+# directory. The errors of a sandboxed library name it without quoting it,
+# so a submission cannot read a file through the parser's messages.
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from circuit_parser import Assignment, Call, Circuit, Import, MacroDef, Number, Variable, parse_string
+
+LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stdlib')
+
+
+@dataclass
+class MacroLibrary:
+    name: str
+    path: str
+    macros: Dict[str, MacroDef] = field(default_factory=dict)
+
+    @property
+    def templated(self) -> List[str]:
+        """Macros expanded from a prebuilt template."""
+        return [name for name, macro in self.macros.items() if macro.template is not None]
+
+
+# (path, sandboxed) -> (file version, library); files are re-read when they change
+_libraries: Dict[Tuple[str, bool], Tuple[tuple, MacroLibrary]] = {}
+_loading: Set[str] = set()
+
+
+def resolve(spec: Import, base_dir: Optional[str] = None, sandbox: bool = False) -> str:
+    """The file an import refers to; with `sandbox`, only files inside `base_dir`."""
+    if not spec.is_path:
+        return os.path.join(LIBRARY_DIR, f"{spec.name}.cir")
+    path = os.path.normpath(os.path.join(base_dir or os.getcwd(), spec.name))
+    if sandbox:
+        if base_dir is None:
+            raise RuntimeError(f"ValueError: Cannot import '{spec.name}': file imports are not allowed "
+                               f"here; import bundled libraries by name.")
+        root = os.path.realpath(base_dir)
+        if os.path.isabs(spec.name) or os.path.commonpath([root, os.path.realpath(path)]) != root:
+            raise RuntimeError(f"ValueError: Cannot import '{spec.name}': file imports must stay "
+                               f"inside the circuit's directory.")
+    return path
+
+
+def _version(path: str) -> tuple:
+    """Tells versions of a library file apart, without reading it."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        if _loader_data(path) is None:
+            raise
+        return ()   # inside the prebuilt bundle, which does not change
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _loader_data(path: str) -> Optional[bytes]:
+    """A file inside the prebuilt bundle (see bundle.py), where stdlib/ is in the zip archive."""
+    loader = globals().get('__loader__')
+    try:
+        return loader.get_data(path) if hasattr(loader, 'get_data') and '.pyz' in path else None
+    except OSError:
+        return None
+
+
+def _read(path: str) -> str:
+    data = _loader_data(path)
+    if data is not None:
+        return data.decode()
+    with open(path) as f:
+        return f.read()
+
+
+def _templatable(name: str, macros: Dict[str, MacroDef], memo: Dict[str, bool]) -> bool:
+    """Whether a macro and everything it calls work on single bits only."""
+    if name not in memo:
+        memo[name] = False   # a cycle is reported when the macro is expanded
+        macro = macros[name]
+        ok, stack = not macro.param_widths, [macro.expression]
+        while ok and stack:
+            node = stack.pop()
+            if isinstance(node, Call):
+                if node.name in macros:
+                    ok = _templatable(node.name, macros, memo)
+                stack.extend(node.args)
+            elif not isinstance(node, (Variable, Number)):
+                ok = False
+        memo[name] = ok
+    return memo[name]
+
+
+def _build_templates(macros: Dict[str, MacroDef]) -> None:
+    """Expands the body of every single-bit macro once, with its parameters left free."""
+    from simulator import Simulator
+    memo: Dict[str, bool] = {}
+    names = [name for name in macros if _templatable(name, macros, memo)]
+    calls = {name: Assignment(name, Call(name, [Variable(param) for param in macros[name].params]))
+             for name in names}
+    expanded = Simulator(Circuit(calls, macros)).expanded_assignments
+    for name in names:
+        macros[name].template = expanded[name]
+
+
+def load_library(path: str, name: str = '', sandbox: bool = False) -> MacroLibrary:
+    """
+    Parses (once per version of the file) and prepares the library at
+    `path`. With `sandbox`, its own file imports are confined to its
+    directory and its parse errors are not quoted.
+    """
+    key = os.path.abspath(path)
+    version = _version(key)
+    cached = _libraries.get((key, sandbox))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if key in _loading:
+        raise RuntimeError(f"ValueError: Library '{name or path}' imports itself.")
+    _loading.add(key)
+    try:
+        circuit = parse_string(_read(key), os.path.dirname(key), sandbox=sandbox)
+    except RuntimeError as e:
+        if not sandbox:
+            raise
+        raise RuntimeError(f"ValueError: Cannot import '{name or path}': it is not a valid "
+                           f"circuit library.") from e
+    finally:
+        _loading.discard(key)
+    if circuit.assignments:
+        raise RuntimeError(f"ValueError: Library '{name or path}' may only define macros, "
+                           f"but assigns {', '.join(circuit.assignments)}.")
+    library = MacroLibrary(name or os.path.splitext(os.path.basename(path))[0], key, circuit.macros)
+    _build_templates(library.macros)
+    _libraries[key, sandbox] = (version, library)
+    return library
+
+
+def link_imports(circuit: Circuit, base_dir: Optional[str] = None, sandbox: bool = False) -> None:
+    """Adds the macros of every library `circuit` imports to its macros."""
+    linked: Dict[str, MacroDef] = {}
+    for spec in circuit.imports:
+        try:
+            # Bundled libraries are trusted whoever imports them
+            library = load_library(resolve(spec, base_dir, sandbox), spec.name, sandbox and spec.is_path)
+        except OSError as e:
+            reason = f"{e.strerror}: {e.filename}" if spec.is_path else "no such library"
+            raise RuntimeError(f"ValueError: Cannot import '{spec.name}': {reason}.") from e
+        for macro_name, macro in library.macros.items():
+            if circuit.macros.get(macro_name, macro) is not macro or linked.get(macro_name, macro) is not macro:
+                raise RuntimeError(f"ValueError: Macro '{macro_name}' is defined more than once "
+                                   f"(also in library '{spec.name}').")
+            linked[macro_name] = macro
+    for macro_name, macro in linked.items():
+        circuit.macros.setdefault(macro_name, macro)
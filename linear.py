@@ -0,0 +1,310 @@
+# File: linear.py
+# GF(2)-linear circuits: far jumps and chunk-parallel simulation.
+#
+# Parity trackers, LFSRs and CRCs update their D registers with XOR networks
+# only. Built from NANDs, such a network is still linear over GF(2) once
+# each next-state function is written in algebraic normal form (XOR of AND
+# monomials, NAND(a, b) = 1 ^ a.b): the nonlinear terms of the gates inside
+# an XOR cancel. extract_linear() computes that form for the next-state
+# fanin of every register, over the register outputs and the inputs, and
+# succeeds when each one is affine:
+#
+#   s[t+1] = A s[t] + B x[t] + c
+#
+# The signals themselves may be any function of s[t] and x[t]; they are
+# evaluated by the compiled netlist once the state is known. Then
+#
+#   - the state at step T, for inputs that are 0 after the given ones, is a
+#     matrix power: O(log T) products of n x n bit matrices, and
+#   - a long input sequence is cut into K chunks simulated side by side in
+#     the lanes of the compiled step function. A first pass from the zero
+#     state gives each chunk's response r_k; as s[end] = A^L s[start] + r_k,
+#     a scan over the chunks yields every chunk's start state, and a second
+#     pass records the outputs. That is about 2 * T / K step evaluations.
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from circuit_parser import Circuit
+from netlist import CONST, DFF, INPUT, NAND, CompiledSimulator, Netlist
+from simulator import Simulator
+
+# Largest algebraic normal form kept per node; bigger ones are not XOR networks
+MAX_TERMS = 64
+
+# Below this many steps run() simulates step by step
+MIN_CHUNKED_STEPS = 4096
+MAX_LANES = 4096
+
+Matrix = List[int]   # rows as bit masks over the columns
+
+
+@dataclass
+class LinearModel:
+    """
+    s[t+1] = A s[t] + B x[t] + c. Row i of `rows` is the next value of
+    register i (netlist.registers order) as a bit mask: bit j < n is
+    register j, bit n + i input i (netlist.inputs order) and bit n + m the
+    constant 1.
+    """
+    registers: int
+    inputs: List[str]
+    rows: List[int]
+
+    @property
+    def state_matrix(self) -> Matrix:
+        """A, acting on the register bits alone."""
+        mask = (1 << self.registers) - 1
+        return [row & mask for row in self.rows]
+
+    @property
+    def autonomous_matrix(self) -> Matrix:
+        """[A c; 0 1]: one step with all inputs 0, on the state plus a constant-1 bit n."""
+        n, m = self.registers, len(self.inputs)
+        mask = (1 << n) - 1
+        rows = [(row & mask) | ((row >> (n + m)) & 1) << n for row in self.rows]
+        return rows + [1 << n]
+
+
+def _multiply(x: Matrix, y: Matrix) -> Matrix:
+    """x . y over GF(2)."""
+    product = []
+    for row in x:
+        acc, j = 0, 0
+        while row:
+            if row & 1:
+                acc ^= y[j]
+            row >>= 1
+            j += 1
+        product.append(acc)
+    return product
+
+
+def _apply(matrix: Matrix, vector: int) -> int:
+    """matrix . vector over GF(2)."""
+    result = 0
+    for i, row in enumerate(matrix):
+        result |= ((row & vector).bit_count() & 1) << i
+    return result
+
+
+def _power_apply(matrix: Matrix, exponent: int, vector: int) -> int:
+    """matrix^exponent . vector by repeated squaring."""
+    while exponent:
+        if exponent & 1:
+            vector = _apply(matrix, vector)
+        exponent >>= 1
+        if exponent:
+            matrix = _multiply(matrix, matrix)
+    return vector
+
+
+def _power(matrix: Matrix, exponent: int) -> Matrix:
+    result = [1 << i for i in range(len(matrix))]
+    while exponent:
+        if exponent & 1:
+            result = _multiply(result, matrix)
+        exponent >>= 1
+        if exponent:
+            matrix = _multiply(matrix, matrix)
+    return result
+
+
+def _times(p: frozenset, q: frozenset) -> frozenset:
+    """Product of two polynomials in algebraic normal form (sets of monomial bit masks)."""
+    terms = set()
+    for a in p:
+        for b in q:
+            term = a | b
+            if term in terms:
+                terms.remove(term)
+            else:
+                terms.add(term)
+    return frozenset(terms)
+
+
+def extract_linear(netlist: Netlist, max_terms: int = MAX_TERMS) -> Optional[LinearModel]:
+    """The affine next-state function of the netlist's registers, or None if it is not affine."""
+    n, m = len(netlist.registers), len(netlist.inputs)
+    variable = {node: 1 << j for j, node in enumerate(netlist.registers)}
+    variable.update((node, 1 << (n + i)) for i, node in enumerate(netlist.inputs.values()))
+    one = frozenset({0})
+    forms: Dict[int, frozenset] = {}
+
+    def form(root: int) -> Optional[frozenset]:
+        stack = [root]
+        while stack:
+            node_id = stack[-1]
+            if node_id in forms:
+                stack.pop()
+                continue
+            node = netlist.nodes[node_id]
+            if node[0] in (INPUT, DFF):
+                forms[node_id] = frozenset({variable[node_id]})
+            elif node[0] == CONST:
+                forms[node_id] = one if node[1] else frozenset()
+            elif node[0] == NAND:
+                pending = [arg for arg in node[1:] if arg not in forms]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                a, b = forms[node[1]], forms[node[2]]
+                if a is None or b is None or len(a) * len(b) > max_terms * max_terms:
+                    forms[node_id] = None
+                else:
+                    product = one ^ _times(a, b)
+                    forms[node_id] = product if len(product) <= max_terms else None
+            else:
+                return None
+            stack.pop()
+        return forms[root]
+
+    rows = []
+    constant = 1 << (n + m)
+    for register in netlist.registers:
+        terms = form(netlist.nodes[register][1])
+        if terms is None or any(term.bit_count() > 1 for term in terms):
+            return None
+        row = 0
+        for term in terms:
+            row ^= term or constant
+        rows.append(row)
+    return LinearModel(n, list(netlist.inputs), rows)
+
+
+class LinearSimulator(CompiledSimulator):
+    """
+    Drop-in for CompiledSimulator that jumps over steps and simulates long
+    runs in parallel chunks when the register update is GF(2)-affine
+    (`linear`); otherwise it simulates step by step.
+    """
+    def __init__(self, circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+        super().__init__(circuit, profile=profile, simulator=simulator)
+        with self._phase('compile'):
+            self.model = extract_linear(self.netlist)
+        self.input_names = list(self.netlist.inputs)
+        self.signal_names = list(self.netlist.signals)
+
+    @property
+    def linear(self) -> bool:
+        return self.model is not None
+
+    def _input_words(self, inputs: Dict[str, str], t: int) -> List[int]:
+        return [1 if t < len(inputs[name]) and inputs[name][t] == '1' else 0 for name in self.input_names]
+
+    def _state_bits(self, words: List[int]) -> int:
+        return sum(bit << j for j, bit in enumerate(words))
+
+    def _start(self, inputs: Dict[str, str]) -> List[int]:
+        """The register outputs at step 1 (step 0 outputs the defaults)."""
+        return self._first(self._input_words(inputs, 0), [], 1)[1]
+
+    def state_at(self, step: int, inputs: Dict[str, str]) -> List[int]:
+        """The register outputs at `step` >= 1, inputs being 0 after their given steps."""
+        self.check_inputs(inputs)
+        if step < 1:
+            raise ValueError("The register state is defined from step 1; step 0 outputs the defaults")
+        given = max((len(inputs[name]) for name in self.input_names), default=0)
+        driven = min(step, max(given, 1))
+        state = self._start(inputs)
+        if driven > 1:
+            state = self._advance(inputs, 1, driven, state)
+        if step == driven:
+            return state
+        if self.model is None:
+            zeros = [0] * len(self.input_names)
+            for _ in range(step - driven):
+                state = self._step(zeros, state, 1)[1]
+            return state
+        vector = self._state_bits(state) | 1 << self.model.registers
+        vector = _power_apply(self.model.autonomous_matrix, step - driven, vector)
+        return [(vector >> j) & 1 for j in range(self.model.registers)]
+
+    def values_at(self, step: int, inputs: Dict[str, str]) -> Dict[str, int]:
+        """The value of every input and assigned signal at `step`."""
+        self.check_inputs(inputs)
+        words = self._input_words(inputs, step)
+        if step == 0:
+            values = self._first(words, [], 1)[0]
+        else:
+            values = self._step(words, self.state_at(step, inputs), 1)[0]
+        result = dict(zip(self.input_names, words))
+        result.update(zip(self.signal_names, values))
+        return result
+
+    def _advance(self, inputs: Dict[str, str], start: int, stop: int, state: List[int]) -> List[int]:
+        """The register outputs at `stop`, given those at `start`."""
+        if self.model is None or stop - start < MIN_CHUNKED_STEPS:
+            for t in range(start, stop):
+                state = self._step(self._input_words(inputs, t), state, 1)[1]
+            return state
+        starts, _ = self._chunk_starts(inputs, start, stop, state)
+        return starts[-1]
+
+    def _chunks(self, start: int, stop: int):
+        """(lanes, steps per chunk) splitting steps start..stop-1."""
+        total = stop - start
+        lanes = max(1, min(MAX_LANES, math.isqrt(total)))
+        return lanes, -(-total // lanes)
+
+    def _chunk_words(self, inputs: Dict[str, str], start: int, stop: int, lanes: int, length: int):
+        """Per step of a chunk, the input words; lane k holds step start + k * length + j."""
+        columns = []
+        for name in self.input_names:
+            seq = inputs[name][start:stop].ljust(lanes * length, '0')
+            columns.append([int(seq[j::length][::-1], 2) for j in range(length)])
+        return [list(words) for words in zip(*columns)] if columns else [[] for _ in range(length)]
+
+    def _chunk_starts(self, inputs: Dict[str, str], start: int, stop: int, state: List[int]):
+        """
+        The register outputs at the start of every chunk (and at `stop`,
+        last), by simulating every chunk from the zero state at once and
+        scanning s[end] = A^L s[start] + r over the chunks.
+        """
+        lanes, length = self._chunks(start, stop)
+        words = self._chunk_words(inputs, start, stop, lanes, length)
+        mask = (1 << lanes) - 1
+        registers = self.model.registers
+        response = [0] * registers
+        for t in range(length):
+            response = self._step(words[t], response, mask)[1]
+        jump = _power(self.model.state_matrix, length)
+        vector = self._state_bits(state)
+        starts = []
+        for lane in range(lanes):
+            starts.append(vector)
+            vector = _apply(jump, vector) ^ sum(((word >> lane) & 1) << j for j, word in enumerate(response))
+        # The last chunk may run past `stop` on padding zeros: step back from its start
+        tail = stop - start - (lanes - 1) * length
+        last = starts[-1]
+        for t in range(tail):
+            last = self._state_bits(self._step([w >> (lanes - 1) & 1 for w in words[t]],
+                                               [(last >> j) & 1 for j in range(registers)], 1)[1])
+        starts.append(last)
+        as_words = [[(vector >> j) & 1 for j in range(registers)] for vector in starts]
+        return as_words, (lanes, length, words)
+
+    def _run(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+             coverage=None) -> Dict[str, str]:
+        if self.model is None or sinks or coverage is not None or num_steps < MIN_CHUNKED_STEPS:
+            return super()._run(inputs, num_steps, sinks=sinks, record=record, coverage=coverage)
+        self.check_inputs(inputs)
+        if not record:
+            return {}
+        first_values = self._first(self._input_words(inputs, 0), [], 1)
+        starts, (lanes, length, words) = self._chunk_starts(inputs, 1, num_steps, first_values[1])
+        # Second pass: every chunk from its start state, recording the signals
+        state = [sum(starts[lane][j] << lane for lane in range(lanes)) for j in range(self.model.registers)]
+        mask = (1 << lanes) - 1
+        columns = [[] for _ in self.signal_names]
+        for t in range(length):
+            values, state = self._step(words[t], state, mask)
+            for column, value in zip(columns, values):
+                column.append(format(value, f'0{lanes}b')[::-1])
+        results = {}
+        for name, first, column in zip(self.signal_names, first_values[0], columns):
+            if name in self.output_names:
+                trace = "".join("".join(chunk) for chunk in zip(*column))
+                results[name] = ('1' if first else '0') + trace[:num_steps - 1]
+        return {name: results.get(name, '') for name in self.output_names}
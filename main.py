@@ -1,13 +1,109 @@
 # File: main.py
 # The command-line interface for the logic circuit simulator.
 
-import argparse
+import os
+import time
 from circuit_parser import parse_file
 from simulator import Simulator
+from buses import expand_bus_names
+from backends import AUTO, create_simulator, cross_check, engine_names
+
+# Modules only some options need are imported where they are used, so a
+# plain one-shot run loads as little as possible.
+
+
+def print_results(circuit, inputs, all_results, requested=None):
+    """Prints the inputs and the requested (default: all) signal sequences."""
+    print("\n" + "="*30)
+    print("      SIMULATION RESULTS")
+    print("="*30)
+
+    signals_to_display = expand_bus_names(requested, circuit.widths) if requested else sorted(all_results.keys())
+    assigned = set(expand_bus_names(list(circuit.assignments), circuit.widths))
+
+    print("\n--- Inputs ---")
+    for name in sorted(inputs.keys()):
+        padded_name = f"{name}:".ljust(6)
+        print(f"  {padded_name} {inputs[name]}")
+
+    print("\n--- Outputs & Internal Signals ---")
+    
+    output_signals = [s for s in signals_to_display if s in assigned]
+    internal_signals = [s for s in signals_to_display if s not in assigned and s not in inputs]
+
+    if output_signals:
+        for name in sorted(output_signals):
+            padded_name = f"{name}:".ljust(6)
+            print(f"  {padded_name} {all_results.get(name, 'N/A')}")
+    
+    if internal_signals:
+        print("\n  (Internal)")
+        for name in sorted(internal_signals):
+            padded_name = f"{name}:".ljust(6)
+            print(f"  {padded_name} {all_results.get(name, 'N/A')}")
+    
+    print("\n" + "="*30)
+
+
+def open_waveform_writers(args, circuit, inputs):
+    """Opens the VCD and/or packed waveform writers requested on the command line."""
+    from waveform import VCDWriter, PackedWaveformWriter
+    assigned = expand_bus_names(list(circuit.assignments), circuit.widths)
+    known = list(inputs) + [s for s in assigned if s not in inputs]
+    default = expand_bus_names(args.output, circuit.widths) if args.output else known
+
+    def select(spec):
+        signals = expand_bus_names([s.strip() for s in spec.split(",") if s.strip()], circuit.widths) if spec else default
+        unknown = [s for s in signals if s not in known]
+        if unknown:
+            raise ValueError(f"Cannot trace unknown signals: {', '.join(unknown)}")
+        return signals
+
+    writers = []
+    if args.vcd:
+        writers.append(VCDWriter(args.vcd, select(args.vcd_signals)))
+    if args.packed:
+        writers.append(PackedWaveformWriter(args.packed, select(args.packed_signals)))
+    return writers
+
+
+def watch(circuit_file, inputs, num_steps, requested=None, interval=0.5):
+    """
+    Re-simulates `circuit_file` every time it is saved, recompiling only the
+    statements affected by each edit. Runs until interrupted with Ctrl-C.
+    """
+    from incremental import IncrementalCompiler
+    compiler = IncrementalCompiler()
+    last_mtime = None
+    print(f"Watching {circuit_file} for changes (Ctrl-C to stop)...")
+    try:
+        while True:
+            try:
+                mtime = os.stat(circuit_file).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            if mtime is not None and mtime != last_mtime:
+                last_mtime = mtime
+                try:
+                    start = time.perf_counter()
+                    circuit = parse_file(circuit_file)
+                    sim = compiler.update(circuit)
+                    compile_time = time.perf_counter() - start
+                    all_results = sim.run(inputs, num_steps)
+                    print_results(circuit, inputs, all_results, requested)
+                    report = compiler.last_update
+                    print(f"Recompiled {len(report.reexpanded)} of {len(circuit.assignments)} "
+                          f"assignments in {compile_time * 1000:.1f} ms")
+                except Exception as e:
+                    print(f"\n{type(e).__name__}: {e}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
 
 
 def main():
     """Parses command-line arguments and runs the simulation."""
+    import argparse
     parser = argparse.ArgumentParser(
         description="A digital logic circuit simulator.",
         formatter_class=argparse.RawTextHelpFormatter,
@@ -39,6 +135,109 @@ def main():
         help="Number of simulation steps. If not provided, it's inferred\n"
         "from the longest input sequence.",
     )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print per-phase timings and evaluation counters after the\n"
+        "simulation.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Re-simulate whenever the circuit file is saved, recompiling\n"
+        "only the statements affected by the edit.",
+    )
+    parser.add_argument(
+        "--coverage",
+        action="store_true",
+        help="Report which signals toggled and how many D-register states\n"
+        "were visited.",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print logic depth, fanout, register and node counts and the\n"
+        "estimated cost per step of each engine before simulating.\n"
+        "Without inputs or --steps only the report is printed.",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=engine_names(),
+        default=AUTO,
+        help="Simulation engine (default: auto, chosen from the circuit's\n"
+        "size, depth, D registers and feedback and the number of steps).\n"
+        "  interpreter   recursive evaluation; profiling counters\n"
+        "  compiled      generated Python over the NAND/D netlist\n"
+        "  hierarchical  each macro compiled once (no buses)\n"
+        "  table         (D state, inputs) lookup table, filled on first use\n"
+        "  unrolled      generated Python for up to 64 steps per call\n"
+        "  linear        parallel chunks for XOR-updated registers",
+    )
+    parser.add_argument(
+        "--hierarchical",
+        action="store_true",
+        help="Same as --engine hierarchical: compile every macro once and\n"
+        "simulate each call as an instance with its own D-register state.",
+    )
+    parser.add_argument(
+        "--transition-table",
+        action="store_true",
+        help="Same as --engine table: look steps up in a table of\n"
+        "(D-register state, inputs) -> (next state, outputs), filled\n"
+        "on first use. For circuits with few registers and inputs.",
+    )
+    parser.add_argument(
+        "--cross-check",
+        action="store_true",
+        help="Also run the inputs on every engine and report the first\n"
+        "signal and step where one disagrees with the interpreter.",
+    )
+    parser.add_argument(
+        "--at",
+        type=int,
+        metavar="T",
+        help="Only print the value of every signal at step T. Circuits\n"
+        "whose D registers are updated by XOR networks (LFSRs, CRCs,\n"
+        "parity) jump there by GF(2) matrix powers; others are\n"
+        "simulated up to T. Inputs are 0 after their given steps.",
+    )
+    parser.add_argument(
+        "--window",
+        metavar="T0:T1",
+        help="Only show steps T0 <= t < T1. The run keeps D-register\n"
+        "checkpoints instead of the full history and the window is\n"
+        "re-simulated from the nearest one.",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=int,
+        default=4096,
+        metavar="K",
+        help="Steps between checkpoints with --window (default: 4096).",
+    )
+
+    parser.add_argument(
+        "--vcd",
+        metavar="PATH",
+        help="Stream a Value Change Dump of the traced signals to PATH.",
+    )
+    parser.add_argument(
+        "--vcd-signals",
+        metavar="A,B,...",
+        help="Comma-separated signals to write to the VCD file\n"
+        "(default: the -o signals, or all inputs and signals).",
+    )
+    parser.add_argument(
+        "--packed",
+        metavar="PATH",
+        help="Stream a packed binary waveform (one bit per step) to PATH.",
+    )
+    parser.add_argument(
+        "--packed-signals",
+        metavar="A,B,...",
+        help="Comma-separated signals to write to the packed waveform\n"
+        "(default: the -o signals, or all inputs and signals).",
+    )
 
     args = parser.parse_args()
 
@@ -60,45 +259,96 @@ def main():
             max_input_len = max(max_input_len, len(seq))
 
     num_steps = args.steps if args.steps is not None else max_input_len
-    if num_steps <= 0:
+    if num_steps <= 0 and not args.stats and args.at is None:
         print("No steps to simulate (no inputs provided and --steps not set).")
         return
 
+    if args.watch:
+        watch(args.circuit_file, inputs, num_steps, args.output)
+        return
+
+    window = None
+    if args.window:
+        try:
+            window = tuple(int(part) for part in args.window.split(":"))
+        except ValueError:
+            window = ()
+        if len(window) != 2:
+            parser.error(f"Invalid window '{args.window}'. Expected 'T0:T1'.")
+
     # --- Parse, Simulate, and Display Results ---
     try:
+        parse_start = time.perf_counter()
         circuit = parse_file(args.circuit_file)
-        sim = Simulator(circuit)
-        all_results = sim.run(inputs, num_steps)
-        
-        # --- Display Results ---
-        print("\n" + "="*30)
-        print("      SIMULATION RESULTS")
-        print("="*30)
-
-        signals_to_display = args.output if args.output else sorted(all_results.keys())
-
-        print("\n--- Inputs ---")
-        for name in sorted(inputs.keys()):
-            padded_name = f"{name}:".ljust(6)
-            print(f"  {padded_name} {inputs[name]}")
-
-        print("\n--- Outputs & Internal Signals ---")
-        
-        output_signals = [s for s in signals_to_display if s in circuit.outputs]
-        internal_signals = [s for s in signals_to_display if s not in circuit.outputs and s not in inputs]
-
-        if output_signals:
-            for name in sorted(output_signals):
-                padded_name = f"{name}:".ljust(6)
-                print(f"  {padded_name} {all_results.get(name, 'N/A')}")
-        
-        if internal_signals:
-            print("\n  (Internal)")
-            for name in sorted(internal_signals):
-                padded_name = f"{name}:".ljust(6)
-                print(f"  {padded_name} {all_results.get(name, 'N/A')}")
-        
-        print("\n" + "="*30)
+        parse_time = time.perf_counter() - parse_start
+        engine = "hierarchical" if args.hierarchical else "table" if args.transition_table else args.engine
+        sim = create_simulator(circuit, engine, steps=num_steps, profile=args.profile)
+        if sim.stats is not None:
+            sim.stats.record_phase("parse", parse_time)
+        if args.stats:
+            from analysis import analyze
+            print("\n--- Circuit Statistics ---")
+            print(analyze(sim if isinstance(sim, Simulator) else Simulator(circuit)).format_report(num_steps))
+            if num_steps <= 0 and args.at is None:
+                return
+        if args.at is not None:
+            from linear import LinearSimulator
+            if args.at < 0:
+                parser.error("--at must be a step >= 0.")
+            linear = LinearSimulator(circuit)
+            values = linear.values_at(args.at, inputs)
+            how = "GF(2)-linear registers, jumped" if linear.linear else "simulated step by step"
+            print(f"\nValues at step {args.at} ({how}):")
+            signals = expand_bus_names(args.output, circuit.widths) if args.output else sorted(values)
+            for name in signals:
+                print(f"  {f'{name}:'.ljust(6)} {values.get(name, 'N/A')}")
+            return
+        coverage = None
+        if args.coverage:
+            from circuit_coverage import CoverageCollector
+            coverage = CoverageCollector()
+
+        if window is not None:
+            from checkpoint import CheckpointedRun
+            writers = open_waveform_writers(args, circuit, inputs)
+            try:
+                source = circuit if isinstance(sim, Simulator) else sim
+                run = CheckpointedRun(source, inputs, num_steps, args.checkpoint_interval, sinks=writers)
+            finally:
+                for writer in writers:
+                    writer.close()
+            signals = expand_bus_names(args.output or list(circuit.assignments), circuit.widths)
+            results = {name: run.window(name, *window) for name in signals}
+            print(f"\nSteps {window[0]} to {window[1]} ({len(run.checkpoints)} checkpoints kept):")
+            t0, t1 = window
+            shown_inputs = {name: seq[t0:t1].ljust(t1 - t0, "0") for name, seq in inputs.items()}
+            print_results(circuit, shown_inputs, results, args.output)
+        elif args.vcd or args.packed:
+            # Waveforms are written while simulating; the history is not kept
+            writers = open_waveform_writers(args, circuit, inputs)
+            try:
+                sim.run(inputs, num_steps, sinks=writers, record=False, coverage=coverage)
+            finally:
+                for writer in writers:
+                    writer.close()
+            for writer in writers:
+                print(f"Wrote {num_steps} steps of {len(writer.signals)} signals to {writer.path}")
+        else:
+            all_results = sim.run(inputs, num_steps, coverage=coverage)
+            print_results(circuit, inputs, all_results, args.output)
+
+        if args.cross_check:
+            print("\n--- Cross-check ---")
+            print(cross_check(circuit, inputs, num_steps).format_report())
+
+        if coverage is not None:
+            print("\n--- Coverage ---")
+            print(coverage.report().format_report())
+
+        if sim.stats is not None:
+            print("\n--- Profile ---")
+            print(f"Engine: {sim.engine} ({sim.engine_reason})")
+            print(sim.stats.format_report(evaluations=isinstance(sim, Simulator)))
 
     except (RuntimeError, FileNotFoundError) as e:
         print(f"\n{type(e).__name__}: {e}")
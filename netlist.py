@@ -0,0 +1,398 @@
+# File: netlist.py
+# Compiles an expanded circuit into a flat NAND/D netlist and generates
+# bit-parallel Python step functions for it.
+#
+# Every node value is a Python int used as a vector of lanes: bit l holds the
+# value in lane l, so one evaluation of the step function simulates as many
+# independent copies of the circuit as there are lanes (test cases, faults,
+# ...). With a single lane it is a plain compiled simulator.
+
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from circuit_parser import Circuit, Call, Variable, Number
+from simulator import Simulator
+
+# Node kinds. A node is a tuple whose first item is its kind:
+#   (INPUT, name)  (CONST, value)  (NAND, a, b)  (DFF, next, default)
+INPUT, CONST, NAND, DFF = 'input', 'const', 'nand', 'd'
+
+
+@dataclass
+class Netlist:
+    """
+    A flat, structurally hashed gate list. Node ids are in topological order
+    for the combinational edges (NAND fanins and D defaults); the `next`
+    fanin of a D node is read only when the step completes.
+    """
+    nodes: List[tuple] = field(default_factory=list)
+    inputs: Dict[str, int] = field(default_factory=dict)     # input name -> node
+    signals: Dict[str, int] = field(default_factory=dict)    # assigned signal -> node
+    registers: List[int] = field(default_factory=list)       # D nodes
+    owners: List[str] = field(default_factory=list)          # signal each node was built for
+
+    def label(self, node: int) -> str:
+        """A readable name for a node, e.g. 'Y' or 'Y/NAND#12'."""
+        for name, signal_node in self.signals.items():
+            if signal_node == node:
+                return name
+        kind = self.nodes[node][0]
+        return f"{self.owners[node]}/{'D' if kind == DFF else kind.upper()}#{node}"
+
+    def gate_nodes(self) -> List[int]:
+        """Ids of all NAND and D nodes."""
+        return [i for i, node in enumerate(self.nodes) if node[0] in (NAND, DFF)]
+
+
+def _expr_key(expr):
+    """Hashable structural key of an expanded expression."""
+    if isinstance(expr, Number):
+        return ('n', expr.value)
+    if isinstance(expr, Variable):
+        return ('v', expr.name)
+    return (expr.name,) + tuple(_expr_key(arg) for arg in expr.args)
+
+
+class _NetlistBuilder:
+    def __init__(self, expanded_assignments: Dict[str, object], schedule: List[str]):
+        self.expanded = expanded_assignments
+        self.schedule = schedule
+        self.netlist = Netlist()
+        self._table: Dict[tuple, int] = {}
+        self._pending: List[Tuple[int, object]] = []   # (D node, next expression)
+        # Expanded expressions share subexpressions by reference (macro arguments),
+        # so gates are memoized by object identity to visit each one once.
+        self._built: Dict[int, Tuple[object, int]] = {}
+        self._owner = ''
+
+    def _add(self, key, node) -> int:
+        existing = self._table.get(key)
+        if existing is not None:
+            return existing
+        node_id = len(self.netlist.nodes)
+        self.netlist.nodes.append(node)
+        self.netlist.owners.append(self._owner)
+        self._table[key] = node_id
+        return node_id
+
+    def _build(self, expr) -> int:
+        if isinstance(expr, Number):
+            return self._add((CONST, expr.value), (CONST, expr.value))
+        if isinstance(expr, Variable):
+            if expr.name in self.expanded:
+                node = self.netlist.signals.get(expr.name)
+                if node is None:
+                    raise RuntimeError(
+                        "RuntimeError: Combinational loop or unresolved dependency detected "
+                        f"involving signals: {set(self.expanded) - set(self.netlist.signals)}"
+                    )
+                return node
+            node = self._add((INPUT, expr.name), (INPUT, expr.name))
+            self.netlist.inputs.setdefault(expr.name, node)
+            return node
+        if isinstance(expr, Call):
+            if expr.name in ('NAND', 'Nand'):
+                if len(expr.args) != 2:
+                    raise ValueError(f"NAND requires exactly 2 arguments, but got {len(expr.args)}")
+                built = self._built.get(id(expr))
+                if built is not None:
+                    return built[1]
+                a, b = self._build(expr.args[0]), self._build(expr.args[1])
+                a, b = min(a, b), max(a, b)
+                node = self._add((NAND, a, b), (NAND, a, b))
+                self._built[id(expr)] = (expr, node)
+                return node
+            if expr.name == 'D':
+                if len(expr.args) != 2:
+                    raise ValueError(f"D function requires exactly 2 arguments (expression and default value), but got {len(expr.args)}")
+                default = self._build(expr.args[1])
+                key = (DFF, _expr_key(expr.args[0]), default)
+                if key in self._table:
+                    return self._table[key]
+                # The next-state fanin may refer to signals not built yet (feedback
+                # through the register), so it is filled in once all signals exist.
+                node = self._add(key, [DFF, None, default])
+                self.netlist.registers.append(node)
+                self._pending.append((node, expr.args[0]))
+                return node
+            raise ValueError(f"Unknown function '{expr.name}' in expanded expression.")
+        raise TypeError(f"Unknown expression type during compilation: {type(expr)}")
+
+    def build(self) -> Netlist:
+        for target in self.schedule:
+            self._owner = target
+            self.netlist.signals[target] = self._build(self.expanded[target])
+        self._resolve_pending()
+        self.netlist.nodes = [tuple(node) for node in self.netlist.nodes]
+        return self.netlist
+
+    def _resolve_pending(self) -> None:
+        """Builds the D next-state fanins left open while building the signals."""
+        while self._pending:
+            node, next_expr = self._pending.pop()
+            self._owner = self.netlist.owners[node]
+            self.netlist.nodes[node][1] = self._build(next_expr)
+
+
+def compile_netlist(sim: Simulator) -> Netlist:
+    """Compiles a Simulator's expanded assignments bit by bit, following its schedule."""
+    return _NetlistBuilder(*sim.bit_level()).build()
+
+
+def generate_step_source(netlist: Netlist, first: bool = False,
+                         faults: Optional[Dict[int, Tuple[int, int]]] = None) -> str:
+    """
+    Python source for `step(I, S, M) -> (values, next state)`.
+
+    I holds one word per input (in `netlist.inputs` order), S one word per
+    register and M is the all-lanes mask. `values` holds the word of every
+    assigned signal (in `netlist.signals` order) followed by the current
+    output of every register. With `first` the D nodes output
+    their default values (the t=0 behaviour). `faults` maps a node to an
+    (and_mask, or_mask) pair forcing selected lanes of that node's output.
+    """
+    faults = faults or {}
+    input_index = {node: i for i, node in enumerate(netlist.inputs.values())}
+    register_index = {node: i for i, node in enumerate(netlist.registers)}
+    lines = ["def step(I, S, M):"]
+    for i, node in enumerate(netlist.nodes):
+        kind = node[0]
+        if kind == INPUT:
+            expr = f"I[{input_index[i]}]"
+        elif kind == CONST:
+            expr = "M" if node[1] else "0"
+        elif kind == NAND:
+            expr = f"M ^ (n{node[1]} & n{node[2]})"
+        elif kind == DFF:
+            expr = f"n{node[2]}" if first else f"S[{register_index[i]}]"
+        else:
+            raise ValueError(f"Cannot generate code for '{kind}' nodes")
+        if i in faults:
+            and_mask, or_mask = faults[i]
+            expr = f"(({expr}) & {and_mask}) | {or_mask}"
+        lines.append(f"    n{i} = {expr}")
+    signal_values = "".join(f"n{node}, " for node in list(netlist.signals.values()) + netlist.registers)
+    next_state = ", ".join(f"n{netlist.nodes[r][1]}" for r in netlist.registers)
+    lines.append(f"    return ({signal_values}), [{next_state}]")
+    return "\n".join(lines) + "\n"
+
+
+def build_step_functions(netlist: Netlist, faults=None):
+    """Compiles the (first step, later steps) pair of step functions."""
+    functions = []
+    for first in (True, False):
+        namespace = {}
+        exec(compile(generate_step_source(netlist, first, faults), '<netlist>', 'exec'), namespace)
+        functions.append(namespace['step'])
+    return tuple(functions)
+
+
+def pack_lanes(cases: List[Dict[str, str]], signals: List[str], num_steps: int) -> Dict[str, List[int]]:
+    """
+    Packs per-case input strings into words: bit l of `packed[name][t]` is
+    the value of `name` at step t in case l. Missing steps are 0.
+    """
+    packed = {}
+    for name in signals:
+        words = [0] * num_steps
+        for lane, case in enumerate(cases):
+            seq = case.get(name, '')
+            bit = 1 << lane
+            for t in range(min(len(seq), num_steps)):
+                if seq[t] == '1':
+                    words[t] |= bit
+        packed[name] = words
+    return packed
+
+
+def unpack_lanes(packed: Dict[str, List[int]], lanes: int) -> List[Dict[str, str]]:
+    """Inverse of pack_lanes: one dict of '0'/'1' strings per lane."""
+    cases = [{} for _ in range(lanes)]
+    for name, words in packed.items():
+        for lane in range(lanes):
+            cases[lane][name] = "".join('1' if (w >> lane) & 1 else '0' for w in words)
+    return cases
+
+
+def _repeat_lanes(words: List[int], width: int, times: int) -> List[int]:
+    """Words of `width` lanes repeated `times` times side by side."""
+    if times == 1:
+        return words
+    factor = sum(1 << (width * j) for j in range(times))
+    return [word * factor for word in words]
+
+
+class CompiledSimulator:
+    """
+    Simulates a circuit by running generated straight-line Python over its
+    netlist, optionally over many lanes at once. run() is a drop-in for
+    Simulator.run.
+    """
+    def __init__(self, circuit: Circuit, profile: bool = False, simulator: Optional[Simulator] = None):
+        """`simulator`, an interpreter already built for `circuit`, saves expanding it again."""
+        self.circuit = circuit
+        self.simulator = simulator if simulator is not None else Simulator(circuit, profile=profile)
+        self.expanded_assignments = self.simulator.expanded_assignments
+        self.stats = self.simulator.stats
+        with self._phase('compile'):
+            self.netlist = compile_netlist(self.simulator)
+            self._first, self._step = build_step_functions(self.netlist)
+        self.output_names = self.simulator.output_names()
+
+    def _phase(self, name: str):
+        """Times a phase into `stats` when profiling, otherwise a no-op."""
+        return self.stats.phase(name) if self.stats is not None else nullcontext()
+
+    def step_functions(self):
+        """The compiled (first step, later steps) pair, see generate_step_source."""
+        return self._first, self._step
+
+    def check_inputs(self, provided) -> None:
+        """Raises like Simulator.run when a referenced input is not provided."""
+        missing = set(self.netlist.inputs) - set(provided)
+        if missing:
+            missing_list = ', '.join(sorted(missing))
+            raise RuntimeError(f"RuntimeError: The following signals are used in the circuit but not defined: {missing_list}")
+
+    def run_packed(self, packed_inputs: Dict[str, List[int]], num_steps: int, lanes: int,
+                   sinks=(), coverage=None) -> Dict[str, List[int]]:
+        """
+        Simulates `lanes` independent copies of the circuit. Inputs and the
+        returned signal values are lists of words, one per step (see
+        pack_lanes). Sinks get `sample(t, state)` with a dict of words; a
+        CoverageCollector also gets the register words of every step.
+        """
+        self.check_inputs(packed_inputs)
+        mask = (1 << lanes) - 1
+        columns = [packed_inputs[name] for name in self.netlist.inputs]
+        names = list(self.netlist.signals)
+        history = [[] for _ in names]
+        state = []
+        step = self._first
+        for t in range(num_steps):
+            words = [column[t] if t < len(column) else 0 for column in columns]
+            values, state = step(words, state, mask)
+            step = self._step
+            for record, value in zip(history, values):
+                record.append(value)
+            if sinks or coverage is not None:
+                sample = dict(zip(self.netlist.inputs, words))
+                sample.update(zip(names, values))
+                for sink in sinks:
+                    sink.sample(t, sample)
+                if coverage is not None:
+                    coverage.sample(t, sample)
+                    coverage.sample_registers(t, values[len(names):], lanes)
+        return dict(zip(names, history))
+
+    def run_prefix_tree(self, signal_names: List[str], num_steps: int, batch_size: int = 256,
+                        shard_index: int = 0, shard_count: int = 1):
+        """
+        Simulates every combination of `num_steps`-bit values of the input
+        signals, sharing the work of common prefixes: each node of the trie
+        of input sequences is simulated once and its register state is
+        forked to its children. Yields (packed inputs, lanes, results)
+        batches like run_packed's, covering the enumeration in another
+        order, with leaf outputs identical to simulating each case from t=0.
+
+        The input bits are ordered step by step, the first signal first. The
+        first log2(batch_size) of them vary across the lanes: lane l holds
+        the sequence whose bit p is bit p of l, so a step adds lanes by
+        repeating the words of the previous ones. The remaining bits are
+        constant within a batch and enumerated depth first, the earliest
+        bit being the most significant bit of the batch index. A shard is a
+        contiguous range of batches and only the subtrees reaching it are
+        simulated. That makes about 2 * 2^(bits) / batch_size step
+        evaluations instead of num_steps per batch.
+        """
+        if batch_size <= 0 or batch_size & (batch_size - 1):
+            raise ValueError("batch_size must be a power of two")
+        self.check_inputs(signal_names)
+        count = len(signal_names)
+        total_bits = count * num_steps
+        lane_bits = min(batch_size.bit_length() - 1, total_bits)
+        lanes = 1 << lane_bits
+        mask = (1 << lanes) - 1
+        batch_bits = total_bits - lane_bits
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard {shard_index} does not exist for {shard_count} shards")
+        num_batches = 1 << batch_bits
+        wanted = range(num_batches * shard_index // shard_count, num_batches * (shard_index + 1) // shard_count)
+        patterns = [sum(1 << lane for lane in range(lanes) if (lane >> p) & 1) for p in range(lane_bits)]
+        names = list(self.netlist.signals)
+        order = [signal_names.index(name) for name in self.netlist.inputs]
+
+        def step_words(t: int, batch: int) -> List[int]:
+            """The word of every signal at step t, for the lanes of `batch`."""
+            words = []
+            for i in range(count):
+                p = count * t + i
+                if p < lane_bits:
+                    words.append(patterns[p])
+                else:
+                    words.append(mask if (batch >> (batch_bits - 1 - (p - lane_bits))) & 1 else 0)
+            return words
+
+        def run_step(t: int, words: List[int], state: List[int], width_mask: int):
+            step = self._first if t == 0 else self._step
+            values, state = step([words[i] & width_mask for i in order], state, width_mask)
+            return values[:len(names)], state
+
+        if not wanted:
+            return
+        # Steps whose bits all vary across lanes are shared by every batch
+        inputs, history, widths, state, width, t = [], [], [], [], 1, 0
+        while t < num_steps and count * (t + 1) <= lane_bits:
+            state = _repeat_lanes(state, width, (1 << count * (t + 1)) // width)
+            width = 1 << count * (t + 1)
+            inputs.append(step_words(t, 0))
+            values, state = run_step(t, inputs[-1], state, (1 << width) - 1)
+            history.append(values)
+            widths.append(width)
+            t += 1
+        history = [_repeat_lanes(values, w, lanes // w) for values, w in zip(history, widths)]
+        state = _repeat_lanes(state, width, lanes // width)
+
+        # The rest of the trie, depth first; nodes carry the words of the steps so far
+        stack = [(t, 0, state, inputs, history)]
+        while stack:
+            t, batch, state, inputs, history = stack.pop()
+            if t == num_steps:
+                if batch not in wanted:
+                    # Reached when the shared steps consume every bit (batch_bits == 0)
+                    continue
+                packed = {name: [words[i] for words in inputs] for i, name in enumerate(signal_names)}
+                results = {name: [values[k] for values in history] for k, name in enumerate(names)}
+                yield packed, lanes, results
+                continue
+            decided = max(0, count * t - lane_bits)   # batch index bits chosen before step t
+            new_bits = max(0, count * (t + 1) - lane_bits) - decided
+            shift = batch_bits - decided - new_bits
+            for choice in reversed(range(1 << new_bits)):
+                child = batch | (choice << shift)
+                if child + (1 << shift) <= wanted.start or child >= wanted.stop:
+                    continue
+                words = step_words(t, child)
+                values, next_state = run_step(t, words, state, mask)
+                stack.append((t + 1, child, next_state, inputs + [words], history + [values]))
+
+    def run(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+            coverage=None) -> Dict[str, str]:
+        """Single-lane run with the same inputs and outputs as Simulator.run."""
+        if self.stats is None:
+            return self._run(inputs, num_steps, sinks, record, coverage)
+        with self.stats.phase('simulate'):
+            results = self._run(inputs, num_steps, sinks, record, coverage)
+        self.stats.steps += num_steps
+        return results
+
+    def _run(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+             coverage=None) -> Dict[str, str]:
+        """run() without the profiling; engines derived from this one override it."""
+        self.check_inputs(inputs)
+        packed = pack_lanes([inputs], list(self.netlist.inputs), num_steps)
+        results = self.run_packed(packed, num_steps, 1, sinks=sinks, coverage=coverage)
+        if not record:
+            return {}
+        return {name: "".join(map(str, results[name])) for name in self.output_names}
@@ -0,0 +1,268 @@
+# File: pipeline.py
+# Circuits connected output to input and simulated together.
+#
+# A pipeline is a list of stages, each a compiled circuit whose inputs are
+# either pipeline inputs or signals of earlier stages. The stages advance
+# chunk by chunk: every stage simulates `chunk_steps` steps, then hands the
+# signals later stages read to them as one int per signal (bit k is the
+# value at step chunk_start + k). Only the current chunk of each connection
+# is held, so a pipeline runs in the memory of a single streaming
+# simulation, and values are never converted to strings between stages.
+# chunk_steps=1 advances the stages in lockstep.
+#
+#   python pipeline.py encoder.cir decoder.cir -i I=10110 -o decoder.O
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from circuit_parser import Circuit, parse_file
+from netlist import CompiledSimulator
+
+# A pipeline input: a '0'/'1' string or any iterable of 0/1 values
+Stream = Union[str, Iterable[int]]
+
+
+@dataclass
+class Stage:
+    name: str
+    simulator: CompiledSimulator
+    sources: Dict[str, str]                 # circuit input -> 'stage.signal' or pipeline input
+    state: List[int] = field(default_factory=list)
+    started: bool = False
+
+    @property
+    def inputs(self) -> List[str]:
+        return list(self.simulator.netlist.inputs)
+
+    @property
+    def signals(self) -> List[str]:
+        return list(self.simulator.netlist.signals)
+
+
+class Pipeline:
+    """Compiled circuits connected by signal mappings, simulated chunk by chunk."""
+
+    def __init__(self, chunk_steps: int = 4096):
+        if chunk_steps <= 0:
+            raise ValueError("chunk_steps must be positive")
+        self.chunk_steps = chunk_steps
+        self.stages: List[Stage] = []
+
+    @property
+    def inputs(self) -> List[str]:
+        """The pipeline inputs the stages read, in order of first use."""
+        names = []
+        for stage in self.stages:
+            for source in stage.sources.values():
+                if '.' not in source and source not in names:
+                    names.append(source)
+        return names
+
+    def _stage(self, name: str) -> Stage:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise ValueError(f"Unknown stage '{name}'")
+
+    def add_stage(self, name: str, circuit: Union[Circuit, CompiledSimulator],
+                  connect: Optional[Dict[str, str]] = None) -> Stage:
+        """
+        Appends a stage. `connect` maps its inputs to 'stage.signal' of an
+        earlier stage or to a pipeline input name; an input it does not map
+        is connected to the latest earlier stage assigning a signal of that
+        name, or else to the pipeline input of that name.
+        """
+        if '.' in name or any(stage.name == name for stage in self.stages):
+            raise ValueError(f"Invalid or duplicate stage name '{name}'")
+        simulator = circuit if isinstance(circuit, CompiledSimulator) else CompiledSimulator(circuit)
+        connect = dict(connect or {})
+        unknown = [port for port in connect if port not in simulator.netlist.inputs]
+        if unknown:
+            raise ValueError(f"Stage '{name}' has no input {', '.join(unknown)}")
+        sources = {}
+        for port in simulator.netlist.inputs:
+            source = connect.get(port)
+            if source is None:
+                source = next((f"{stage.name}.{port}" for stage in reversed(self.stages)
+                               if port in stage.simulator.netlist.signals), port)
+            elif '.' in source:
+                stage_name, signal = source.split('.', 1)
+                if signal not in self._stage(stage_name).simulator.netlist.signals:
+                    raise ValueError(f"Stage '{stage_name}' does not assign '{signal}'")
+            sources[port] = source
+        stage = Stage(name, simulator, sources)
+        self.stages.append(stage)
+        return stage
+
+    def reset(self) -> None:
+        """Returns every stage to step 0."""
+        for stage in self.stages:
+            stage.state, stage.started = [], False
+
+    def _advance(self, stage: Stage, columns: List[int], count: int, wanted: List[int]) -> List[int]:
+        """Simulates `count` steps of a stage; returns the chunk of every wanted signal."""
+        first, step = stage.simulator.step_functions()
+        state = stage.state
+        chunks = [0] * len(wanted)
+        for k in range(count):
+            words = [(column >> k) & 1 for column in columns]
+            if stage.started:
+                values, state = step(words, state, 1)
+            else:
+                values, state = first(words, state, 1)
+                stage.started = True
+            for i, index in enumerate(wanted):
+                if values[index]:
+                    chunks[i] |= 1 << k
+        stage.state = state
+        return chunks
+
+    def stream(self, inputs: Dict[str, Stream], num_steps: int,
+               outputs: Optional[List[str]] = None) -> Iterator[Tuple[int, int, Dict[str, int]]]:
+        """
+        Simulates `num_steps` more steps and yields (chunk start, steps,
+        {'stage.signal': chunk int}) for the `outputs` (default: every
+        signal of the last stage). Missing input values are 0.
+        """
+        missing = [name for name in self.inputs if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing pipeline inputs: {', '.join(missing)}")
+        if outputs is None:
+            last = self.stages[-1]
+            outputs = [f"{last.name}.{signal}" for signal in last.signals]
+        for name in outputs:
+            stage_name, _, signal = name.partition('.')
+            if signal not in self._stage(stage_name).simulator.netlist.signals:
+                raise ValueError(f"Stage '{stage_name}' does not assign '{signal}'")
+        needed = set(outputs)
+        for stage in self.stages:
+            needed.update(source for source in stage.sources.values() if '.' in source)
+        wanted = []
+        for stage in self.stages:
+            index = {signal: i for i, signal in enumerate(stage.signals)}
+            names = [name for name in needed if name.split('.', 1)[0] == stage.name]
+            wanted.append((names, [index[name.split('.', 1)[1]] for name in names]))
+        readers = {name: _chunk_reader(inputs[name]) for name in self.inputs}
+
+        start = 0
+        while start < num_steps:
+            count = min(self.chunk_steps, num_steps - start)
+            current = {name: reader(count) for name, reader in readers.items()}
+            for stage, (names, indices) in zip(self.stages, wanted):
+                columns = [current[stage.sources[port]] for port in stage.inputs]
+                current.update(zip(names, self._advance(stage, columns, count, indices)))
+            yield start, count, {name: current[name] for name in outputs}
+            start += count
+
+    def run(self, inputs: Dict[str, Stream], num_steps: int, outputs: Optional[List[str]] = None,
+            sinks=(), record: bool = True) -> Dict[str, str]:
+        """
+        Simulates from step 0 and returns the '0'/'1' sequence of every
+        output, like Simulator.run. Sinks get `sample(t, values)` with the
+        outputs every step; with record=False only the sinks see them.
+        """
+        self.reset()
+        parts: Dict[str, List[str]] = {}
+        for start, count, chunks in self.stream(inputs, num_steps, outputs):
+            for k in range(count if sinks else 0):
+                sample = {name: (chunk >> k) & 1 for name, chunk in chunks.items()}
+                for sink in sinks:
+                    sink.sample(start + k, sample)
+            if record:
+                for name, chunk in chunks.items():
+                    parts.setdefault(name, []).append(format(chunk, f'0{count}b')[::-1] if count else '')
+        if not record:
+            return {}
+        names = outputs if outputs is not None else [f"{self.stages[-1].name}.{signal}"
+                                                     for signal in self.stages[-1].signals]
+        return {name: "".join(parts.get(name, [])) for name in names}
+
+
+def _chunk_reader(stream: Stream):
+    """A function returning the next `count` values of a stream as an int (bit k = k-th value)."""
+    if isinstance(stream, str):
+        position = 0
+
+        def read_string(count: int) -> int:
+            nonlocal position
+            bits = stream[position:position + count]
+            position += count
+            return int(bits[::-1], 2) if bits else 0
+        return read_string
+    values = iter(stream)
+
+    def read(count: int) -> int:
+        chunk = 0
+        for k in range(count):
+            if next(values, 0):
+                chunk |= 1 << k
+        return chunk
+    return read
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Simulate circuits connected output to input.",
+        epilog="Inputs of a stage are connected to the latest earlier stage assigning a signal "
+               "of the same name unless --connect says otherwise; the others are pipeline inputs.")
+    parser.add_argument('circuits', nargs='+', help='.cir files, in pipeline order (stage name: file stem)')
+    parser.add_argument('-c', '--connect', action='append', default=[], metavar='STAGE.INPUT=SOURCE',
+                        help="Feed a stage input from STAGE.SIGNAL or from a pipeline input")
+    parser.add_argument('-i', '--input', action='append', default=[], metavar='NAME=SEQUENCE',
+                        help='Defines a pipeline input')
+    parser.add_argument('-o', '--output', action='append', metavar='STAGE.SIGNAL',
+                        help='Signal to show (default: every signal of the last stage)')
+    parser.add_argument('-s', '--steps', type=int,
+                        help='Steps to simulate (default: the longest input sequence)')
+    parser.add_argument('--chunk-steps', type=int, default=4096,
+                        help='Steps each stage simulates before handing its outputs on (default: 4096)')
+    parser.add_argument('--packed', metavar='PATH',
+                        help='Stream the outputs to a packed waveform instead of printing them')
+    args = parser.parse_args(argv)
+
+    inputs = {}
+    for spec in args.input:
+        name, _, seq = spec.partition('=')
+        if not seq or any(c not in '01' for c in seq):
+            parser.error(f"Invalid input '{spec}'. Expected 'NAME=SEQUENCE' with a binary sequence.")
+        inputs[name] = seq
+    connections: Dict[str, Dict[str, str]] = {}
+    for spec in args.connect:
+        port, _, source = spec.partition('=')
+        stage, _, name = port.partition('.')
+        if not name or not source:
+            parser.error(f"Invalid connection '{spec}'. Expected 'STAGE.INPUT=SOURCE'.")
+        connections.setdefault(stage, {})[name] = source
+    num_steps = args.steps if args.steps is not None else max(map(len, inputs.values()), default=0)
+
+    try:
+        pipeline = Pipeline(args.chunk_steps)
+        for path in args.circuits:
+            name = os.path.splitext(os.path.basename(path))[0]
+            pipeline.add_stage(name, parse_file(path), connections.pop(name, None))
+        if connections:
+            raise ValueError(f"Unknown stage '{next(iter(connections))}' in --connect")
+        if args.packed:
+            from waveform import PackedWaveformWriter
+            outputs = args.output or [f"{pipeline.stages[-1].name}.{signal}"
+                                      for signal in pipeline.stages[-1].signals]
+            with PackedWaveformWriter(args.packed, outputs) as writer:
+                pipeline.run(inputs, num_steps, outputs, sinks=[writer], record=False)
+            print(f"Wrote {num_steps} steps of {len(outputs)} signals to {args.packed}")
+            return 0
+        results = pipeline.run(inputs, num_steps, args.output)
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        print(f"{type(e).__name__}: {e}")
+        return 1
+    for name in pipeline.inputs:
+        print(f"  {f'{name}:'.ljust(12)} {inputs.get(name, '')}")
+    for name, seq in results.items():
+        print(f"  {f'{name}:'.ljust(12)} {seq}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
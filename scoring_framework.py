@@ -6,17 +6,60 @@ scoring scripts, eliminating code duplication and providing a consistent
 interface for circuit verification.
 """
 
+import json
+import marshal
 import os
+import random
 import sys
-from typing import Dict, Any, Callable, Optional, List
+import time
+from typing import Dict, Any, Callable, Iterable, Iterator, Optional, List, Tuple
 from abc import ABC, abstractmethod
 
+# Above this many test cases challenges switch from exhaustive enumeration
+# (streamed in packed batches) to constrained-random stimulus.
+MAX_EXHAUSTIVE_CASES = 1 << 24
+
 
 class ScoringFramework:
     """Base framework for circuit scoring with common functionality."""
     
-    def __init__(self):
-        """Initialize the scoring framework."""
+    def __init__(self, profile: bool = False, report_fault_coverage: bool = False,
+                 report_coverage: bool = False, random_stimulus: bool = False,
+                 seed: int = 0, time_budget: float = 10.0,
+                 target_coverage: Optional[float] = None, shard: Tuple[int, int] = (0, 1),
+                 golden_cache_dir: Optional[str] = None, engine: str = 'auto',
+                 target_state_coverage: Optional[float] = None):
+        """Initialize the scoring framework.
+
+        Args:
+            profile: Collect simulator instrumentation during run_circuit_test
+                and emit it as a JSON line after the results.
+            report_fault_coverage: After a passing run_circuit_test, report how
+                many stuck-at faults the test set detects.
+            report_coverage: Report the toggle and D-register state coverage
+                reached by the test cases of run_circuit_test.
+            random_stimulus: Ask challenges to verify with run_random_test
+                instead of exhaustive enumeration.
+            seed, time_budget, target_coverage, target_state_coverage:
+                Defaults for run_random_test.
+            shard: (shard index, shard count) of the exhaustive enumeration
+                that challenges score.
+            golden_cache_dir: Directory in which run_batch_test keeps the
+                reference outputs of each challenge configuration.
+            engine: Simulation engine of the test methods (see backends.py);
+                'auto' picks one from the circuit and the workload.
+        """
+        self.profile = profile
+        self.report_fault_coverage = report_fault_coverage
+        self.report_coverage = report_coverage
+        self.random_stimulus = random_stimulus
+        self.seed = seed
+        self.time_budget = time_budget
+        self.target_coverage = target_coverage
+        self.target_state_coverage = target_state_coverage
+        self.shard = shard
+        self.golden_cache_dir = golden_cache_dir
+        self.engine = engine
         self._setup_imports()
     
     def _setup_imports(self) -> None:
@@ -28,10 +71,11 @@ class ScoringFramework:
         try:
             # Lazy import so the modules are only loaded if the script is run
             from simulator import Simulator  # type: ignore
-            from circuit_parser import parse_file, Call  # type: ignore
+            from circuit_parser import parse_file, Call, Concat  # type: ignore
             self.Simulator = Simulator
             self.parse_file = parse_file
             self.Call = Call
+            self.Concat = Concat
         except ImportError as e:
             print("Error: Could not import required modules. Make sure you're running from the project root or challenges directory.")
             print(f"Project root detected as: {root_dir}")
@@ -41,29 +85,18 @@ class ScoringFramework:
     def _find_project_root(self) -> str:
         """Find the project root directory containing simulator.py and circuit_parser.py.
 
-        The scoring script may be run from within the challenge directory or from
-        elsewhere. This helper walks up the directory hierarchy until it finds
-        required files to ensure imports work.
+        This module lives in the project root (or in the same bundle as the
+        simulator), so its own directory is the root. Scoring scripts may be
+        run from anywhere; no stack inspection is needed to locate it.
         """
-        # Start from the directory containing the file that's importing this framework
-        import inspect
-        caller_file = inspect.stack()[2].filename  # Get the file that called this
-        current_dir = os.path.dirname(os.path.abspath(caller_file))
-        
-        while current_dir != os.path.dirname(current_dir):
-            required_files = ['simulator.py', 'circuit_parser.py']
-            required_paths = [os.path.join(current_dir, f) for f in required_files]
-            if all(os.path.exists(path) for path in required_paths):
-                return current_dir
-            current_dir = os.path.dirname(current_dir)
-        return os.path.dirname(os.path.abspath(caller_file))
+        return os.path.dirname(os.path.abspath(__file__))
     
     def _count_gates(self, expr) -> Dict[str, int]:
         """
         Recursively count NAND and D gates in an expanded expression.
         
         Args:
-            expr: An expression node (Call, Variable, or Number)
+            expr: An expression node (Call, Concat, Index, Variable, or Number)
             
         Returns:
             Dictionary with counts for 'NAND' and 'D' gates
@@ -71,17 +104,22 @@ class ScoringFramework:
         counts = {'NAND': 0, 'D': 0}
         
         if isinstance(expr, self.Call):
-            # Count this gate if it's NAND or D
+            # Count this gate if it's NAND or D; a bus gate is one gate per bit
             if expr.name == 'NAND':
-                counts['NAND'] += 1
+                counts['NAND'] += expr.width
             elif expr.name == 'D':
-                counts['D'] += 1
+                counts['D'] += expr.width
             
             # Recursively count gates in arguments
             for arg in expr.args:
                 sub_counts = self._count_gates(arg)
                 counts['NAND'] += sub_counts['NAND']
                 counts['D'] += sub_counts['D']
+        elif isinstance(expr, self.Concat):
+            for part in expr.parts:
+                sub_counts = self._count_gates(part)
+                counts['NAND'] += sub_counts['NAND']
+                counts['D'] += sub_counts['D']
         
         return counts
     
@@ -90,11 +128,14 @@ class ScoringFramework:
         Count total NAND and D gates in the circuit after macro expansion.
         
         Args:
-            sim: Simulator instance with expanded assignments
+            sim: Simulator instance with expanded assignments, or an engine
+                reporting its own gate_counts()
             
         Returns:
             Dictionary with total counts for 'NAND' and 'D' gates
         """
+        if hasattr(sim, 'gate_counts'):
+            return sim.gate_counts()
         total_counts = {'NAND': 0, 'D': 0}
         
         # expanded_assignments is a dict mapping signal names to expanded expressions
@@ -107,7 +148,7 @@ class ScoringFramework:
     
     def run_circuit_test(self, 
                         circuit_file: str,
-                        test_cases: List[Dict[str, Any]],
+                        test_cases: Iterable[Dict[str, Any]],
                         steps: int,
                         validator: Callable[[Dict[str, str], Dict[str, Any]], bool],
                         error_reporter: Optional[Callable[[Dict[str, Any], Dict[str, str], Dict[str, str]], None]] = None) -> bool:
@@ -116,7 +157,8 @@ class ScoringFramework:
         
         Args:
             circuit_file: Path to the circuit file
-            test_cases: List of test case dictionaries with 'inputs' and 'expected' keys
+            test_cases: Test case dictionaries with 'inputs' and 'expected'
+                keys; a generator is consumed lazily
             steps: Number of simulation steps
             validator: Function to validate outputs against expected results
             error_reporter: Optional function to report detailed errors
@@ -125,18 +167,32 @@ class ScoringFramework:
             True if all tests pass, False otherwise
         """
         try:
+            parse_start = time.perf_counter()
             circuit = self.parse_file(circuit_file)
-            sim = self.Simulator(circuit)
+            parse_time = time.perf_counter() - parse_start
+            from backends import create_simulator  # type: ignore
+            # The engine is built once and reused, so it is chosen for the whole test set
+            runs = len(test_cases) if isinstance(test_cases, list) else 1
+            sim = create_simulator(circuit, self.engine, steps=steps * runs, profile=self.profile)
+            if sim.stats is not None:
+                sim.stats.record_phase('parse', parse_time)
             
             # Count gates after macro expansion
             gate_counts = self.count_circuit_gates(sim)
+            if self.report_fault_coverage and not isinstance(test_cases, list):
+                # The fault simulation replays the test set
+                test_cases = list(test_cases)
+            coverage = None
+            if self.report_coverage:
+                from circuit_coverage import CoverageCollector  # type: ignore
+                coverage = CoverageCollector()
             
             for test_case in test_cases:
                 inputs = test_case['inputs']
                 expected = test_case.get('expected', {})
                 
                 # Run simulation
-                outputs = sim.run(inputs, steps)
+                outputs = sim.run(inputs, steps, coverage=coverage)
                 
                 # Validate results
                 if not validator(outputs, test_case):
@@ -144,10 +200,100 @@ class ScoringFramework:
                         error_reporter(test_case, outputs, expected)
                     else:
                         self._default_error_reporter(test_case, outputs, expected)
+                    self._emit_profile(sim)
                     return False
             
             print("Success! Circuit produces correct outputs for all inputs.")
             print(f"Gates used: {gate_counts['NAND']} NAND, {gate_counts['D']} D")
+            if self.report_fault_coverage:
+                report = self.measure_fault_coverage(circuit, test_cases, steps)
+                print(report.format_report())
+            if coverage is not None:
+                print(coverage.report().format_report())
+            self._emit_profile(sim)
+            return True
+            
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"\n{type(e).__name__}: {e}")
+            return False
+        except Exception as e:
+            print(f"\n{type(e).__name__}: {e}")
+            return False
+    
+    def run_random_test(self,
+                        circuit_file: str,
+                        signal_names: List[str],
+                        steps: int,
+                        validator: Callable[[Dict[str, str], Dict[str, Any]], bool],
+                        error_reporter: Optional[Callable[[Dict[str, Any], Dict[str, str], Dict[str, str]], None]] = None,
+                        seed: Optional[int] = None,
+                        time_budget: Optional[float] = None,
+                        target_coverage: Optional[float] = None,
+                        target_state_coverage: Optional[float] = None,
+                        max_cases: Optional[int] = None,
+                        reference: Optional[Callable[[Dict[str, List[int]], int], Dict[str, List[Optional[int]]]]] = None) -> bool:
+        """
+        Circuit testing with seeded constrained-random stimulus, for challenge
+        variants too wide to enumerate. Batches of test cases are simulated
+        bit-parallel on the compiled netlist and validated case by case.
+        
+        Args:
+            circuit_file: Path to the circuit file
+            signal_names: Input signals to drive with random values
+            steps: Number of simulation steps (bits per input)
+            validator: Function to validate outputs against expected results
+            error_reporter: Optional function to report detailed errors
+            seed: Random seed; the same seed gives the same test cases
+            time_budget: Seconds after which no new batch is started
+            target_coverage: Stop once this fraction of signals has toggled
+            target_state_coverage: Stop once this fraction of the D-register
+                states has been visited
+            max_cases: Stop after this many test cases
+            reference: Optional batch validator (see run_batch_test) used
+                instead of calling `validator` for every case
+            
+        Returns:
+            True if all generated tests pass, False otherwise
+        """
+        from backends import create_simulator, run_packed  # type: ignore
+        from circuit_coverage import CoverageCollector  # type: ignore
+        seed = self.seed if seed is None else seed
+        time_budget = self.time_budget if time_budget is None else time_budget
+        target_coverage = self.target_coverage if target_coverage is None else target_coverage
+        if target_state_coverage is None:
+            target_state_coverage = self.target_state_coverage
+        try:
+            circuit = self.parse_file(circuit_file)
+            generator = RandomStimulusGenerator(signal_names, steps, seed=seed)
+            sim = create_simulator(circuit, self.engine, steps=steps, batch=generator.batch_size)
+            gate_counts = self.count_circuit_gates(sim)
+            coverage = CoverageCollector()
+            start = time.perf_counter()
+            cases = 0
+            for packed in generator.batches():
+                lanes = generator.batch_size
+                results = run_packed(sim, packed, steps, lanes, coverage=coverage)
+                expected = reference(packed, lanes) if reference is not None else None
+                failure = self._batch_failure(packed, results, lanes, validator, expected)
+                if failure is not None:
+                    self._report_failure(failure, error_reporter)
+                    print(f"(random stimulus, seed {seed})")
+                    return False
+                cases += lanes
+                report = coverage.report()
+                targets = [(target_coverage, report.toggle_coverage),
+                           (target_state_coverage, report.state_coverage)]
+                targets = [(target, reached) for target, reached in targets if target is not None]
+                if targets and all(reached >= target for target, reached in targets):
+                    break
+                if max_cases is not None and cases >= max_cases:
+                    break
+                if time.perf_counter() - start >= time_budget:
+                    break
+            
+            print(f"Success! Circuit produces correct outputs for {cases} random inputs (seed {seed}).")
+            print(f"Gates used: {gate_counts['NAND']} NAND, {gate_counts['D']} D")
+            print(coverage.report().format_report())
             return True
             
         except (RuntimeError, FileNotFoundError) as e:
@@ -157,6 +303,168 @@ class ScoringFramework:
             print(f"\n{type(e).__name__}: {e}")
             return False
     
+    def run_batch_test(self,
+                       circuit_file: str,
+                       signal_names: List[str],
+                       steps: int,
+                       reference: Callable[[Dict[str, List[int]], int], Dict[str, List[Optional[int]]]],
+                       error_reporter: Optional[Callable[[Dict[str, Any], Dict[str, str], Dict[str, str]], None]] = None,
+                       batch_size: int = 256,
+                       cache_key: Optional[str] = None,
+                       shard: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        Exhaustive circuit testing in packed batches: every combination of
+        `steps`-bit values of the input signals is simulated bit-parallel on
+        the compiled netlist and checked against a vectorized reference model,
+        so memory stays flat however many cases there are. Cases are arranged
+        as a prefix trie whose nodes are each simulated once, forking the
+        register state where sequences diverge (see
+        CompiledSimulator.run_prefix_tree); with coverage reporting they are
+        simulated whole, in the order of IterativeTestGenerator.packed_batches.
+        
+        Args:
+            circuit_file: Path to the circuit file
+            signal_names: Input signals to enumerate
+            steps: Number of simulation steps (bits per input)
+            reference: Batch validator called with the packed inputs of a
+                batch (see netlist.pack_lanes) and its number of lanes; returns
+                the expected words of every checked output signal, one per
+                step, with None for steps that are not checked
+            error_reporter: Optional function to report detailed errors
+            batch_size: Test cases per batch, a power of two
+            cache_key: Names the challenge configuration; when the framework
+                has a golden cache directory, reference outputs are stored
+                there and reused by later runs
+            shard: (shard index, shard count) of the enumeration to test;
+                defaults to the framework's shard
+            
+        Returns:
+            True if all tests of the shard pass, False otherwise
+        """
+        from backends import create_simulator, run_packed  # type: ignore
+        shard_index, shard_count = self.shard if shard is None else shard
+        golden = None
+        passed = False
+        try:
+            circuit = self.parse_file(circuit_file)
+            sim = create_simulator(circuit, self.engine, steps=steps, batch=batch_size)
+            gate_counts = self.count_circuit_gates(sim)
+            coverage = None
+            if self.report_coverage:
+                from circuit_coverage import CoverageCollector  # type: ignore
+                coverage = CoverageCollector()
+            num_batches = -(-(1 << (steps * len(signal_names))) // batch_size)
+            if coverage is None and hasattr(sim, 'run_prefix_tree') and num_batches >= shard_count:
+                # Cases sharing a prefix share its simulation (see run_prefix_tree)
+                batches = sim.run_prefix_tree(signal_names, steps, batch_size, shard_index, shard_count)
+                order = 'trie'
+            else:
+                batches = ((packed, lanes, run_packed(sim, packed, steps, lanes, coverage=coverage))
+                           for packed, lanes in IterativeTestGenerator.packed_batches(
+                               steps, signal_names, batch_size, shard_index, shard_count))
+                order = 'lex'
+            if self.golden_cache_dir and cache_key:
+                golden = GoldenCache(self.golden_cache_dir,
+                                     f"{cache_key}-{order}-b{batch_size}-s{shard_index}of{shard_count}")
+            
+            cases = 0
+            for packed, lanes, results in batches:
+                if golden is not None:
+                    expected = golden.expected(reference, packed, lanes)
+                else:
+                    expected = reference(packed, lanes)
+                failure = self._batch_failure(packed, results, lanes, None, expected)
+                if failure is not None:
+                    self._report_failure(failure, error_reporter)
+                    return False
+                cases += lanes
+            
+            passed = True
+            if cases == 0 and shard_count > 1:
+                print(f"Shard {shard_index}/{shard_count} is empty: the enumeration has fewer inputs "
+                      f"than shards, so nothing was tested.")
+            elif shard_count == 1:
+                print("Success! Circuit produces correct outputs for all inputs.")
+            else:
+                print(f"Success! Circuit produces correct outputs for all {cases} inputs "
+                      f"of shard {shard_index}/{shard_count}.")
+            print(f"Gates used: {gate_counts['NAND']} NAND, {gate_counts['D']} D")
+            if coverage is not None:
+                print(coverage.report().format_report())
+            return True
+            
+        except (RuntimeError, FileNotFoundError) as e:
+            print(f"\n{type(e).__name__}: {e}")
+            return False
+        except Exception as e:
+            print(f"\n{type(e).__name__}: {e}")
+            return False
+        finally:
+            if golden is not None:
+                golden.close(keep=passed)
+    
+    def _batch_failure(self, packed: Dict[str, List[int]], results: Dict[str, List[int]], lanes: int,
+                       validator=None, expected=None):
+        """
+        The first failing case of a simulated batch as (test case, outputs),
+        or None. Expected words are compared for all lanes at once; without
+        them every case goes through the per-case validator.
+        """
+        from netlist import unpack_lanes  # type: ignore
+        if expected is None:
+            for inputs, outputs in zip(unpack_lanes(packed, lanes), unpack_lanes(results, lanes)):
+                if not validator(outputs, {'inputs': inputs}):
+                    return {'inputs': inputs}, outputs
+            return None
+        failing = 0
+        for name, words in expected.items():
+            if name not in results:
+                failing = (1 << lanes) - 1
+                break
+            for actual, want in zip(results[name], words):
+                if want is not None:
+                    failing |= actual ^ want
+        if not failing:
+            return None
+        lane = (failing & -failing).bit_length() - 1
+        inputs, outputs = (unpack_lanes({name: [word >> lane for word in words] for name, words in signals.items()}, 1)[0]
+                           for signals in (packed, results))
+        return {'inputs': inputs}, outputs
+    
+    def _report_failure(self, failure, error_reporter) -> None:
+        test_case, outputs = failure
+        if error_reporter:
+            error_reporter(test_case, outputs, {})
+        else:
+            self._default_error_reporter(test_case, outputs, {})
+    
+    def measure_fault_coverage(self, circuit, test_cases: List[Dict[str, Any]], steps: int,
+                               observe: Optional[List[str]] = None):
+        """
+        Fault-simulate a test set against every stuck-at-0/1 fault on the
+        circuit's NAND and D outputs.
+        
+        Args:
+            circuit: A parsed Circuit or the path to a circuit file
+            test_cases: Test case dictionaries with an 'inputs' key
+            steps: Number of simulation steps per test case
+            observe: Signals at which a fault counts as detected (default: all)
+            
+        Returns:
+            A FaultReport with the coverage and the undetected faults
+        """
+        from netlist import CompiledSimulator  # type: ignore
+        from fault_sim import FaultSimulator  # type: ignore
+        if isinstance(circuit, str):
+            circuit = self.parse_file(circuit)
+        fault_sim = FaultSimulator(CompiledSimulator(circuit), observe=observe)
+        return fault_sim.run([case['inputs'] for case in test_cases], steps)
+    
+    def _emit_profile(self, sim) -> None:
+        """Print the simulator's stats as a single JSON line when profiling."""
+        if sim.stats is not None:
+            print(json.dumps({'profile': sim.stats.to_dict()}, sort_keys=True))
+    
     def _default_error_reporter(self, test_case: Dict[str, Any], 
                                outputs: Dict[str, str], 
                                expected: Dict[str, str]) -> None:
@@ -185,52 +493,245 @@ class ScoringFramework:
             Parsed arguments namespace
         """
         import argparse
-        import inspect
         
         parser = argparse.ArgumentParser(description=description)
         
-        # Standard arguments - use the directory of the calling script
-        caller_file = inspect.stack()[1].filename
-        caller_dir = os.path.dirname(os.path.abspath(caller_file))
+        # Standard arguments - use the directory of the scoring script being run
+        script = getattr(sys.modules.get('__main__'), '__file__', None) or sys.argv[0]
+        caller_dir = os.path.dirname(os.path.abspath(script))
         default_circuit = os.path.join(caller_dir, default_circuit_name)
         
         parser.add_argument('--circuit', '-c', default=default_circuit,
                            help=f'Path to the circuit file (default: {default_circuit_name} in this directory)')
+        parser.add_argument('--profile', action='store_true',
+                           help='Emit simulator timings and counters as JSON')
+        parser.add_argument('--fault-coverage', action='store_true',
+                           help='Report the stuck-at fault coverage of the test set')
+        parser.add_argument('--coverage', action='store_true',
+                           help='Report the toggle and D-register state coverage of the test set')
+        parser.add_argument('--random', action='store_true',
+                           help='Verify with constrained-random stimulus instead of all inputs')
+        parser.add_argument('--seed', type=int, default=0,
+                           help='Seed for --random (default: 0)')
+        parser.add_argument('--time-budget', type=float, default=10.0,
+                           help='Seconds of random testing before stopping (default: 10)')
+        parser.add_argument('--target-coverage', type=float,
+                           help='Stop random testing once this fraction of signals has toggled')
+        parser.add_argument('--target-state-coverage', type=float,
+                           help='Stop random testing once this fraction of the D-register states has been visited')
+        parser.add_argument('--shard', type=_parse_shard, default=(0, 1), metavar='I/N',
+                           help='Only test shard I (from 0) of N of the exhaustive enumeration')
+        parser.add_argument('--golden-cache', metavar='DIR',
+                           help='Store reference outputs in DIR and reuse them on later runs')
+        from backends import engine_names  # type: ignore
+        parser.add_argument('--engine', choices=engine_names(), default='auto',
+                           help='Simulation engine (default: auto, chosen from the circuit and the workload)')
         
         # Add any additional arguments
         if additional_args:
             for arg in additional_args:
                 parser.add_argument(*arg.get('names', []), **{k: v for k, v in arg.items() if k != 'names'})
         
-        return parser.parse_args()
+        args = parser.parse_args()
+        # Standard options configure this framework instance; scoring scripts
+        # pass it on to verify_circuit so the settings take effect.
+        self.profile = args.profile
+        self.report_fault_coverage = args.fault_coverage
+        self.report_coverage = args.coverage
+        self.random_stimulus = args.random
+        self.seed = args.seed
+        self.time_budget = args.time_budget
+        self.target_coverage = args.target_coverage
+        self.target_state_coverage = args.target_state_coverage
+        self.shard = args.shard
+        self.golden_cache_dir = args.golden_cache
+        self.engine = args.engine
+        return args
+
+
+def _parse_shard(value: str) -> Tuple[int, int]:
+    """Parses an 'I/N' shard argument."""
+    import argparse
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}'. Expected 'I/N'.")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard {index} does not exist for {count} shards.")
+    return index, count
+
+
+class GoldenCache:
+    """
+    Reference outputs of run_batch_test stored on disk, one file per
+    challenge configuration, batch size and shard. The file is written
+    while a run computes the references and kept only once the run has
+    passed; later runs stream the stored batches instead.
+    """
+    
+    def __init__(self, directory: str, key: str):
+        self.path = os.path.join(directory, f"{key}.golden")
+        self._reader = self._writer = None
+        if os.path.exists(self.path):
+            self._reader = open(self.path, 'rb')
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._writer = open(self.path + '.tmp', 'wb')
+    
+    def expected(self, reference, packed: Dict[str, List[int]], lanes: int) -> Dict[str, List[Optional[int]]]:
+        """The reference outputs of the next batch."""
+        if self._reader is not None:
+            try:
+                return marshal.load(self._reader)
+            except (EOFError, ValueError, TypeError):
+                # Truncated or unreadable: compute the rest
+                self._reader.close()
+                self._reader = None
+        expected = reference(packed, lanes)
+        if self._writer is not None:
+            marshal.dump(expected, self._writer)
+        return expected
+    
+    def close(self, keep: bool) -> None:
+        """Closes the file; a newly written one is kept only if `keep`."""
+        if self._reader is not None:
+            self._reader.close()
+        if self._writer is not None:
+            self._writer.close()
+            if keep:
+                os.replace(self.path + '.tmp', self.path)
+            else:
+                os.remove(self.path + '.tmp')
 
 
 class IterativeTestGenerator:
-    """Helper class for generating test cases through iteration."""
+    """
+    Helper class for generating test cases through iteration.
+    
+    Test case k of an enumeration gives signal i the k-th bitstring of the
+    combined value, the first signal being the most significant, which is
+    the order of itertools.product. Cases are produced lazily and can be
+    split into shards: shard `shard_index` of `shard_count` covers one
+    contiguous range of cases, so shards can be scored independently.
+    """
+    
+    @staticmethod
+    def shard_range(total: int, shard_index: int = 0, shard_count: int = 1) -> range:
+        """The indices of shard `shard_index` when splitting `total` items into `shard_count` shards."""
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"Shard {shard_index} does not exist for {shard_count} shards")
+        return range(total * shard_index // shard_count, total * (shard_index + 1) // shard_count)
+    
+    @staticmethod
+    def iter_bitstring_combinations(num_bits: int, signal_names: List[str], shard_index: int = 0,
+                                    shard_count: int = 1) -> Iterator[Dict[str, Any]]:
+        """Lazily yields the test cases of generate_all_bitstring_combinations in one shard."""
+        total = 1 << (num_bits * len(signal_names))
+        mask = (1 << num_bits) - 1
+        shifts = [num_bits * i for i in reversed(range(len(signal_names)))]
+        for k in IterativeTestGenerator.shard_range(total, shard_index, shard_count):
+            yield {'inputs': {name: format((k >> shift) & mask, f'0{num_bits}b') if num_bits else ''
+                              for name, shift in zip(signal_names, shifts)}}
+    
+    @staticmethod
+    def packed_batches(num_bits: int, signal_names: List[str], batch_size: int = 256, shard_index: int = 0,
+                       shard_count: int = 1) -> Iterator[Tuple[Dict[str, List[int]], int]]:
+        """
+        Yields the same enumeration as (packed inputs, lanes) batches (see
+        netlist.pack_lanes). Batches start at multiples of `batch_size`, a
+        power of two, so every word is either a fixed lane pattern (the low
+        bits of the case index) or all/no lanes (the high bits); building a
+        batch costs one word per signal and step. Shards are whole batches,
+        or one range of cases each when there are fewer batches than shards.
+        """
+        if batch_size <= 0 or batch_size & (batch_size - 1):
+            raise ValueError("batch_size must be a power of two")
+        low_bits = batch_size.bit_length() - 1
+        patterns = [sum(1 << lane for lane in range(batch_size) if (lane >> j) & 1) for j in range(low_bits)]
+        count = len(signal_names)
+        total = 1 << (num_bits * count)
+        positions = [[num_bits * (count - 1 - i) + num_bits - 1 - t for t in range(num_bits)] for i in range(count)]
+        num_batches = -(-total // batch_size)
+        if num_batches < shard_count:
+            # Fewer batches than shards: each shard takes one range of cases
+            cases = IterativeTestGenerator.shard_range(total, shard_index, shard_count)
+            if cases:
+                words = [sum(1 << lane for lane, k in enumerate(cases) if (k >> j) & 1)
+                         for j in range(num_bits * count)]
+                yield {name: [words[j] for j in bits] for name, bits in zip(signal_names, positions)}, len(cases)
+            return
+        for batch in IterativeTestGenerator.shard_range(num_batches, shard_index, shard_count):
+            start = batch * batch_size
+            lanes = min(batch_size, total - start)
+            mask = (1 << lanes) - 1
+            packed = {}
+            for name, bits in zip(signal_names, positions):
+                packed[name] = [patterns[j] & mask if j < low_bits else (mask if (start >> j) & 1 else 0)
+                                for j in bits]
+            yield packed, lanes
     
     @staticmethod
     def generate_all_bitstring_combinations(num_bits: int, signal_names: List[str]) -> List[Dict[str, Any]]:
         """Generate all possible bitstring combinations for given signals."""
-        import itertools
-        
-        bitstrings = ["".join(bits) for bits in itertools.product('01', repeat=num_bits)]
-        test_cases = []
-        
-        # Generate all combinations
-        for combination in itertools.product(bitstrings, repeat=len(signal_names)):
-            inputs = dict(zip(signal_names, combination))
-            test_cases.append({'inputs': inputs})
-        
-        return test_cases
+        return list(IterativeTestGenerator.iter_bitstring_combinations(num_bits, signal_names))
     
     @staticmethod
     def generate_single_signal_combinations(num_bits: int, signal_name: str) -> List[Dict[str, Any]]:
         """Generate all possible bitstring values for a single signal."""
-        import itertools
-        
-        test_cases = []
-        for bits in itertools.product('01', repeat=num_bits):
-            bitstring = "".join(bits)
-            test_cases.append({'inputs': {signal_name: bitstring}})
-        
-        return test_cases
\ No newline at end of file
+        return list(IterativeTestGenerator.iter_bitstring_combinations(num_bits, [signal_name]))
+
+
+class RandomStimulusGenerator:
+    """
+    Seeded, reproducible random test cases emitted in packed form (see
+    netlist.pack_lanes): each batch maps every signal to one word per step,
+    bit l of a word being the value in test case l.
+    
+    A `corner_bias` fraction of the cases are corner cases: every signal all
+    zeros or all ones, or all signals equal. The first batch always starts
+    with the all-zeros, all-ones and equal-operands cases.
+    """
+    
+    def __init__(self, signal_names: List[str], num_bits: int, seed: int = 0,
+                 batch_size: int = 64, corner_bias: float = 0.25):
+        self.signal_names = list(signal_names)
+        self.num_bits = num_bits
+        self.batch_size = batch_size
+        self.corner_bias = corner_bias
+        self._rng = random.Random(seed)
+    
+    def _case(self) -> List[int]:
+        """One test case as an int per signal (bit t is the value at step t)."""
+        rng, width = self._rng, self.num_bits
+        if rng.random() >= self.corner_bias:
+            return [rng.getrandbits(width) for _ in self.signal_names]
+        if rng.random() < 0.5:
+            return [rng.getrandbits(width)] * len(self.signal_names)
+        full = (1 << width) - 1
+        return [rng.choice((0, full)) for _ in self.signal_names]
+    
+    def batches(self):
+        """Yields packed batches of `batch_size` cases forever."""
+        full = (1 << self.num_bits) - 1
+        corners = [[0] * len(self.signal_names), [full] * len(self.signal_names),
+                   [self._rng.getrandbits(self.num_bits)] * len(self.signal_names)]
+        while True:
+            cases = corners[:self.batch_size]
+            corners = []
+            cases += [self._case() for _ in range(self.batch_size - len(cases))]
+            yield self.pack(cases)
+    
+    def pack(self, cases: List[List[int]]) -> Dict[str, List[int]]:
+        """Transposes per-case values into per-step lane words."""
+        packed = {}
+        for i, name in enumerate(self.signal_names):
+            words = [0] * self.num_bits
+            for lane, case in enumerate(cases):
+                value = case[i]
+                while value:
+                    low = value & -value
+                    words[low.bit_length() - 1] |= 1 << lane
+                    value ^= low
+            packed[name] = words
+        return packed
+
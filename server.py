@@ -0,0 +1,577 @@
+# File: server.py
+# A long-running simulation server with warm compiled circuits.
+#
+# The server speaks JSON-RPC 2.0, one JSON object per line, over a Unix
+# socket or stdin/stdout. Circuits are identified by the SHA-256 of their
+# source: the server keeps recently used sources in an LRU and every worker
+# process keeps the circuits it has compiled in its own LRU, so repeated
+# requests pay neither interpreter startup nor parsing and expansion.
+# CPU-bound work runs on a process pool with a per-request timeout.
+#
+# Methods:
+#   load(source)                                 -> {circuit, outputs}
+#   simulate(circuit|source, inputs, steps, outputs=None) -> {outputs}
+#   batch_simulate(circuit|source, cases, steps, outputs=None) -> {results}
+#   score(challenge, circuit|source, options={}) -> {passed, output}
+#   stats()                                      -> counters
+#
+# Every circuit request also takes an optional `base_dir`, the directory on
+# the server's machine that `import "file.cir"` paths are relative to; it
+# defaults to the server's working directory. Library imports (`import
+# name`) always resolve to the bundled libraries. `score` treats the source
+# as untrusted: its file imports must stay inside `base_dir` and are
+# refused without one.
+#
+# SimulationClient is the matching blocking client and RemoteSimulator a
+# drop-in for Simulator.run backed by a server.
+
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+PARSE_ERROR, INVALID_REQUEST, METHOD_NOT_FOUND, INVALID_PARAMS = -32700, -32600, -32601, -32602
+SIMULATION_ERROR, TIMEOUT_ERROR, UNKNOWN_CIRCUIT = -32000, -32001, -32002
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def circuit_key(source: str) -> str:
+    """The content hash identifying a circuit source."""
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+class RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+# --- Worker side: runs in the pool processes --------------------------------
+
+_compiled: 'OrderedDict[str, Any]' = OrderedDict()
+_compiled_limit = 32
+
+
+def _init_worker(cache_size: int) -> None:
+    global _compiled_limit
+    _compiled_limit = cache_size
+
+
+def _get_compiled(key: str, source: str, base_dir: Optional[str] = None):
+    """The CompiledSimulator for a source, compiled on first use."""
+    from circuit_parser import parse_string
+    from netlist import CompiledSimulator
+    # Imported file paths resolve against base_dir, so it is part of the key
+    cache_key = (key, base_dir)
+    compiled = _compiled.get(cache_key)
+    if compiled is not None:
+        _compiled.move_to_end(cache_key)
+        return compiled
+    compiled = CompiledSimulator(parse_string(source, base_dir))
+    _compiled[cache_key] = compiled
+    if len(_compiled) > _compiled_limit:
+        _compiled.popitem(last=False)
+    return compiled
+
+
+def _select(values: Dict[str, str], outputs: Optional[List[str]]) -> Dict[str, str]:
+    if outputs is None:
+        return values
+    return {name: values[name] for name in outputs if name in values}
+
+
+def _worker_load(key: str, source: str, base_dir: Optional[str]) -> List[str]:
+    return list(_get_compiled(key, source, base_dir).output_names)
+
+
+def _worker_simulate(key: str, source: str, base_dir: Optional[str], inputs: Dict[str, str], steps: int,
+                     outputs: Optional[List[str]]) -> Dict[str, str]:
+    return _select(_get_compiled(key, source, base_dir).run(inputs, steps), outputs)
+
+
+def _worker_batch_simulate(key: str, source: str, base_dir: Optional[str], cases: List[Dict[str, str]],
+                           steps: int, outputs: Optional[List[str]]) -> List[Dict[str, str]]:
+    """Simulates all cases bit-parallel, one lane per case."""
+    from netlist import pack_lanes, unpack_lanes
+    compiled = _get_compiled(key, source, base_dir)
+    packed = pack_lanes(cases, list(compiled.netlist.inputs), steps)
+    results = compiled.run_packed(packed, steps, len(cases))
+    names = [name for name in compiled.output_names if outputs is None or name in outputs]
+    return unpack_lanes({name: results[name] for name in names}, len(cases))
+
+
+def _load_challenge(challenge: str):
+    """The score.py module of a challenge directory under challenges/."""
+    with open(os.path.join(_ROOT, 'challenges', 'challenges.json')) as f:
+        challenges = json.load(f)
+    if challenge not in challenges:
+        raise ValueError(f"Unknown challenge '{challenge}'")
+    path = os.path.join(_ROOT, 'challenges', challenge, 'score.py')
+    spec = importlib.util.spec_from_file_location(f"score_{challenge.replace('-', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _ThreadStdout:
+    """
+    Stands in for sys.stdout, sending the writes of a thread inside
+    _capture_stdout to that thread's stream and all others to the real
+    stdout. contextlib.redirect_stdout swaps the process-wide stream, so on
+    a thread pool concurrent reports (and the stdio transport's responses)
+    would end up in each other's capture.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, 'capture', None) or self.stream
+
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+
+_stdout_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _capture_stdout():
+    """What the current thread prints while inside, as a StringIO."""
+    with _stdout_lock:
+        if not isinstance(sys.stdout, _ThreadStdout):
+            sys.stdout = _ThreadStdout(sys.stdout)
+        proxy = sys.stdout
+    capture = proxy.local.capture = io.StringIO()
+    try:
+        yield capture
+    finally:
+        proxy.local.capture = None
+
+
+def _worker_score(challenge: str, source: str, base_dir: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs a challenge's verify_circuit on a source, capturing its report."""
+    from circuit_parser import parse_string
+    from scoring_framework import ScoringFramework
+    module = _load_challenge(challenge)
+    options = dict(options)
+    kwargs = {}
+    if 'bits' in options:
+        if 'num_bits' not in inspect.signature(module.verify_circuit).parameters:
+            raise ValueError(f"Challenge '{challenge}' has no 'bits' option")
+        kwargs['num_bits'] = options.pop('bits')
+    if 'shard' in options:
+        options['shard'] = tuple(options['shard'])
+    framework = ScoringFramework(**options)
+    # The framework reads the circuit only through parse_file; submissions
+    # may only import files from their own directory
+    framework.parse_file = lambda path: parse_string(source, base_dir, sandbox=True)
+    with _capture_stdout() as report:
+        passed = module.verify_circuit('<source>', framework=framework, **kwargs)
+    return {'passed': bool(passed), 'output': report.getvalue()}
+
+
+# --- Server side ------------------------------------------------------------
+
+class ServerStats:
+    """Throughput and latency counters, overall and per method."""
+    def __init__(self, window: int = 1024):
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.methods: Dict[str, Dict[str, float]] = {}
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._completed: Deque[float] = deque(maxlen=window)
+        self._window = window
+
+    def record(self, method: str, seconds: float, ok: bool) -> None:
+        self.requests += 1
+        self.errors += not ok
+        entry = self.methods.setdefault(method, {'count': 0, 'errors': 0, 'total_s': 0.0, 'max_s': 0.0})
+        entry['count'] += 1
+        entry['errors'] += not ok
+        entry['total_s'] += seconds
+        entry['max_s'] = max(entry['max_s'], seconds)
+        self._latencies.setdefault(method, deque(maxlen=self._window)).append(seconds)
+        self._completed.append(time.perf_counter())
+
+    def to_dict(self) -> dict:
+        uptime = time.time() - self.started
+        recent = 0.0
+        if len(self._completed) > 1:
+            span = self._completed[-1] - self._completed[0]
+            recent = (len(self._completed) - 1) / span if span > 0 else 0.0
+        methods = {}
+        for method, entry in self.methods.items():
+            latencies = sorted(self._latencies[method])
+            methods[method] = dict(
+                entry,
+                mean_s=entry['total_s'] / entry['count'],
+                p50_s=latencies[len(latencies) // 2],
+                p95_s=latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            )
+        return {
+            'uptime_s': uptime,
+            'requests': self.requests,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'in_flight': self.in_flight,
+            'requests_per_s': self.requests / uptime if uptime > 0 else 0.0,
+            'recent_requests_per_s': recent,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'methods': methods,
+        }
+
+
+class SimulationServer:
+    """
+    Serves JSON-RPC requests, keeping up to `cache_size` circuit sources
+    (and as many compiled circuits per worker) warm. Work runs on
+    `workers` processes (threads with `processes=False`); a request that
+    exceeds its timeout gets an error reply, though the worker finishes
+    the job before taking the next one.
+    """
+    def __init__(self, workers: Optional[int] = None, timeout: float = 30.0, cache_size: int = 32,
+                 processes: bool = True):
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.stats = ServerStats()
+        self.sources: 'OrderedDict[str, str]' = OrderedDict()
+        workers = workers or os.cpu_count() or 1
+        if processes:
+            self.executor: Executor = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                                          initargs=(cache_size,))
+        else:
+            _init_worker(cache_size)
+            self.executor = ThreadPoolExecutor(workers)
+        self._methods = {
+            'load': self._load,
+            'simulate': self._simulate,
+            'batch_simulate': self._batch_simulate,
+            'score': self._score,
+            'stats': self._stats,
+        }
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+    def _remember(self, source: str) -> str:
+        key = circuit_key(source)
+        if key in self.sources:
+            self.stats.cache_hits += 1
+            self.sources.move_to_end(key)
+        else:
+            self.stats.cache_misses += 1
+            self.sources[key] = source
+            if len(self.sources) > self.cache_size:
+                self.sources.popitem(last=False)
+        return key
+
+    def _source(self, params: dict):
+        """(key, source) of the circuit a request refers to by 'circuit' hash or 'source'."""
+        if 'source' in params:
+            source = params['source']
+            return self._remember(source), source
+        key = params.get('circuit')
+        if key is None:
+            raise RPCError(INVALID_PARAMS, "Expected 'circuit' or 'source'")
+        if key not in self.sources:
+            raise RPCError(UNKNOWN_CIRCUIT, f"Unknown circuit {key}; load its source again")
+        self.stats.cache_hits += 1
+        self.sources.move_to_end(key)
+        return key, self.sources[key]
+
+    async def _run(self, params: dict, function, *args):
+        timeout = params.get('timeout', self.timeout)
+        future = asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+            raise RPCError(TIMEOUT_ERROR, f"Request timed out after {timeout}s")
+
+    async def _load(self, params: dict):
+        key, source = self._source(params)
+        outputs = await self._run(params, _worker_load, key, source, params.get('base_dir'))
+        return {'circuit': key, 'outputs': outputs}
+
+    async def _simulate(self, params: dict):
+        key, source = self._source(params)
+        outputs = await self._run(params, _worker_simulate, key, source, params.get('base_dir'),
+                                  params.get('inputs', {}), params['steps'], params.get('outputs'))
+        return {'outputs': outputs}
+
+    async def _batch_simulate(self, params: dict):
+        key, source = self._source(params)
+        results = await self._run(params, _worker_batch_simulate, key, source, params.get('base_dir'),
+                                  params['cases'], params['steps'], params.get('outputs'))
+        return {'results': results}
+
+    async def _score(self, params: dict):
+        _, source = self._source(params)
+        return await self._run(params, _worker_score, params['challenge'], source, params.get('base_dir'),
+                               params.get('options', {}))
+
+    async def _stats(self, params: dict):
+        return self.stats.to_dict()
+
+    async def handle(self, line: str) -> Optional[str]:
+        """Handles one request line and returns the response line (None for notifications)."""
+        start = time.perf_counter()
+        request_id, method = None, '?'
+        try:
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise RPCError(PARSE_ERROR, f"Parse error: {e}")
+            if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                raise RPCError(INVALID_REQUEST, "Invalid request")
+            request_id, method = request.get('id'), request['method']
+            handler = self._methods.get(method)
+            if handler is None:
+                raise RPCError(METHOD_NOT_FOUND, f"Method '{method}' not found")
+            params = request.get('params', {})
+            if not isinstance(params, dict):
+                raise RPCError(INVALID_PARAMS, "Params must be an object")
+            self.stats.in_flight += 1
+            try:
+                result = await handler(params)
+            finally:
+                self.stats.in_flight -= 1
+            response = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+            ok = True
+        except RPCError as e:
+            response = {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': e.code, 'message': str(e)}}
+            ok = False
+        except KeyError as e:
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'error': {'code': INVALID_PARAMS, 'message': f"Missing parameter {e}"}}
+            ok = False
+        except Exception as e:
+            # Simulator errors already carry their type, e.g. "RuntimeError: ..."
+            message = str(e) if isinstance(e, RuntimeError) else f"{type(e).__name__}: {e}"
+            response = {'jsonrpc': '2.0', 'id': request_id,
+                        'error': {'code': SIMULATION_ERROR, 'message': message}}
+            ok = False
+        self.stats.record(method, time.perf_counter() - start, ok)
+        if request_id is None and ok:
+            return None
+        return json.dumps(response)
+
+    async def _serve_stream(self, reader, write) -> None:
+        """Reads request lines and answers each as soon as it completes."""
+        tasks = set()
+
+        async def respond(line):
+            response = await self.handle(line)
+            if response is not None:
+                await write(response + "\n")
+
+        while True:
+            line = await reader()
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def serve_unix(self, path: str) -> None:
+        async def connection(reader, writer):
+            async def write(text):
+                writer.write(text.encode())
+                await writer.drain()
+            try:
+                await self._serve_stream(reader.readline, write)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(connection, path, limit=1 << 26)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self) -> None:
+        # Read through the event loop rather than a thread blocked in
+        # sys.stdin.readline: forked workers close sys.stdin on startup and
+        # would deadlock on a lock held by such a thread.
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=1 << 26)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        async def write(text):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        await self._serve_stream(reader.readline, write)
+
+
+# --- Client -----------------------------------------------------------------
+
+def _base_dir(base_dir: Optional[str]) -> Dict[str, str]:
+    """The base_dir request parameter, absolute since the server has its own working directory."""
+    return {} if base_dir is None else {'base_dir': os.path.abspath(base_dir)}
+
+
+class SimulationClient:
+    """
+    Blocking client for a SimulationServer on a Unix socket, or on the
+    stdio of a server process started with SimulationClient.spawn().
+    Server errors are raised as RuntimeError, like Simulator.run raises.
+    """
+    def __init__(self, path: Optional[str] = None, process: Optional[subprocess.Popen] = None):
+        self.process = process
+        if process is not None:
+            self._in, self._out = process.stdout, process.stdin
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(path)
+            self._in = self._socket.makefile('rb')
+            self._out = self._socket.makefile('wb')
+        self._next_id = 0
+        self._known: Dict[str, str] = {}
+
+    @classmethod
+    def spawn(cls, *args: str) -> 'SimulationClient':
+        """Starts `python server.py --stdio` with extra arguments and connects to it."""
+        process = subprocess.Popen([sys.executable, os.path.join(_ROOT, 'server.py'), '--stdio', *args],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        return cls(process=process)
+
+    def close(self) -> None:
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+        else:
+            self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def call(self, method: str, **params):
+        self._next_id += 1
+        request = {'jsonrpc': '2.0', 'id': self._next_id, 'method': method, 'params': params}
+        self._out.write((json.dumps(request) + "\n").encode())
+        self._out.flush()
+        line = self._in.readline()
+        if not line:
+            raise RuntimeError("RuntimeError: The simulation server closed the connection")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(response['error']['message'])
+        return response['result']
+
+    def _circuit(self, source: str) -> dict:
+        """Refers to an already loaded circuit by hash, sending the source otherwise."""
+        key = circuit_key(source)
+        return {'circuit': key} if key in self._known else {'source': source}
+
+    def _with_source(self, method: str, source: str, **params):
+        try:
+            return self.call(method, **self._circuit(source), **params)
+        except RuntimeError as e:
+            if circuit_key(source) in self._known and 'Unknown circuit' in str(e):
+                # Evicted from the server's cache: send the source again
+                self._known.pop(circuit_key(source), None)
+                return self.call(method, source=source, **params)
+            raise
+
+    def load(self, source: str, base_dir: Optional[str] = None) -> List[str]:
+        """Compiles a circuit on the server and returns its output names."""
+        result = self.call('load', source=source, **_base_dir(base_dir))
+        self._known[result['circuit']] = source
+        return result['outputs']
+
+    def simulate(self, source: str, inputs: Dict[str, str], steps: int,
+                 outputs: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 base_dir: Optional[str] = None) -> Dict[str, str]:
+        params = {'inputs': inputs, 'steps': steps, 'outputs': outputs, **_base_dir(base_dir)}
+        if timeout is not None:
+            params['timeout'] = timeout
+        return self._with_source('simulate', source, **params)['outputs']
+
+    def batch_simulate(self, source: str, cases: List[Dict[str, str]], steps: int,
+                       outputs: Optional[List[str]] = None, base_dir: Optional[str] = None) -> List[Dict[str, str]]:
+        return self._with_source('batch_simulate', source, cases=cases, steps=steps, outputs=outputs,
+                                 **_base_dir(base_dir))['results']
+
+    def score(self, challenge: str, source: str, base_dir: Optional[str] = None, **options) -> Dict[str, Any]:
+        return self._with_source('score', source, challenge=challenge, options=options, **_base_dir(base_dir))
+
+    def stats(self) -> dict:
+        return self.call('stats')
+
+
+class RemoteSimulator:
+    """
+    Drop-in for Simulator whose run() is served by a SimulationServer.
+    `base_dir` is where the server resolves the source's imported files.
+    """
+    def __init__(self, source: str, client: SimulationClient, base_dir: Optional[str] = None):
+        self.source = source
+        self.client = client
+        self.base_dir = base_dir
+        self.output_names = client.load(source, base_dir)
+        self.stats = None
+
+    def run(self, inputs: Dict[str, str], num_steps: int) -> Dict[str, str]:
+        return self.client.simulate(self.source, inputs, num_steps, base_dir=self.base_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulations over JSON-RPC.")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--socket', metavar='PATH', help='Listen on a Unix socket at PATH.')
+    where.add_argument('--stdio', action='store_true', help='Serve requests on stdin/stdout.')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU).')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Default per-request timeout in seconds (default: 30).')
+    parser.add_argument('--cache-size', type=int, default=32,
+                        help='Circuits kept warm per worker (default: 32).')
+    args = parser.parse_args()
+
+    server = SimulationServer(args.workers, args.timeout, args.cache_size)
+    try:
+        if args.stdio:
+            asyncio.run(server.serve_stdio())
+        else:
+            if os.path.exists(args.socket):
+                os.unlink(args.socket)
+            asyncio.run(server.serve_unix(args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,56 +5,151 @@ class MacroCycleError(Exception):
 # Contains the core logic for simulating the circuit over time.
 
 import copy
-from circuit_parser import Circuit, Call, Variable, Number
-from typing import Dict, List
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, asdict
+from circuit_parser import Circuit, Call, Variable, Number, Index, Concat
+from buses import (annotate_widths, bit_name, bitblast, broadcast, expand_bus_names,
+                   expression_width, select_bits, split_bit_name)
+from collections import deque
+from typing import Collection, Dict, List, Optional, Set, Tuple
 
 class UnresolvedSignalError(Exception):
     """Custom exception for dependency resolution during evaluation."""
     pass
 
+
+@dataclass
+class SimulationStats:
+    """
+    Instrumentation collected by a Simulator created with profile=True.
+    Phase timings are wall-clock seconds and accumulate across runs.
+    """
+    phase_times: Dict[str, float] = field(default_factory=dict)
+    nodes_expanded: int = 0
+    macro_expansions: int = 0
+    gate_evaluations: int = 0
+    d_evaluations: int = 0
+    retries: int = 0
+    steps: int = 0
+    signal_evaluations: Dict[str, int] = field(default_factory=dict)
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        """Adds `seconds` to the accumulated time of phase `name`."""
+        self.phase_times[name] = self.phase_times.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Context manager timing the enclosed block as phase `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def format_report(self, top_signals: int = 10, evaluations: bool = True) -> str:
+        """
+        Human-readable summary used by `main.py --profile`. `evaluations`
+        False leaves out the counters only the interpreter collects.
+        """
+        lines = ["Phase timings:"]
+        order = ('parse', 'expand', 'schedule', 'compile', 'simulate', 'get_outputs')
+        names = [n for n in order if n in self.phase_times]
+        names += [n for n in self.phase_times if n not in order]
+        for name in names:
+            seconds = self.phase_times[name]
+            lines.append(f"  {name:<12} {seconds * 1000:10.3f} ms")
+        lines.append("Counters:")
+        lines.append(f"  {'nodes expanded':<18} {self.nodes_expanded}")
+        lines.append(f"  {'macro expansions':<18} {self.macro_expansions}")
+        lines.append(f"  {'steps':<18} {self.steps}")
+        if not evaluations:
+            lines.append("  (gate, D and per-signal evaluations are counted by the interpreter only)")
+            return "\n".join(lines)
+        lines.append(f"  {'gate evaluations':<18} {self.gate_evaluations}")
+        lines.append(f"  {'D evaluations':<18} {self.d_evaluations}")
+        lines.append(f"  {'retries':<18} {self.retries}")
+        if self.signal_evaluations:
+            lines.append(f"Most evaluated signals (top {top_signals}):")
+            ranked = sorted(self.signal_evaluations.items(), key=lambda kv: (-kv[1], kv[0]))
+            for name, count in ranked[:top_signals]:
+                lines.append(f"  {name:<18} {count}")
+        return "\n".join(lines)
+
 class Simulator:
     """
     Executes a parsed circuit description over a series of time steps.
     """
-    def __init__(self, circuit: Circuit):
+    def __init__(self, circuit: Circuit, profile: bool = False,
+                 reuse_from: 'Simulator' = None, reuse: Collection[str] = ()):
+        """
+        :param circuit: The parsed circuit to simulate.
+        :param profile: Collect a SimulationStats object in `stats`.
+        :param reuse_from: A simulator for an earlier version of the circuit.
+        :param reuse: Assignments whose expansion is unchanged since `reuse_from`
+            and are copied from it instead of being expanded again.
+        """
         self.circuit = circuit
+        # Instrumentation is opt-in: when disabled `stats` is None and the
+        # hot paths below are the plain, uninstrumented methods.
+        self.stats = SimulationStats() if profile else None
+        if profile:
+            self._evaluate = self._evaluate_profiled
         try:
-            self.expanded_assignments = self._expand_all_macros()
+            with self._phase('expand'):
+                self.expanded_assignments = self._expand_all_macros(reuse_from, reuse)
         except (ValueError, TypeError, MacroCycleError) as e:
             raise RuntimeError(f"{type(e).__name__}: {e}") from e
+        if profile:
+            self.stats.nodes_expanded = sum(
+                self._count_nodes(expr) for expr in self.expanded_assignments.values()
+            )
+        # Buses are evaluated a word at a time; `widths` is emptied when the
+        # circuit had to be lowered to single bits instead.
+        self.widths = dict(circuit.widths)
+        with self._phase('schedule'):
+            self.dependencies = {
+                target: (reuse_from.dependencies[target] if target in reuse
+                         else self._combinational_dependencies(expr))
+                for target, expr in self.expanded_assignments.items()
+            }
+            if self.widths:
+                self.schedule, acyclic = self._build_schedule(self.dependencies)
+                if not acyclic:
+                    # A bus reading its own bits (e.g. a ripple carry chain) is
+                    # a loop word by word but usually not bit by bit
+                    self.expanded_assignments, self.schedule = self.bit_level()
+                    self.dependencies = {
+                        target: self._combinational_dependencies(expr)
+                        for target, expr in self.expanded_assignments.items()
+                    }
+                    self.widths = {}
+            elif reuse_from is not None and self.dependencies == reuse_from.dependencies:
+                self.schedule = reuse_from.schedule
+            else:
+                self.schedule, _ = self._build_schedule(self.dependencies)
         self.history = []
 
-    def _expand_expression(self, expr, macro_context: dict):
-        """Recursively expands all macros within a single expression."""
-        if isinstance(expr, Number):
-            return expr
-        
-        if isinstance(expr, Variable):
-            # If the variable is a macro parameter, substitute it with the argument
-            return macro_context.get(expr.name, expr)
+    def _phase(self, name: str):
+        """Times a phase into `stats` when profiling, otherwise a no-op."""
+        return self.stats.phase(name) if self.stats is not None else nullcontext()
 
-        if isinstance(expr, Call):
-            # First, expand all arguments of the current call
-            expanded_args = [self._expand_expression(arg, macro_context) for arg in expr.args]
+    @staticmethod
+    def _count_nodes(expr) -> int:
+        """Counts the expression nodes in an expanded expression tree."""
+        count, stack = 0, [expr]
+        while stack:
+            node = stack.pop()
+            count += 1
+            if isinstance(node, Call):
+                stack.extend(node.args)
+            elif isinstance(node, Concat):
+                stack.extend(node.parts)
+        return count
 
-            # If the call is to a macro, substitute and expand its body
-            if expr.name in self.circuit.macros:
-                macro = self.circuit.macros[expr.name]
-                if len(macro.params) != len(expanded_args):
-                    raise ValueError(
-                        f"Macro '{macro.name}' called with {len(expanded_args)} args, "
-                        f"but expected {len(macro.params)}."
-                    )
-                
-                # Create a new context for this macro expansion
-                new_macro_context = dict(zip(macro.params, expanded_args))
-                # The expression body needs to be a deep copy to prevent modification
-                return self._expand_expression(copy.deepcopy(macro.expression), new_macro_context, [expr.name])
-            else:
-                # It's a base function (like Nand, D)
-                return Call(expr.name, expanded_args)
-        
-        raise TypeError(f"Unknown expression type during expansion: {type(expr)}")
     def _expand_expression(self, expr, macro_context: dict, macro_stack=None):
         """Recursively expands all macros within a single expression, with cyclic detection."""
         if macro_stack is None:
@@ -63,6 +158,12 @@ class Simulator:
             return expr
         if isinstance(expr, Variable):
             return macro_context.get(expr.name, expr)
+        if isinstance(expr, Index):
+            if expr.name in macro_context:
+                return select_bits(macro_context[expr.name], expr.msb, expr.lsb, self.circuit.widths)
+            return expr
+        if isinstance(expr, Concat):
+            return Concat([self._expand_expression(part, macro_context, macro_stack) for part in expr.parts])
         if isinstance(expr, Call):
             expanded_args = [self._expand_expression(arg, macro_context, macro_stack) for arg in expr.args]
             if expr.name in self.circuit.macros:
@@ -75,6 +176,21 @@ class Simulator:
                         f"but expected {len(macro.params)}."
                     )
                 new_macro_context = dict(zip(macro.params, expanded_args))
+                for param, width in macro.param_widths.items():
+                    arg = new_macro_context[param]
+                    arg_width = expression_width(arg, self.circuit.widths)
+                    if arg_width == 1 and width > 1:
+                        new_macro_context[param] = broadcast(arg, width)
+                    elif arg_width not in (None, 1, width):
+                        raise ValueError(
+                            f"Macro '{macro.name}' parameter '{param}' is {width} bits wide, "
+                            f"but got a {arg_width}-bit argument."
+                        )
+                if self.stats is not None:
+                    self.stats.macro_expansions += 1
+                if macro.template is not None:
+                    # A library macro: its nested calls are already inlined
+                    return self._expand_expression(macro.template, new_macro_context, macro_stack)
                 macro_stack.append(expr.name)
                 result = self._expand_expression(copy.deepcopy(macro.expression), new_macro_context, macro_stack)
                 macro_stack.pop()
@@ -83,7 +199,7 @@ class Simulator:
                 return Call(expr.name, expanded_args)
         raise TypeError(f"Unknown expression type during expansion: {type(expr)}")
 
-    def _expand_all_macros(self):
+    def _expand_all_macros(self, reuse_from: 'Simulator' = None, reuse: Collection[str] = ()):
         """
         Iterates through all assignments and expands their expressions fully,
         leaving only base functions (Nand, D) and variables.
@@ -91,11 +207,85 @@ class Simulator:
         #print("Expanding all macros...")
         expanded = {}
         for target, assignment in self.circuit.assignments.items():
+            if target in reuse:
+                expanded[target] = reuse_from.expanded_assignments[target]
+                continue
             # Start with an empty context for top-level assignments
             # print(f"Expanding assignment for {target}: {dir(assignment.expression.children[0])}")
             expanded[target] = self._expand_expression(assignment.expression, {})
+            if self.circuit.widths:
+                expanded[target] = annotate_widths(expanded[target], self.circuit.widths.get(target, 1),
+                                                   self.circuit.widths, target)
         return expanded
 
+    @staticmethod
+    def _combinational_dependencies(expr) -> Set[str]:
+        """
+        Signals an expanded expression reads in the same time step. The first
+        argument of D is read at the previous step and so is not included.
+        Subexpressions shared by macro expansion are visited once.
+        """
+        names, stack, seen = set(), [expr], set()
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if isinstance(node, (Variable, Index)):
+                names.add(node.name)
+            elif isinstance(node, Call):
+                stack.extend(node.args[1:] if node.name == 'D' else node.args)
+            elif isinstance(node, Concat):
+                stack.extend(node.parts)
+        return names
+
+    @staticmethod
+    def _build_schedule(dependencies: Dict[str, Set[str]]) -> Tuple[List[str], bool]:
+        """
+        Orders the assignments so each is evaluated after the signals it reads
+        in the same step, and tells whether that was possible for all of them.
+        Signals on a combinational cycle cannot be ordered; they are appended
+        last and reported by the fixed-point loop in run.
+        """
+        targets = dependencies
+        waiting_on = {t: len(deps & targets.keys()) for t, deps in dependencies.items()}
+        readers = {t: [] for t in targets}
+        for target, deps in dependencies.items():
+            for dep in deps:
+                if dep in readers:
+                    readers[dep].append(target)
+
+        ready = deque(t for t in targets if waiting_on[t] == 0)
+        schedule = []
+        while ready:
+            target = ready.popleft()
+            schedule.append(target)
+            for reader in readers[target]:
+                waiting_on[reader] -= 1
+                if waiting_on[reader] == 0:
+                    ready.append(reader)
+        if len(schedule) < len(targets):
+            scheduled = set(schedule)
+            schedule.extend(t for t in targets if t not in scheduled)
+            return schedule, False
+        return schedule, True
+
+    def bit_level(self) -> Tuple[Dict[str, object], List[str]]:
+        """
+        The expanded assignments as single-bit expressions, with bus bits
+        named 'Y[i]', and their evaluation schedule.
+        """
+        if not self.widths:
+            return self.expanded_assignments, self.schedule
+        assignments = bitblast(self.expanded_assignments, self.widths)
+        dependencies = {target: self._combinational_dependencies(expr)
+                        for target, expr in assignments.items()}
+        return assignments, self._build_schedule(dependencies)[0]
+
+    def output_names(self) -> List[str]:
+        """Names of the assigned signals as returned by run, buses split into bits."""
+        return expand_bus_names(list(self.circuit.assignments), self.circuit.widths)
+
     def _evaluate(self, expr, time_step: int):
         """Recursively evaluates an expanded expression at a specific time step."""
         current_state = self.history[time_step]
@@ -113,49 +303,127 @@ class Simulator:
             if expr.name == 'Nand' or expr.name == 'NAND':
                 val1 = self._evaluate(expr.args[0], time_step)
                 val2 = self._evaluate(expr.args[1], time_step)
-                return 1 - (val1 * val2)  # Nand logic
+                if expr.width == 1:
+                    return 1 - (val1 * val2)  # Nand logic
+                return ((1 << expr.width) - 1) ^ (val1 & val2)  # bitwise across a bus
 
             if expr.name == 'D':
-                if len(expr.args) != 2:
-                    raise ValueError(f"D function requires exactly 2 arguments (expression and default value), but got {len(expr.args)}")
-                expr_to_eval, default_expr = expr.args[0], expr.args[1]
-                if time_step == 0:
-                    # At t=0, use the default value (evaluated at t=0)
-                    return self._evaluate(default_expr, time_step)
-                else:
-                    # For t>0, evaluate the main expression at the *previous* time step
-                    # Note: we use _evaluate_at_past_step to avoid raising UnresolvedSignalError
-                    # for signals that may not exist at t=0 but do at t-1.
-                    return self._evaluate_at_past_step(expr_to_eval, time_step - 1)
+                return self._evaluate_register(expr, time_step)
             
             raise ValueError(f"Unknown function '{expr.name}' in expanded expression.")
+
+        if isinstance(expr, Index):
+            if expr.name not in current_state:
+                raise UnresolvedSignalError(f"Signal '{expr.name}' has not been calculated yet at t={time_step}")
+            return (current_state[expr.name] >> expr.lsb) & ((1 << (expr.msb - expr.lsb + 1)) - 1)
+
+        if isinstance(expr, Concat):
+            value = 0
+            for part, width in zip(expr.parts, expr.widths):
+                value = (value << width) | self._evaluate(part, time_step)
+            return value
         
         raise TypeError(f"Unknown expression type during evaluation: {type(expr)}")
 
+    def _evaluate_register(self, expr: Call, time_step: int):
+        """The output of a D call at a time step."""
+        if len(expr.args) != 2:
+            raise ValueError(f"D function requires exactly 2 arguments (expression and default value), but got {len(expr.args)}")
+        expr_to_eval, default_expr = expr.args[0], expr.args[1]
+        if time_step == 0:
+            # At t=0, use the default value (evaluated at t=0)
+            return self._evaluate(default_expr, time_step)
+        else:
+            # For t>0, evaluate the main expression at the *previous* time step
+            # Note: we use _evaluate_at_past_step to avoid raising UnresolvedSignalError
+            # for signals that may not exist at t=0 but do at t-1.
+            return self._evaluate_at_past_step(expr_to_eval, time_step - 1)
+
+    def _evaluate_profiled(self, expr, time_step: int):
+        """Counting wrapper installed over _evaluate when profiling is enabled."""
+        if isinstance(expr, Call):
+            if expr.name == 'D':
+                self.stats.d_evaluations += 1
+            else:
+                self.stats.gate_evaluations += 1
+        return Simulator._evaluate(self, expr, time_step)
+
     def _evaluate_at_past_step(self, expr, time_step: int):
         """
-        Evaluates an expression at a specific past time step. This is a wrapper
-        around _evaluate to handle cases where a signal might not exist yet.
+        Evaluates an expression at a specific past time step. Evaluation only
+        reads history at `time_step` and earlier, so the past state is used
+        directly without copying the history.
         """
         if time_step < 0:
             raise IndexError("Cannot evaluate at a negative time step.")
-        
-        # Temporarily swap history to the target past state for evaluation
-        original_history = self.history
-        self.history = self.history[:time_step + 1]
-        try:
-            # We use time_step as the index, which is now the last item in the temp history
-            result = self._evaluate(expr, time_step)
-        finally:
-            self.history = original_history # Always restore history
-        return result
+        return self._evaluate(expr, time_step)
+
+    @staticmethod
+    def _max_delay(expr) -> int:
+        """Deepest nesting of D within an expression: how many past steps it reads."""
+        if isinstance(expr, Call):
+            if expr.name == 'D' and expr.args:
+                return max(1 + Simulator._max_delay(expr.args[0]),
+                           max((Simulator._max_delay(a) for a in expr.args[1:]), default=0))
+            return max((Simulator._max_delay(a) for a in expr.args), default=0)
+        if isinstance(expr, Concat):
+            return max((Simulator._max_delay(p) for p in expr.parts), default=0)
+        return 0
+
+    def registers(self) -> List[Call]:
+        """
+        The distinct D calls of the expanded circuit, in first-seen order.
+        Structurally equal calls count once: nodes are numbered bottom-up,
+        each node object once, so shared subtrees are not walked again.
+        """
+        numbers: Dict[int, int] = {}    # id(node) -> structural number
+        table: Dict[tuple, int] = {}
+        positions: Dict[int, int] = {}          # id(D call) -> preorder position
+        first_seen: Dict[int, Tuple[int, Call]] = {}    # D number -> (preorder position, call)
+        for name in self.schedule:
+            stack = [(self.expanded_assignments[name], False)]
+            while stack:
+                expr, children_done = stack.pop()
+                if id(expr) in numbers:
+                    continue
+                children = expr.args if isinstance(expr, Call) else expr.parts if isinstance(expr, Concat) else ()
+                if not children_done:
+                    if isinstance(expr, Call) and expr.name == 'D':
+                        positions.setdefault(id(expr), len(positions))
+                    stack.append((expr, True))
+                    stack.extend((child, False) for child in reversed(children))
+                    continue
+                if isinstance(expr, Number):
+                    key = ('n', expr.value)
+                elif isinstance(expr, Variable):
+                    key = ('v', expr.name)
+                elif isinstance(expr, Index):
+                    key = ('i', expr.name, expr.msb, expr.lsb)
+                elif isinstance(expr, Call):
+                    key = (expr.name, expr.width) + tuple(numbers[id(child)] for child in children)
+                else:
+                    key = ('c', tuple(expr.widths)) + tuple(numbers[id(child)] for child in children)
+                number = numbers[id(expr)] = table.setdefault(key, len(table))
+                if isinstance(expr, Call) and expr.name == 'D':
+                    position = positions[id(expr)]
+                    if number not in first_seen or position < first_seen[number][0]:
+                        first_seen[number] = (position, expr)
+        return [expr for _, expr in sorted(first_seen.values(), key=lambda visit: visit[0])]
 
-    def run(self, inputs: Dict[str, str], num_steps: int):
+    def run(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+            coverage=None):
         """
         Runs the simulation for a given number of steps.
         
         :param inputs: Dict mapping input signal names to their value strings, e.g., {'B': '101'}.
         :param num_steps: The total number of time steps to simulate.
+        :param sinks: Objects with a `sample(t, state)` method (e.g. the waveform
+            writers) called with the state of every step as soon as it is resolved.
+        :param record: Keep the full history and return the output strings. When
+            False only the few past steps D elements still read are kept, so
+            memory stays bounded; the return value is then an empty dict.
+        :param coverage: A CoverageCollector sampled with the signal values and
+            D-register outputs of every step.
         """
         # Check for missing input signals before simulation
         # Collect all variables referenced in the circuit
@@ -163,11 +431,19 @@ class Simulator:
         
         def collect_variables(expr):
             """Recursively collect all variable names from an expression."""
-            if isinstance(expr, Variable):
-                referenced_signals.add(expr.name)
+            if isinstance(expr, (Variable, Index)):
+                if expr.name in self.widths and expr.name not in self.expanded_assignments:
+                    # Bus inputs are provided bit by bit
+                    msb, lsb = (expr.msb, expr.lsb) if isinstance(expr, Index) else (self.widths[expr.name] - 1, 0)
+                    referenced_signals.update(bit_name(expr.name, i) for i in range(lsb, msb + 1))
+                else:
+                    referenced_signals.add(expr.name)
             elif isinstance(expr, Call):
                 for arg in expr.args:
                     collect_variables(arg)
+            elif isinstance(expr, Concat):
+                for part in expr.parts:
+                    collect_variables(part)
         
         # Scan all assignments for variable references
         for signal, expr in self.expanded_assignments.items():
@@ -182,12 +458,90 @@ class Simulator:
         if missing_signals:
             missing_list = ', '.join(sorted(missing_signals))
             raise RuntimeError(f"RuntimeError: The following signals are used in the circuit but not defined: {missing_list}")
+        if self.widths:
+            inputs = self._word_inputs(inputs)
         
-        self.history = []
-        
+        stats = self.stats
+
+        with self._phase('simulate'):
+            retries = self._run_steps(inputs, num_steps, sinks, record, coverage)
+        if stats is not None:
+            stats.retries += retries
+            stats.steps += num_steps
+
+        if not record:
+            return {}
+        with self._phase('get_outputs'):
+            return self.get_outputs(self.output_names(), num_steps)
+
+    def _word_inputs(self, inputs: Dict[str, str]) -> Dict[str, object]:
+        """Packs the bit inputs 'A[i]' of every bus input A into one word per step."""
+        words = dict(inputs)
+        for name, width in self.widths.items():
+            if name in self.expanded_assignments:
+                continue
+            bits = [words.pop(bit_name(name, i), '') for i in range(width)]
+            words[name] = [sum(1 << i for i, seq in enumerate(bits) if t < len(seq) and seq[t] == '1')
+                           for t in range(max(map(len, bits)))]
+        return words
+
+    def _bit_view(self, state: Dict[str, int]) -> Dict[str, int]:
+        """A step's state with every bus word split into its bits."""
+        view = {}
+        for name, value in state.items():
+            width = self.widths.get(name)
+            if width is None:
+                view[name] = value
+            else:
+                for i in range(width):
+                    view[bit_name(name, i)] = (value >> i) & 1
+        return view
+
+    def _run_steps(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+                   coverage=None) -> int:
+        """Fills `history` for `num_steps` steps; returns the number of retries."""
+        registers = register_values = None
+        if coverage is not None:
+            registers = self.registers()
+            register_values = {}
+            self._evaluate_register = self._recording_register_evaluator(register_values)
+        try:
+            return self._run_step_loop(inputs, num_steps, sinks, record, coverage, registers, register_values)
+        finally:
+            if coverage is not None:
+                del self._evaluate_register
+
+    def _recording_register_evaluator(self, register_values: Dict[int, Tuple[int, int]]):
+        """
+        Wraps _evaluate_register to keep the last (time step, value) of every
+        D call, keyed by the call's identity, so coverage reads the register
+        state of a step without evaluating the next-state logic again.
+        """
+        evaluate_register = self._evaluate_register
+
+        def recording(expr, time_step: int):
+            value = register_values[id(expr)] = (time_step, evaluate_register(expr, time_step))
+            return value[1]
+        return recording
+
+    def _run_step_loop(self, inputs: Dict[str, str], num_steps: int, sinks, record: bool, coverage,
+                       registers: Optional[List[Call]], register_values: Optional[Dict[int, Tuple[int, int]]]) -> int:
+        signal_evaluations = self.stats.signal_evaluations if self.stats is not None else None
+        retries = 0
+        if record:
+            self.history = []
+        else:
+            # Sliding window keyed by time step, holding only what D can still read
+            self.history = {}
+            window = max((self._max_delay(e) for e in self.expanded_assignments.values()), default=0)
         for t in range(num_steps):
             current_state = {}
-            self.history.append(current_state)
+            if record:
+                self.history.append(current_state)
+            else:
+                self.history[t] = current_state
+                if t > window:
+                    del self.history[t - window - 1]
 
             # 1. Set known inputs for the current time step
             for name, seq in inputs.items():
@@ -197,29 +551,47 @@ class Simulator:
                     # If input sequence is too short, default to 0
                     current_state[name] = 0
             
-            # 2. Iteratively solve for combinational logic signals
-            unresolved = set(self.expanded_assignments.keys())
+            # 2. Iteratively solve for combinational logic signals, in schedule
+            # order so that acyclic circuits resolve in a single pass
+            unresolved = self.schedule
             
             # Limit iterations to prevent infinite loops from combinational cycles
             max_iterations = len(unresolved) + 2
             for i in range(max_iterations): 
-                resolved_this_pass = set()
-                for name in list(unresolved):
+                still_unresolved = []
+                for name in unresolved:
+                    if signal_evaluations is not None:
+                        signal_evaluations[name] = signal_evaluations.get(name, 0) + 1
                     try:
                         value = self._evaluate(self.expanded_assignments[name], t)
                         current_state[name] = value
-                        resolved_this_pass.add(name)
                     except UnresolvedSignalError:
-                        continue  # Skip this signal for now, will try again
+                        retries += 1
+                        still_unresolved.append(name)  # Will try again next pass
                 
-                unresolved -= resolved_this_pass
+                unresolved = still_unresolved
                 if not unresolved:
                     break  # All signals for this time step are resolved
             
             if unresolved:
-                raise RuntimeError(f"RuntimeError: Combinational loop or unresolved dependency detected involving signals: {unresolved}")
+                raise RuntimeError(f"RuntimeError: Combinational loop or unresolved dependency detected involving signals: {set(unresolved)}")
 
-        return self.get_outputs(list(self.circuit.assignments.keys()), num_steps)
+            sampled = current_state
+            if self.widths and (sinks or coverage is not None):
+                sampled = self._bit_view(current_state)
+            for sink in sinks:
+                sink.sample(t, sampled)
+            if coverage is not None:
+                coverage.sample(t, sampled)
+                register_bits = []
+                for d in registers:
+                    recorded = register_values.get(id(d))
+                    # A D nested in another's next state is only evaluated at earlier steps
+                    value = recorded[1] if recorded is not None and recorded[0] == t else self._evaluate(d, t)
+                    register_bits.extend((value >> i) & 1 for i in range(d.width))
+                coverage.sample_registers(t, register_bits)
+
+        return retries
 
     def get_outputs(self, signal_names: List[str], num_steps: int) -> Dict[str, str]:
         """Formats the simulation history into output strings."""
@@ -227,5 +599,10 @@ class Simulator:
         for name in signal_names:
             if name in self.history[0]: # Check if the signal is part of the simulation
                 outputs[name] = "".join(str(self.history[t].get(name, '?')) for t in range(num_steps))
+            else:
+                bit = split_bit_name(name)
+                if bit is not None and bit[0] in self.history[0]:
+                    base, i = bit
+                    outputs[name] = "".join(str((self.history[t][base] >> i) & 1) for t in range(num_steps))
         return outputs
 
@@ -1,13 +1,39 @@
+import asyncio
+import itertools
+import json
 import os
+import subprocess
 import sys
+import tempfile
 import unittest
 from typing import Dict
 
 # Add parent directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from circuit_parser import parse_file
+from circuit_parser import parse_file, parse_string, Assignment, Call, Variable
 from simulator import Simulator
+from incremental import IncrementalCompiler
+from waveform import VCDWriter, PackedWaveform, PackedWaveformWriter, read_packed_waveform
+from netlist import CompiledSimulator, pack_lanes, unpack_lanes
+from fault_sim import FaultSimulator
+from circuit_coverage import CoverageCollector
+from checkpoint import CheckpointedRun
+from hierarchy import HierarchicalSimulator
+from transition_table import TransitionTableSimulator
+from linear import LinearSimulator, extract_linear
+from unroll import UnrolledSimulator, unroll_netlist
+from backends import BACKENDS, Backend, circuit_properties, create_simulator, cross_check, register_backend, select_engine
+from server import SimulationServer, SimulationClient, RemoteSimulator
+from scoring_framework import ScoringFramework, RandomStimulusGenerator, IterativeTestGenerator
+from benchmarks import bench, circuits
+from bundle import build_bundle
+from analysis import analyze
+from compare import check_equivalence
+from library import load_library, resolve
+from grading import GradingQueue, ResultStore
+from pipeline import Pipeline
+from builder import CircuitBuilder, format_circuit
 
 class TestBasicFunctionality(unittest.TestCase):
     def setUp(self):
@@ -102,5 +128,1065 @@ class TestErrorCases(unittest.TestCase):
             sim.run({}, 1)
         self.assertIn("D function requires exactly 2 arguments", str(context.exception))
 
+class TestBuses(unittest.TestCase):
+    def bus_inputs(self, name, values, width):
+        """Bit inputs 'name[i]' for a sequence of word values."""
+        return {f"{name}[{i}]": "".join(str((v >> i) & 1) for v in values) for i in range(width)}
+
+    def test_word_level_adder(self):
+        case = circuits.bus_adder(8, steps=16)
+        sim = Simulator(parse_string(case.source))
+        self.assertEqual(sim.widths['S'], 8)   # evaluated a word at a time
+        outputs = sim.run(case.inputs, 16)
+        self.assertEqual(outputs, CompiledSimulator(parse_string(case.source)).run(case.inputs, 16))
+        for t in range(16):
+            word = lambda name, bits: sum(int(case.inputs[f"{name}[{i}]"][t]) << i for i in range(bits))
+            total = sum(int(outputs[f"S[{i}]"][t]) << i for i in range(8)) + (int(outputs['COUT'][t]) << 8)
+            self.assertEqual(total, word('A', 8) + word('B', 8))
+
+    def test_self_referencing_bus_falls_back_to_bits(self):
+        source = ("MAJ(a, b, c) := NAND(NAND(a, b), NAND(c, NAND(NAND(a, a), NAND(b, b))))\n"
+                  "C[4:0] = {MAJ(A[3:0], B[3:0], C[3:0]), 0}\n")
+        sim = Simulator(parse_string(source))
+        self.assertEqual(sim.widths, {})
+        inputs = {**self.bus_inputs('A', [5, 15], 4), **self.bus_inputs('B', [3, 1], 4)}
+        outputs = sim.run(inputs, 2)
+        self.assertEqual([outputs[f"C[{i}]"] for i in range(5)], ['00', '11', '11', '11', '01'])
+
+    def test_macro_bus_parameters_and_slices(self):
+        source = ("SWAP(x[3:0]) := {x[1:0], x[3:2]}\n"
+                  "INV(x) := NAND(x, 1)\n"
+                  "Y[3:0] = INV(SWAP(A[3:0]))\n"
+                  "Z[3:0] = NAND(A[3:0], E)\n")
+        outputs = Simulator(parse_string(source)).run({**self.bus_inputs('A', [0b0011], 4), 'E': '1'}, 1)
+        self.assertEqual("".join(outputs[f"Y[{i}]"] for i in range(4)), '1100')
+        self.assertEqual("".join(outputs[f"Z[{i}]"] for i in range(4)), '0011')
+
+    def test_constant_bus_arguments_keep_slice_widths(self):
+        source = ("SH(a[3:0]) := {a[2:0], 0}\n"
+                  "Y[3:0] = SH(1)\n"
+                  "Z[3:0] = NAND(A[3:0], SH(NAND(1, 0)))\n")
+        circuit = parse_string(source)
+        outputs = Simulator(circuit).run(self.bus_inputs('A', [0b1111], 4), 1)
+        self.assertEqual("".join(outputs[f"Y[{i}]"] for i in range(4)), '0111')
+        self.assertEqual("".join(outputs[f"Z[{i}]"] for i in range(4)), '1000')
+        self.assertEqual(outputs, CompiledSimulator(circuit).run(self.bus_inputs('A', [0b1111], 4), 1))
+
+    def test_width_errors(self):
+        with self.assertRaisesRegex(RuntimeError, "bits wide"):
+            Simulator(parse_string("Y[3:0] = NAND(A[3:0], B[1:0])\n"))
+        with self.assertRaisesRegex(RuntimeError, "parameter 'x' is 4 bits wide"):
+            Simulator(parse_string("F(x[3:0]) := x\nY[1:0] = F(A[1:0])\n"))
+        with self.assertRaisesRegex(RuntimeError, "out of range"):
+            parse_string("Y[3:0] = A[3:0]\nZ = Y[4]\n")
+
+    def test_gate_counts_are_per_bit(self):
+        framework = ScoringFramework()
+        sim = Simulator(parse_string("Y[7:0] = NAND(A[7:0], D(Y, 0))\n"))
+        self.assertEqual(framework.count_circuit_gates(sim), {'NAND': 8, 'D': 8})
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = os.path.join(os.path.dirname(__file__), 'test_circuits')
+
+    def test_disabled_by_default(self):
+        circuit = parse_file(os.path.join(self.test_dir, 'sequential.cir'))
+        sim = Simulator(circuit)
+        sim.run({'I': '1010'}, 4)
+        self.assertIsNone(sim.stats)
+
+    def test_counters_and_phases(self):
+        circuit = parse_file(os.path.join(self.test_dir, 'sequential.cir'))
+        sim = Simulator(circuit, profile=True)
+        results = sim.run({'I': '1010'}, 4)
+        self.assertEqual(results['Toggle'], '1100')
+        stats = sim.stats
+        for phase in ('expand', 'simulate', 'get_outputs'):
+            self.assertIn(phase, stats.phase_times)
+        self.assertEqual(stats.steps, 4)
+        self.assertEqual(stats.signal_evaluations['O1'], 4)
+        self.assertGreater(stats.gate_evaluations, 0)
+        self.assertGreater(stats.d_evaluations, 0)
+        self.assertGreater(stats.nodes_expanded, 0)
+        self.assertEqual(stats.macro_expansions, 10)
+
+    def test_every_engine_records_simulate_phase(self):
+        case = circuits.counter(3, steps=100)
+        for engine in BACKENDS:
+            sim = create_simulator(parse_string(case.source), engine, profile=True)
+            sim.run(case.inputs, case.steps)
+            sim.run(case.inputs, 10)
+            self.assertEqual(sim.stats.steps, 110, engine)
+            self.assertIn('simulate', sim.stats.phase_times, engine)
+            if engine != 'interpreter':
+                self.assertIn('compile', sim.stats.phase_times, engine)
+                report = sim.stats.format_report(evaluations=False)
+                self.assertNotIn('gate evaluations', report)
+
+    def test_retries_counted(self):
+        # A is listed first but depends on B, so it can need a retry
+        circuit = parse_file(os.path.join(self.test_dir, 'basic_gates.cir'))
+        circuit.assignments = {'A': Assignment('A', Call('NAND', [Variable('B'), Variable('B')])),
+                               'B': Assignment('B', Call('NAND', [Variable('I'), Variable('I')]))}
+        sim = Simulator(circuit, profile=True)
+        self.assertEqual(sim.run({'I': '01'}, 2)['A'], '01')
+        self.assertEqual(sim.stats.signal_evaluations['A'] + sim.stats.signal_evaluations['B'],
+                         4 + sim.stats.retries)
+
+class TestIncremental(unittest.TestCase):
+    SOURCE = """
+NOT(x) := NAND(x, x)
+AND(x,y) := NOT(NAND(x, y))
+OR(x,y) := NAND(NOT(x), NOT(y))
+A = AND(B, C)
+O = OR(B, C)
+N = NOT(A)
+"""
+
+    def test_schedule_orders_dependencies(self):
+        circuit = parse_string("N = NAND(A, A)\nA = NAND(B, B)\n")
+        sim = Simulator(circuit, profile=True)
+        self.assertEqual(sim.schedule, ['A', 'N'])
+        self.assertEqual(sim.run({'B': '01'}, 2)['N'], '01')
+        self.assertEqual(sim.stats.retries, 0)
+
+    def test_unchanged_assignments_reused(self):
+        compiler = IncrementalCompiler()
+        first = compiler.update(parse_string(self.SOURCE))
+        second = compiler.update(parse_string(self.SOURCE.replace("N = NOT(A)", "N = NOT(O)")))
+        self.assertEqual(compiler.last_update.reexpanded, ['N'])
+        self.assertIs(second.expanded_assignments['A'], first.expanded_assignments['A'])
+        self.assertEqual(second.run({'B': '0011', 'C': '0101'}, 4)['N'], '1000')
+
+    def test_macro_change_reexpands_callers(self):
+        compiler = IncrementalCompiler()
+        compiler.update(parse_string(self.SOURCE))
+        edited = self.SOURCE.replace("NOT(x) := NAND(x, x)", "NOT(x) := NAND(x, 1)")
+        sim = compiler.update(parse_string(edited))
+        # AND and OR call NOT, so every assignment depends on the edit
+        self.assertEqual(sorted(compiler.last_update.reexpanded), ['A', 'N', 'O'])
+        fresh = Simulator(parse_string(edited))
+        inputs = {'B': '0011', 'C': '0101'}
+        self.assertEqual(sim.run(inputs, 4), fresh.run(inputs, 4))
+
+    def test_schedule_reused_when_graph_unchanged(self):
+        compiler = IncrementalCompiler()
+        compiler.update(parse_string(self.SOURCE))
+        compiler.update(parse_string(self.SOURCE.replace("O = OR(B, C)", "O = AND(C, B)")))
+        self.assertEqual(compiler.last_update.reexpanded, ['O'])
+        self.assertTrue(compiler.last_update.schedule_reused)
+
+class TestWaveformExport(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = os.path.join(os.path.dirname(__file__), 'test_circuits')
+        self.out_dir = tempfile.mkdtemp()
+        self.inputs = {'I': '1011001110001011010'}
+
+    def simulate(self):
+        return Simulator(parse_file(os.path.join(self.test_dir, 'sequential.cir')))
+
+    def test_packed_round_trip_across_chunks(self):
+        path = os.path.join(self.out_dir, 'wave.lsw')
+        expected = self.simulate().run(self.inputs, 19)
+        with PackedWaveformWriter(path, ['I', 'O2', 'Toggle'], chunk_steps=8) as writer:
+            self.assertEqual(self.simulate().run(self.inputs, 19, sinks=[writer], record=False), {})
+        decoded = read_packed_waveform(path)
+        self.assertEqual(decoded['I'], self.inputs['I'])
+        self.assertEqual(decoded['O2'], expected['O2'])
+        self.assertEqual(decoded['Toggle'], expected['Toggle'])
+
+    def test_random_access_and_unfinished_files(self):
+        path = os.path.join(self.out_dir, 'wave.lsw')
+        inputs = {'I': self.inputs['I'] * 20}
+        expected = self.simulate().run(inputs, 380)
+        writer = PackedWaveformWriter(path, ['I', 'O1', 'Toggle'], chunk_steps=16)
+        self.simulate().run(inputs, 100, sinks=[writer], record=False)
+        writer.flush()
+        with PackedWaveform(path) as partial:
+            self.assertFalse(partial.complete)
+            self.assertEqual(partial.steps, 96)
+            self.assertEqual(partial.window('Toggle', 0, 96), expected['Toggle'][:96])
+        writer.close()
+        with PackedWaveform(path) as waveform:
+            self.assertTrue(waveform.complete)
+            self.assertEqual(waveform.steps, 100)
+            self.assertEqual(waveform.window('O1', 37, 83), expected['O1'][37:83])
+            self.assertEqual(waveform.value('Toggle', 99), int(expected['Toggle'][99]))
+            self.assertEqual(waveform.find('I', 0, 40), inputs['I'].index('0', 40))
+            with self.assertRaises(IndexError):
+                waveform.window('I', 90, 101)
+
+    def test_vcd_writes_only_changes(self):
+        path = os.path.join(self.out_dir, 'wave.vcd')
+        with VCDWriter(path, ['O1']) as writer:
+            self.simulate().run({'I': '1100'}, 4, sinks=[writer])
+        with open(path) as f:
+            body = f.read().split('$enddefinitions $end\n')[1]
+        # O1 = D(I, 0) is 0110: initial value, then changes at #1 and #3 only
+        self.assertEqual(body, '#0\n$dumpvars\n0!\n$end\n#1\n1!\n#3\n0!\n#4\n')
+
+    def test_unrecorded_run_keeps_bounded_history(self):
+        sim = self.simulate()
+        sim.run({'I': '1' * 50}, 50, record=False)
+        # Every D in this circuit reads one step back
+        self.assertEqual(len(sim.history), 2)
+
+class TestCompiledNetlist(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = os.path.join(os.path.dirname(__file__), 'test_circuits')
+
+    def test_matches_interpreter(self):
+        for name, inputs in (('basic_gates.cir', {'A': '1010', 'B': '1100', 'C': '1010'}),
+                             ('sequential.cir', {'I': '1011001'})):
+            circuit = parse_file(os.path.join(self.test_dir, name))
+            steps = len(next(iter(inputs.values())))
+            self.assertEqual(CompiledSimulator(circuit).run(inputs, steps),
+                             Simulator(circuit).run(inputs, steps))
+
+    def test_structural_hashing_shares_registers(self):
+        # XOR duplicates its arguments, but D(Y, 0) is a single register
+        circuit = parse_string("XOR(x,y) := NAND(NAND(x, NAND(x, y)), NAND(y, NAND(x, y)))\n"
+                               "Y = XOR(D(Y, 0), X)\n")
+        compiled = CompiledSimulator(circuit)
+        self.assertEqual(len(compiled.netlist.registers), 1)
+        self.assertEqual(compiled.run({'X': '1101'}, 4)['Y'], '1001')
+
+    def test_lanes_are_independent(self):
+        compiled = CompiledSimulator(parse_file(os.path.join(self.test_dir, 'sequential.cir')))
+        cases = [{'I': '1010'}, {'I': '0111'}, {'I': '0000'}]
+        packed = compiled.run_packed(pack_lanes(cases, ['I'], 4), 4, len(cases))
+        for case, lane in zip(cases, unpack_lanes(packed, len(cases))):
+            self.assertEqual(lane['Toggle'], compiled.run(case, 4)['Toggle'])
+
+    def test_prefix_tree_matches_independent_runs(self):
+        circuit = parse_string("Y = NAND(A, D(Y, 0))\nZ = NAND(D(Y, 1), NAND(B, D(Z, 0)))\n")
+        compiled, sim = CompiledSimulator(circuit), Simulator(circuit)
+        for batch_size, shards in ((256, 1), (8, 1), (4, 3)):
+            seen = []
+            for shard in range(shards):
+                for packed, lanes, results in compiled.run_prefix_tree(['A', 'B'], 4, batch_size, shard, shards):
+                    for inputs, outputs in zip(unpack_lanes(packed, lanes), unpack_lanes(results, lanes)):
+                        self.assertEqual(outputs, sim.run(inputs, 4))
+                        seen.append((inputs['A'], inputs['B']))
+            self.assertEqual(sorted(seen), sorted(itertools.product(
+                [format(i, '04b') for i in range(16)], repeat=2)))
+
+    def test_prefix_tree_shards_of_a_single_batch(self):
+        # 2^4 cases fit in one batch, so only one of the shards gets it
+        compiled = CompiledSimulator(parse_string("Y = NAND(A, D(Y, 0))\n"))
+        yielded = [len(list(compiled.run_prefix_tree(['A'], 4, 256, shard, 3))) for shard in range(3)]
+        self.assertEqual(yielded, [0, 0, 1])
+
+    def test_combinational_loop(self):
+        with self.assertRaises(RuntimeError) as context:
+            CompiledSimulator(parse_file(os.path.join(self.test_dir, 'error_combo_loop.cir')))
+        self.assertIn("Combinational loop", str(context.exception))
+
+class TestFaultSimulation(unittest.TestCase):
+    def test_redundant_fault_undetected(self):
+        # X is constantly 1, so X stuck-at-1 cannot be observed
+        compiled = CompiledSimulator(parse_string("X = NAND(A, 0)\nY = NAND(X, A)\n"))
+        report = FaultSimulator(compiled, observe=['Y']).run([{'A': '01'}], 2)
+        self.assertEqual(report.total, 4)
+        self.assertEqual(report.detected, 3)
+        self.assertEqual([str(f) for f in report.undetected], ['X stuck-at-1'])
+
+    def test_weak_test_set_and_batching(self):
+        case = circuits.ripple_carry_adder(4, steps=1)
+        compiled = CompiledSimulator(parse_string(case.source))
+        zeros = {name: '0' for name in compiled.netlist.inputs}
+        weak = FaultSimulator(compiled, word_size=8).run([zeros], 1)
+        exhaustive = [{name: str((v >> i) & 1) for i, name in enumerate(sorted(compiled.netlist.inputs))}
+                      for v in range(256)]
+        full = FaultSimulator(compiled, word_size=8).run(exhaustive, 1)
+        self.assertLess(weak.coverage, full.coverage)
+        # Only bit 0, whose carry-in is the constant 0, has redundant logic
+        self.assertTrue(full.undetected)
+        self.assertTrue(all(f.label.split('/')[0] in ('S0', 'C0') for f in full.undetected))
+
+    def test_detected_faults_are_dropped(self):
+        simulated = []
+
+        class CountingFaultSimulator(FaultSimulator):
+            def _detect_case(self, functions, live, columns, num_steps):
+                simulated.append(live)
+                return super()._detect_case(functions, live, columns, num_steps)
+
+        case = circuits.counter(4, steps=300)
+        compiled = CompiledSimulator(parse_string(case.source))
+        report = CountingFaultSimulator(compiled, word_size=4).run([case.inputs] * 8, 300)
+        reference = FaultSimulator(compiled).run([case.inputs], 300)
+        self.assertEqual([str(f) for f in report.undetected], [str(f) for f in reference.undetected])
+        # After the first case only the undetected faults are simulated, 3 per word
+        first_case = -(-report.total // 3)
+        self.assertEqual(len(simulated), first_case + 7 * -(-len(report.undetected) // 3))
+
+class TestCoverage(unittest.TestCase):
+    def setUp(self):
+        # Q toggles every step while E is 1; Y is constantly 1
+        self.circuit = parse_string("Q = NAND(E, D(Q, 0))\nY = NAND(E, NAND(E, E))\n")
+
+    def test_toggle_and_state_coverage(self):
+        coverage = CoverageCollector()
+        Simulator(self.circuit).run({'E': '01110'}, 5, coverage=coverage)
+        report = coverage.report()
+        self.assertEqual(report.untoggled, ['Y'])
+        self.assertEqual(report.toggled, 2)
+        self.assertEqual(report.registers, 1)
+        self.assertEqual(report.states_visited, 2)
+
+    def test_engines_and_lanes_agree(self):
+        inputs = {'E': '01110'}
+        interpreted, compiled, packed = CoverageCollector(), CoverageCollector(), CoverageCollector()
+        Simulator(self.circuit).run(inputs, 5, coverage=interpreted)
+        CompiledSimulator(self.circuit).run(inputs, 5, coverage=compiled)
+        sim = CompiledSimulator(self.circuit)
+        sim.run_packed(pack_lanes([{'E': '00000'}, inputs], ['E'], 5), 5, 2, coverage=packed)
+        for collector in (compiled, packed):
+            self.assertEqual(collector.report().untoggled, interpreted.report().untoggled)
+            self.assertEqual(collector.states, interpreted.states)
+
+    def test_register_sampling_reuses_step_values(self):
+        case = circuits.counter(4, steps=20)
+        circuit = parse_string(case.source + "R = D(D(NAND(O0, I), 0), 1)\nS = D(D(NAND(O0, I), 0), 1)\n")
+        plain, covered = Simulator(circuit, profile=True), Simulator(circuit, profile=True)
+        plain.run(case.inputs, 20)
+        coverage = CoverageCollector()
+        covered.run(case.inputs, 20, coverage=coverage)
+        # Only the nested D(NAND(O0, I), 0), otherwise read at earlier steps, is evaluated again
+        self.assertEqual(covered.stats.d_evaluations, plain.stats.d_evaluations + 20)
+        self.assertEqual(covered.stats.gate_evaluations, plain.stats.gate_evaluations + 19)
+        self.assertEqual(len(covered.registers()), len(CompiledSimulator(circuit).netlist.registers))
+        compiled = CoverageCollector()
+        CompiledSimulator(circuit).run(case.inputs, 20, coverage=compiled)
+        self.assertEqual(coverage.report().states_visited, compiled.report().states_visited)
+
+    def test_state_set_is_bounded(self):
+        case = circuits.counter(6, steps=64)
+        coverage = CoverageCollector(max_states=10)
+        Simulator(parse_string(case.source)).run(case.inputs, case.steps, coverage=coverage)
+        report = coverage.report()
+        self.assertTrue(report.states_saturated)
+        self.assertEqual(report.states_visited, 10)
+
+class TestCheckpointing(unittest.TestCase):
+    def setUp(self):
+        case = circuits.counter(4, steps=200)
+        self.circuit = parse_string(case.source)
+        self.inputs = case.inputs
+        self.expected = Simulator(self.circuit).run(case.inputs, 200)
+
+    def test_windows_match_full_history(self):
+        run = CheckpointedRun(self.circuit, self.inputs, 200, interval=16)
+        self.assertEqual(len(run.checkpoints), 13)
+        for name, values in self.expected.items():
+            self.assertEqual(run.window(name, 0, 200), values)
+            self.assertEqual(run.window(name, 30, 97), values[30:97])
+            self.assertEqual(run.value(name, 199), int(values[199]))
+        self.assertEqual(run.window('I', 5, 9), self.inputs['I'][5:9])
+
+    def test_out_of_range_and_unknown(self):
+        run = CheckpointedRun(self.circuit, self.inputs, 200, interval=16)
+        with self.assertRaises(IndexError):
+            run.value('O0', 200)
+        with self.assertRaises(ValueError):
+            run.window('NOPE', 0, 1)
+
+class TestTransitionTable(unittest.TestCase):
+    def test_matches_interpreter_with_eviction(self):
+        case = circuits.counter(4, steps=500, seed=3)
+        circuit = parse_string(case.source)
+        expected = Simulator(circuit).run(case.inputs, case.steps)
+        table = TransitionTableSimulator(circuit, max_entries=8)
+        self.assertTrue(table.tabulated)
+        self.assertEqual(table.run(case.inputs, case.steps), expected)
+        self.assertEqual(table.entries, 8)
+        self.assertGreater(table.evictions, 0)
+        misses = table.misses
+        self.assertEqual(TransitionTableSimulator(circuit).run(case.inputs, case.steps), expected)
+        large = TransitionTableSimulator(circuit)
+        large.run(case.inputs, case.steps)
+        self.assertEqual(large.misses, 32)   # 16 states x 2 input values
+        self.assertLess(large.misses, misses)
+
+    def test_sinks_coverage_and_fallback(self):
+        circuit = parse_file(os.path.join(os.path.dirname(__file__), 'test_circuits', 'sequential.cir'))
+        inputs = {'I': '1011001110001011010' * 300}
+        steps = len(inputs['I']) + 2
+        expected = CompiledSimulator(circuit).run(inputs, steps)
+        reference = CoverageCollector()
+        CompiledSimulator(circuit).run(inputs, steps, coverage=reference)
+        for max_key_bits in (24, 2):
+            table = TransitionTableSimulator(circuit, max_key_bits=max_key_bits)
+            self.assertEqual(table.tabulated, max_key_bits == 24)
+            self.assertEqual(table.run(inputs, steps), expected)
+            coverage = CoverageCollector()
+            path = os.path.join(tempfile.mkdtemp(), 'wave.lsw')
+            with PackedWaveformWriter(path, ['I', 'Toggle']) as writer:
+                self.assertEqual(table.run(inputs, steps, sinks=[writer], record=False, coverage=coverage), {})
+            self.assertEqual(read_packed_waveform(path)['Toggle'], expected['Toggle'])
+            self.assertEqual(coverage.report(), reference.report())
+
+class TestLinear(unittest.TestCase):
+    CRC = ("import std\n"
+           "R0 = XOR(D(R3, 0), I)\n"
+           "R1 = XOR(D(R0, 1), D(R3, 0))\n"
+           "R2 = D(R1, 0)\n"
+           "R3 = D(R2, 0)\n"
+           "P = AND(R0, NOT(R2))\n")
+
+    def test_detects_linear_registers(self):
+        self.assertIsNotNone(extract_linear(CompiledSimulator(parse_string(self.CRC)).netlist))
+        self.assertIsNotNone(extract_linear(CompiledSimulator(parse_string(circuits.lfsr(8).source)).netlist))
+        self.assertIsNone(extract_linear(CompiledSimulator(parse_string(circuits.counter(3).source)).netlist))
+
+    def test_chunked_run_and_jumps_match_stepping(self):
+        circuit = parse_string(self.CRC)
+        inputs = {'I': circuits.random_inputs(['I'], 7000, seed=5)['I']}
+        linear, compiled = LinearSimulator(circuit), CompiledSimulator(circuit)
+        self.assertTrue(linear.linear)
+        expected = compiled.run(inputs, 9000)
+        self.assertEqual(linear.run(inputs, 9000), expected)
+        for step in (0, 1, 4321, 7000, 8999):
+            values = linear.values_at(step, inputs)
+            self.assertEqual({name: str(values[name]) for name in expected},
+                             {name: seq[step] for name, seq in expected.items()})
+
+    def test_far_jump_is_periodic(self):
+        # A maximal 8-bit LFSR repeats every 255 steps
+        linear = LinearSimulator(parse_string(circuits.lfsr(8, taps=[7, 5, 4, 3]).source))
+        self.assertEqual(linear.state_at(10 ** 12, {}), linear.state_at(10 ** 12 % 255 + 255, {}))
+        counter = LinearSimulator(parse_string(circuits.counter(3).source))
+        self.assertFalse(counter.linear)
+        self.assertEqual(counter.values_at(9, {'I': '1' * 12})['O0'], 0)
+
+class TestUnrolling(unittest.TestCase):
+    def test_supersteps_match_stepping(self):
+        for case in (circuits.counter(4, steps=300), circuits.bus_adder(3, steps=300, seed=4),
+                     circuits.lfsr(6, steps=300)):
+            circuit = parse_string(case.source)
+            expected = CompiledSimulator(circuit).run(case.inputs, case.steps)
+            for frames in (None, 1, 7, 64):
+                unrolled = UnrolledSimulator(circuit, frames=frames)
+                self.assertEqual(unrolled.run(case.inputs, case.steps), expected)
+            self.assertEqual(unrolled.run(case.inputs, 5), Simulator(circuit).run(case.inputs, 5))
+
+    def test_hash_consing_and_frame_choice(self):
+        # A shift register only moves wires: frames share every node
+        netlist = CompiledSimulator(parse_string("Q0 = D(I, 0)\nQ1 = D(Q0, 0)\nQ2 = D(Q1, 0)\n")).netlist
+        unrolled = unroll_netlist(netlist, 16)
+        self.assertEqual(len(unrolled.nodes), 2 + 3 + 16)
+        self.assertEqual(unrolled.outputs['Q2'][5], unrolled.outputs['Q0'][3])
+        # NOT(NOT(x)) and x NAND NOT(x) fold away
+        netlist = CompiledSimulator(parse_string("N = NAND(I, I)\nY = NAND(N, N)\nZ = NAND(Y, N)\n")).netlist
+        unrolled = unroll_netlist(netlist, 1)
+        self.assertEqual(unrolled.nodes[unrolled.outputs['Z'][0]], ('const', 1))
+        self.assertEqual(unrolled.nodes[unrolled.outputs['Y'][0]][0], 'input')
+        adder = CompiledSimulator(parse_string(circuits.ripple_carry_adder(8).source)).netlist
+        self.assertLessEqual(len(unroll_netlist(adder, max_nodes=1000).nodes), 1000)
+
+class TestHierarchy(unittest.TestCase):
+    def test_matches_flattened_engines(self):
+        for case in (circuits.ripple_carry_adder(4, steps=16, seed=1), circuits.comparator(3, steps=16, seed=2),
+                     circuits.counter(3, steps=20), circuits.lfsr(5, steps=20)):
+            circuit = parse_string(case.source)
+            hierarchical = HierarchicalSimulator(circuit)
+            self.assertEqual(hierarchical.run(case.inputs, case.steps),
+                             Simulator(circuit).run(case.inputs, case.steps))
+            self.assertEqual(hierarchical.gate_counts(), ScoringFramework().count_circuit_gates(Simulator(circuit)))
+
+    def test_instances_keep_separate_state(self):
+        circuit = parse_string(
+            "REG(x) := D(x, 0)\n"
+            "TOGGLE(e) := XOR(e, REG(XOR(e, REG(e))))\n"
+            "XOR(a, b) := NAND(NAND(a, NAND(a, b)), NAND(b, NAND(a, b)))\n"
+            "Q = REG(NAND(Q, E))\n"
+            "P = REG(REG(E))\n"
+            "T1 = TOGGLE(E)\n"
+            "T2 = TOGGLE(NAND(E, E))\n"
+        )
+        inputs = {'E': '0110100111'}
+        hierarchical = HierarchicalSimulator(circuit)
+        self.assertEqual(sorted(hierarchical.cells), ['REG', 'TOGGLE'])
+        self.assertEqual(hierarchical.run(inputs, 10), Simulator(circuit).run(inputs, 10))
+
+    def test_combinational_loop_through_instance(self):
+        circuit = parse_string("BUF(x) := NAND(NAND(x, x), NAND(x, x))\nY = BUF(Y)\n")
+        with self.assertRaises(RuntimeError):
+            HierarchicalSimulator(circuit).run({}, 1)
+
+class TestBackends(unittest.TestCase):
+    def test_selects_engine_from_circuit_and_workload(self):
+        counter = circuit_properties(Simulator(parse_string(circuits.counter(3).source)))
+        self.assertEqual((counter.registers, counter.inputs, counter.feedback, counter.linear), (3, 1, True, False))
+        self.assertEqual(select_engine(counter, 8)[0], 'interpreter')
+        self.assertEqual(select_engine(counter, 100)[0], 'table')
+        self.assertEqual(select_engine(counter, 100, batch=64)[0], 'compiled')
+        self.assertEqual(select_engine(counter, 100, profile=True)[0], 'interpreter')
+        lfsr = parse_string(circuits.lfsr(8).source)
+        self.assertEqual(create_simulator(lfsr, steps=10000).engine, 'linear')
+        adder = circuit_properties(Simulator(parse_string(circuits.ripple_carry_adder(8).source)))
+        self.assertFalse(adder.feedback)
+        self.assertGreater(adder.depth, 10)
+        self.assertEqual(select_engine(adder, 100)[0], 'compiled')
+
+    def test_cross_check_reports_first_difference(self):
+        case = circuits.counter(3, steps=20)
+        circuit = parse_string(case.source)
+        self.assertTrue(cross_check(circuit, case.inputs, case.steps).ok)
+        bus = circuits.bus_adder(2, steps=8)
+        self.assertIn('hierarchical', cross_check(parse_string(bus.source), bus.inputs, bus.steps).skipped)
+
+        class Broken(CompiledSimulator):
+            def run(self, inputs, num_steps, **kwargs):
+                results = super().run(inputs, num_steps, **kwargs)
+                results['O1'] = results['O1'][:5] + ('0' if results['O1'][5] == '1' else '1') + results['O1'][6:]
+                return results
+        register_backend(Backend('broken', Broken, "Flips O1 at step 5"))
+        self.addCleanup(BACKENDS.pop, 'broken')
+        report = cross_check(circuit, case.inputs, case.steps, engines=['compiled', 'broken'])
+        self.assertEqual(report.agreeing, ['compiled'])
+        self.assertEqual([(m.engine, m.signal, m.step) for m in report.mismatches], [('broken', 'O1', 5)])
+
+    def test_scoring_with_scalar_engine(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.cir', delete=False) as f:
+            f.write(TestRandomStimulus.PARITY)
+        self.addCleanup(os.unlink, f.name)
+        framework = ScoringFramework(engine='interpreter')
+        self.assertTrue(framework.run_batch_test(f.name, ['X'], 6, TestBatchScoring.parity_reference,
+                                                 batch_size=16))
+
+class TestLibraries(unittest.TestCase):
+    GATES = ("NOT(x) := NAND(x, x)\nAND(x, y) := NOT(NAND(x, y))\nOR(x, y) := NAND(NOT(x), NOT(y))\n"
+             "XOR(x, y) := NAND(NAND(x, NAND(x, y)), NAND(y, NAND(x, y)))\n")
+    BODY = "S = XOR(XOR(A, B), C)\nK = OR(AND(A, B), AND(C, OR(A, B)))\nQ = XOR(I, D(Q, 0))\n"
+
+    def test_std_matches_local_definitions(self):
+        local, linked = Simulator(parse_string(self.GATES + self.BODY)), Simulator(parse_string("import std\n" + self.BODY))
+        self.assertEqual(linked.expanded_assignments, local.expanded_assignments)
+        inputs = {'A': '01010101', 'B': '00110011', 'C': '00001111', 'I': '11011000'}
+        self.assertEqual(linked.run(inputs, 8), local.run(inputs, 8))
+        framework = ScoringFramework()
+        self.assertEqual(framework.count_circuit_gates(linked), framework.count_circuit_gates(local))
+
+    def test_library_is_prepared_once(self):
+        library = load_library(resolve(parse_string("import std\n").imports[0]))
+        self.assertIs(load_library(library.path), library)
+        self.assertIn('XOR', library.templated)
+        self.assertIs(parse_string("import std\n").macros['XOR'], library.macros['XOR'])
+
+    def test_file_imports_are_relative_to_the_circuit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.mkdir(os.path.join(tmp, 'lib'))
+            with open(os.path.join(tmp, 'lib', 'adders.cir'), 'w') as f:
+                f.write("import std\nHALF(a, b) := XOR(a, b)\nWIDE(x[1:0]) := NOT(x[1:0])\n")
+            with open(os.path.join(tmp, 'top.cir'), 'w') as f:
+                f.write('import "lib/adders.cir"\nY = HALF(A, B)\nC = AND(A, B)\nW[1:0] = WIDE(V[1:0])\n')
+            circuit = parse_file(os.path.join(tmp, 'top.cir'))
+            self.assertIsNone(circuit.macros['WIDE'].template)
+            results = Simulator(circuit).run({'A': '0101', 'B': '0011', 'V[0]': '0101', 'V[1]': '0011'}, 4)
+            self.assertEqual((results['Y'], results['C'], results['W[1]']), ('0110', '0001', '1100'))
+
+    def test_import_errors(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'bad.cir'), 'w') as f:
+                f.write("X = NAND(A, B)\n")
+            for source in ("import nosuchlib\n", "import std\nNOT(x) := NAND(x, x)\n",
+                           'import "missing.cir"\n', 'import "bad.cir"\n'):
+                with self.assertRaises(RuntimeError):
+                    parse_string(source, tmp)
+
+    def test_sandboxed_imports(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sandbox, outside = os.path.join(tmp, 'sub'), os.path.join(tmp, 'secret.cir')
+            os.mkdir(sandbox)
+            with open(outside, 'w') as f:
+                f.write("password hunter2\n")
+            with open(os.path.join(sandbox, 'gates.cir'), 'w') as f:
+                f.write("HALF(a, b) := NAND(a, b)\n")
+            with open(os.path.join(sandbox, 'broken.cir'), 'w') as f:
+                f.write("password hunter2\n")
+            os.symlink(outside, os.path.join(sandbox, 'link.cir'))
+            self.assertIn('HALF', parse_string('import "gates.cir"\nimport std\nY = HALF(A, B)\n', sandbox,
+                                               sandbox=True).macros)
+            for source in (f'import "{outside}"\n', 'import "../secret.cir"\n', 'import "link.cir"\n'):
+                with self.assertRaises(RuntimeError) as context:
+                    parse_string(source, sandbox, sandbox=True)
+                self.assertIn("inside the circuit's directory", str(context.exception))
+            with self.assertRaises(RuntimeError) as context:
+                parse_string('import "gates.cir"\n', sandbox=True)
+            self.assertIn("not allowed", str(context.exception))
+            with self.assertRaises(RuntimeError) as context:
+                parse_string('import "broken.cir"\n', sandbox, sandbox=True)
+            self.assertNotIn('hunter2', str(context.exception))
+
+class TestAnalysis(unittest.TestCase):
+    def test_depth_fanout_and_registers(self):
+        circuit = parse_string(
+            "NOT(x) := NAND(x, x)\n"
+            "X = NAND(A, NOT(B))\n"
+            "Y = NOT(X)\n"
+            "Q = D(NAND(Y, Q), 0)\n"
+            "Z = NAND(Q, A)\n"
+        )
+        stats = analyze(Simulator(circuit))
+        self.assertEqual(stats.output_depths, {'X': 2, 'Y': 3, 'Q': 0, 'Z': 1})
+        self.assertEqual(stats.depth, 4)
+        self.assertEqual(stats.critical_path, ['B', 'X', 'Y', 'D@Q'])
+        self.assertEqual(stats.registers, 1)
+        self.assertEqual(stats.nand_gates, 5)
+        self.assertEqual(dict(stats.top_fanout)['A'], 2)
+        self.assertFalse(stats.combinational_loop)
+
+    def test_netlist_nodes_match_compiled_netlist(self):
+        for case in (circuits.ripple_carry_adder(4), circuits.counter(3), circuits.bus_adder(8)):
+            sim = Simulator(parse_string(case.source))
+            stats = analyze(sim)
+            self.assertEqual(stats.netlist_nodes, len(CompiledSimulator(sim.circuit).netlist.nodes))
+            self.assertEqual(stats.expanded_nodes, sum(map(Simulator._count_nodes, sim.expanded_assignments.values())))
+
+    def test_expanded_and_shared_counts(self):
+        # Each level doubles the expanded tree but adds one shared gate
+        source = "L0(x) := NAND(x, x)\n" + "".join(
+            f"L{i}(x) := NAND(L{i - 1}(x), L{i - 1}(x))\n" for i in range(1, 10)) + "Y = L9(A)\n"
+        stats = analyze(Simulator(parse_string(source)))
+        self.assertEqual(stats.expanded_nodes, 2 ** 11 - 1)
+        self.assertEqual(stats.netlist_nodes, 11)
+        self.assertEqual(stats.depth, 10)
+        self.assertEqual(stats.evaluations['interpreter'], 2 ** 11 - 1)
+        self.assertEqual(stats.evaluations['compiled'], 11)
+        self.assertGreater(stats.step_us['interpreter'], stats.step_us['compiled'])
+
+    def test_cost_estimate_for_every_backend(self):
+        case = circuits.counter(4)
+        stats = analyze(Simulator(parse_string(case.source)))
+        self.assertEqual(list(stats.costs), list(BACKENDS))
+        self.assertEqual(stats.evaluations['hierarchical'], 7)     # one cell call per macro call
+        self.assertEqual(stats.evaluations['table'], 1)
+        self.assertLess(stats.step_us['table'], stats.step_us['compiled'])
+
+        bus = analyze(Simulator(parse_string(circuits.bus_adder(4).source)))
+        self.assertIn('buses', bus.unestimated['hierarchical'])
+        register_backend(Backend('custom', CompiledSimulator, "No cost model"))
+        self.addCleanup(BACKENDS.pop, 'custom')
+        stats = analyze(Simulator(parse_string(case.source)))
+        self.assertEqual(stats.unestimated, {'custom': "no cost model for this engine"})
+        self.assertIn("custom       no estimate", stats.format_report())
+
+class TestEquivalence(unittest.TestCase):
+    XOR_NAND = "X = NAND(NAND(A, NAND(A, B)), NAND(B, NAND(A, B)))\nY = NAND(A, B)\n"
+    XOR_OR = ("NOT(x) := NAND(x, x)\nOR(x, y) := NAND(NOT(x), NOT(y))\n"
+              "X = NOT(NAND(OR(A, B), NAND(A, B)))\nY = NAND(B, A)\nZ = A\n")
+
+    def test_combinational_proof(self):
+        result = check_equivalence(parse_string(self.XOR_NAND), parse_string(self.XOR_OR))
+        self.assertTrue(result.equivalent and result.complete)
+        self.assertEqual((result.method, result.outputs, result.cases), ('exhaustive', ['X', 'Y'], 4))
+        self.assertTrue(check_equivalence(parse_string(self.XOR_NAND), parse_string(self.XOR_NAND)).complete)
+
+    def test_first_mismatch_is_reported(self):
+        counter = circuits.counter(4).source
+        broken = counter.replace("K2 = AND(D(O2, 0), K1)", "K2 = D(O2, 0)")
+        self.assertNotEqual(broken, counter)
+        for bits in (20, 0):
+            result = check_equivalence(parse_string(counter), parse_string(broken), max_exhaustive_bits=bits)
+            self.assertFalse(result.equivalent)
+            self.assertEqual(result.method, 'exhaustive' if bits else 'random')
+            m = result.mismatch
+            expected = Simulator(parse_string(counter)).run(m.inputs, m.step + 1)[m.output]
+            actual = Simulator(parse_string(broken)).run(m.inputs, m.step + 1)[m.output]
+            self.assertEqual((m.values['a'], m.values['b']), (expected, actual))
+            self.assertEqual(expected[:-1], actual[:-1])
+            self.assertNotEqual(expected[-1], actual[-1])
+
+    def test_no_shared_outputs(self):
+        with self.assertRaises(ValueError):
+            check_equivalence(parse_string("X = NAND(A, B)\n"), parse_string("Y = NAND(A, B)\n"))
+
+class TestRandomStimulus(unittest.TestCase):
+    PARITY = ("XOR(a, b) := NAND(NAND(a, NAND(a, b)), NAND(b, NAND(a, b)))\n"
+              "Y = XOR(X, D(Y, 0))\n")
+
+    def _parity_test(self, source, **kwargs):
+        with tempfile.NamedTemporaryFile('w', suffix='.cir', delete=False) as f:
+            f.write(source)
+        self.addCleanup(os.unlink, f.name)
+        validator = lambda outputs, case: outputs['Y'][-1] == str(case['inputs']['X'].count('1') % 2)
+        return ScoringFramework().run_random_test(f.name, ['X'], 24, validator,
+                                                  error_reporter=lambda *args: None, **kwargs)
+
+    def test_seeded_batches_with_corner_cases(self):
+        first = next(RandomStimulusGenerator(['A', 'B'], 8, seed=3).batches())
+        again = next(RandomStimulusGenerator(['A', 'B'], 8, seed=3).batches())
+        self.assertEqual(first, again)
+        cases = unpack_lanes(first, 64)
+        self.assertEqual(cases[0], {'A': '0' * 8, 'B': '0' * 8})
+        self.assertEqual(cases[1], {'A': '1' * 8, 'B': '1' * 8})
+        self.assertEqual(cases[2]['A'], cases[2]['B'])
+
+    def test_stops_at_target_coverage(self):
+        self.assertTrue(self._parity_test(self.PARITY, target_coverage=1.0, time_budget=60))
+
+    def test_challenges_honour_random_mode(self):
+        # Every state of the 3-bit counter is visited within the first batch of 64 cases
+        script = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'challenges', '01-counter', 'score.py')
+        with tempfile.NamedTemporaryFile('w', suffix='.cir', delete=False) as f:
+            f.write(circuits.counter(3).source)
+        self.addCleanup(os.unlink, f.name)
+        result = subprocess.run([sys.executable, script, '-c', f.name, '--random', '--seed', '5',
+                                 '--time-budget', '60', '--target-state-coverage', '1.0'],
+                                capture_output=True, text=True, timeout=60)
+        self.assertIn("64 random inputs (seed 5)", result.stdout)
+
+    def test_detects_wrong_circuit(self):
+        wrong = self.PARITY.replace("D(Y, 0)", "D(X, 0)")
+        self.assertFalse(self._parity_test(wrong, max_cases=256))
+
+class TestBatchScoring(unittest.TestCase):
+    PARITY = TestRandomStimulus.PARITY
+
+    @staticmethod
+    def parity_reference(inputs, lanes):
+        parity = 0
+        for word in inputs['X']:
+            parity ^= word
+        return {'Y': [None] * (len(inputs['X']) - 1) + [parity]}
+
+    def _batch_test(self, source, framework=None, **kwargs):
+        with tempfile.NamedTemporaryFile('w', suffix='.cir', delete=False) as f:
+            f.write(source)
+        self.addCleanup(os.unlink, f.name)
+        framework = framework or ScoringFramework()
+        return framework.run_batch_test(f.name, ['X'], 10, self.parity_reference,
+                                        error_reporter=lambda *args: None, **kwargs)
+
+    def test_lazy_shards_cover_enumeration_in_order(self):
+        full = IterativeTestGenerator.generate_all_bitstring_combinations(3, ['A', 'B'])
+        self.assertEqual(full[9], {'inputs': {'A': '001', 'B': '001'}})
+        shards = [case for i in range(3)
+                  for case in IterativeTestGenerator.iter_bitstring_combinations(3, ['A', 'B'], i, 3)]
+        self.assertEqual(shards, full)
+        # 64 cases are 4 batches of 16, or a single batch of 64 split by case
+        for batch_size, shard_sizes in ((16, [16, 16, 32]), (64, [21, 21, 22])):
+            batches = [list(IterativeTestGenerator.packed_batches(3, ['A', 'B'], batch_size, i, 3))
+                       for i in range(3)]
+            self.assertEqual([sum(lanes for _, lanes in shard) for shard in batches], shard_sizes)
+            batched = [{'inputs': case} for shard in batches for packed, lanes in shard
+                       for case in unpack_lanes(packed, lanes)]
+            self.assertEqual(batched, full)
+
+    def test_batch_reference_and_shards(self):
+        self.assertTrue(self._batch_test(self.PARITY))
+        self.assertTrue(self._batch_test(self.PARITY, shard=(2, 3), batch_size=64))
+        # The 1024 cases fit in one batch, so the shards split it
+        wrong = self.PARITY.replace("D(Y, 0)", "D(X, 0)")
+        self.assertEqual([self._batch_test(wrong, shard=(i, 3), batch_size=1024) for i in range(3)],
+                         [False, False, False])
+        self.assertFalse(self._batch_test(self.PARITY.replace("D(Y, 0)", "D(X, 0)")))
+
+    def test_golden_cache_kept_only_after_pass(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            framework = ScoringFramework(golden_cache_dir=cache_dir)
+            self.assertFalse(self._batch_test(self.PARITY.replace("D(Y, 0)", "D(X, 0)"), framework,
+                                              cache_key='parity'))
+            self.assertEqual(os.listdir(cache_dir), [])
+            self.assertTrue(self._batch_test(self.PARITY, framework, cache_key='parity'))
+            self.assertEqual(os.listdir(cache_dir), ['parity-trie-b256-s0of1.golden'])
+            self.parity_reference = lambda inputs, lanes: self.fail("reference recomputed")
+            self.assertTrue(self._batch_test(self.PARITY, framework, cache_key='parity'))
+
+class TestServer(unittest.TestCase):
+    PARITY = TestRandomStimulus.PARITY
+
+    def setUp(self):
+        self.server = SimulationServer(workers=2, processes=False)
+        self.addCleanup(self.server.close)
+
+    def request(self, method, **params):
+        line = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params})
+        return json.loads(asyncio.run(self.server.handle(line)))
+
+    def test_load_simulate_and_batch(self):
+        key = self.request('load', source=self.PARITY)['result']['circuit']
+        expected = Simulator(parse_string(self.PARITY)).run({'X': '1011'}, 4)
+        self.assertEqual(self.request('simulate', circuit=key, inputs={'X': '1011'}, steps=4)['result'],
+                         {'outputs': expected})
+        results = self.request('batch_simulate', circuit=key, cases=[{'X': '11'}, {'X': '10'}], steps=2)
+        self.assertEqual(results['result']['results'], [{'Y': '10'}, {'Y': '11'}])
+        stats = self.request('stats')['result']
+        self.assertEqual(stats['methods']['simulate']['count'], 1)
+        self.assertEqual(stats['cache_misses'], 1)
+
+    def test_errors(self):
+        self.assertEqual(self.request('simulate', circuit='0' * 64, steps=1)['error']['code'], -32002)
+        self.assertEqual(self.request('nope')['error']['code'], -32601)
+        error = self.request('simulate', source="Y = NAND(A, Q)\n", inputs={'A': '1'}, steps=1)['error']
+        self.assertIn('not defined: Q', error['message'])
+        self.assertEqual(json.loads(asyncio.run(self.server.handle('{')))['error']['code'], -32700)
+
+    def test_concurrent_scores_and_imports(self):
+        wrong = self.PARITY.replace("D(Y, 0)", "D(X, 0)")
+
+        async def score_both():
+            lines = [json.dumps({'jsonrpc': '2.0', 'id': i, 'method': 'score',
+                                 'params': {'challenge': '00-checksum', 'source': source, 'options': {}}})
+                     for i, source in enumerate((self.PARITY, wrong))]
+            return await asyncio.gather(*(self.server.handle(line) for line in lines))
+
+        # On the thread pool each report is captured on its own
+        for _ in range(5):
+            passing, failing = (json.loads(line)['result'] for line in asyncio.run(score_both()))
+            self.assertTrue(passing['passed'])
+            self.assertNotIn("Failed", passing['output'])
+            self.assertFalse(failing['passed'])
+            self.assertNotIn("Success", failing['output'])
+        with tempfile.TemporaryDirectory() as base_dir:
+            with open(os.path.join(base_dir, 'gates.cir'), 'w') as f:
+                f.write(self.PARITY.split("Y = ")[0])
+            source = 'import "gates.cir"\nY = XOR(X, D(Y, 0))\n'
+            result = self.request('simulate', source=source, base_dir=base_dir, inputs={'X': '1011'}, steps=4)
+            self.assertEqual(result['result']['outputs'], {'Y': '1101'})
+            self.assertTrue(self.request('score', challenge='00-checksum', source=source, base_dir=base_dir,
+                                         options={})['result']['passed'])
+            self.assertIn('error', self.request('simulate', source=source, inputs={'X': '1'}, steps=1))
+
+    def test_remote_simulator_over_stdio(self):
+        with SimulationClient.spawn('--workers', '1') as client:
+            remote = RemoteSimulator(self.PARITY, client)
+            self.assertEqual(remote.run({'X': '0110'}, 4), Simulator(parse_string(self.PARITY)).run({'X': '0110'}, 4))
+            self.assertTrue(client.score('00-checksum', self.PARITY, bits=6)['passed'])
+            with self.assertRaises(RuntimeError):
+                client.simulate("Y = NAND(A, Q)\n", {'A': '1'}, 1)
+
+class TestGrading(unittest.TestCase):
+    BOMB = "L0(x) := NAND(x, x)\n" + "".join(
+        f"L{i}(x) := NAND(L{i - 1}(x), L{i - 1}(x))\n" for i in range(1, 30)) + "Y = L29(X)\n"
+
+    def test_limits_and_results_store(self):
+        parity = TestRandomStimulus.PARITY
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.sqlite')
+            store = ResultStore(path)
+            queue = GradingQueue(store, jobs=4, timeout=20, cpu_seconds=1)
+            queue.submit('00-checksum', parity, name='good', bits=4)
+            queue.submit('00-checksum', parity.replace("D(Y, 0)", "D(X, 0)"), name='wrong', bits=4)
+            queue.submit('00-checksum', self.BOMB, name='bomb', bits=4)
+            queue.submit('no-such-challenge', parity, name='unknown')
+            statuses = {result.name: result.status for result in queue.run()}
+            self.assertEqual(statuses, {'good': 'passed', 'wrong': 'failed', 'bomb': 'cpu exceeded',
+                                        'unknown': 'error'})
+            queue = GradingQueue(store, timeout=1, cpu_seconds=30)
+            queue.submit('00-checksum', self.BOMB, name='slow', bits=4)
+            self.assertEqual([result.status for result in queue.run()], ['timeout'])
+            self.assertEqual(queue.run(), [])
+            store.close()
+            stored = ResultStore(path)
+            self.assertEqual([result.status for result in stored.results()],
+                             ['passed', 'failed', 'cpu exceeded', 'error', 'timeout'])
+            stored.close()
+
+    def test_submissions_cannot_import_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            secret = os.path.join(tmp, 'secret.txt')
+            with open(secret, 'w') as f:
+                f.write("password hunter2\n")
+            store = ResultStore(os.path.join(tmp, 'results.sqlite'))
+            queue = GradingQueue(store, timeout=20)
+            queue.submit('00-checksum', f'import "{secret}"\n' + TestRandomStimulus.PARITY, name='peek', bits=4)
+            queue.submit('00-checksum', "import std\nY = XOR(X, D(Y, 0))\n", name='std', bits=4)
+            results = {result.name: result for result in queue.run()}
+            self.assertEqual(results['std'].status, 'passed')
+            self.assertNotEqual(results['peek'].status, 'passed')
+            self.assertIn("file imports are not allowed", results['peek'].output)
+            self.assertNotIn('hunter2', results['peek'].output)
+            store.close()
+
+class TestPipeline(unittest.TestCase):
+    ENCODER = "import std\nY = XOR(I, D(Y, 0))\n"
+    DECODER = "import std\nO = XOR(Y, D(Y, 0))\nC = AND(O, K)\n"
+
+    def test_stages_match_separate_runs(self):
+        inputs = circuits.random_inputs(['I', 'K'], 300, seed=4)
+        encoded = Simulator(parse_string(self.ENCODER)).run({'I': inputs['I']}, 300)
+        expected = Simulator(parse_string(self.DECODER)).run({'Y': encoded['Y'], 'K': inputs['K']}, 300)
+        for chunk_steps in (1, 7, 4096):
+            pipeline = Pipeline(chunk_steps)
+            pipeline.add_stage('enc', parse_string(self.ENCODER))
+            pipeline.add_stage('dec', parse_string(self.DECODER))
+            self.assertEqual(pipeline.stages[1].sources, {'Y': 'enc.Y', 'K': 'K'})
+            results = pipeline.run(inputs, 300, ['enc.Y', 'dec.O', 'dec.C'])
+            self.assertEqual(results, {'enc.Y': encoded['Y'], 'dec.O': expected['O'], 'dec.C': expected['C']})
+            self.assertEqual(results['dec.O'], inputs['I'])
+
+    def test_streamed_inputs_and_connections(self):
+        pipeline = Pipeline(chunk_steps=16)
+        pipeline.add_stage('enc', parse_string(self.ENCODER))
+        pipeline.add_stage('dec', parse_string(self.DECODER), {'K': 'enc.Y'})
+        bits = (i % 3 == 0 for i in range(40))
+        chunks = list(pipeline.stream({'I': bits}, 40, ['dec.O']))
+        self.assertEqual([(start, count) for start, count, _ in chunks], [(0, 16), (16, 16), (32, 8)])
+        self.assertEqual(chunks[0][2]['dec.O'], sum(1 << k for k in range(0, 16, 3)))
+        with self.assertRaises(ValueError):
+            pipeline.add_stage('bad', parse_string(self.DECODER), {'Y': 'enc.Z'})
+
+class TestBuilder(unittest.TestCase):
+    SEQUENTIAL = os.path.join(os.path.dirname(__file__), 'test_circuits', 'sequential.cir')
+
+    def test_matches_parsed_circuit(self):
+        b = CircuitBuilder()
+        i = b.input('I')
+        b.assign('O1', b.dff(i))
+        b.assign('O2', b.dff(b.signal('O1')))
+        toggle = b.dff()
+        b.drive(toggle, b.signal('Toggle'))
+        b.assign('Toggle', b.xor(toggle, i))
+        b.define_macro('MAJ', ['x', 'y', 'z'],
+                       lambda m, x, y, z: m.or_(m.and_(x, y), m.and_(z, m.or_(x, y))))
+        b.assign('M', b.call('MAJ', i, b.signal('O1'), b.signal('Toggle')))
+        circuit = b.build()
+        inputs = {'I': '0110100111'}
+        results = Simulator(circuit).run(inputs, 10)
+        expected = Simulator(parse_file(self.SEQUENTIAL)).run(inputs, 10)
+        self.assertEqual({name: results[name] for name in expected}, expected)
+        self.assertEqual(Simulator(parse_string(format_circuit(circuit))).run(inputs, 10), results)
+        # Any parsed circuit, buses included, survives a round trip through text
+        case = circuits.bus_adder(4, steps=8)
+        parsed = parse_string(case.source)
+        self.assertEqual(Simulator(parse_string(format_circuit(parsed))).run(case.inputs, 8),
+                         Simulator(parsed).run(case.inputs, 8))
+
+    def test_structural_hashing_and_shared_gates(self):
+        b = CircuitBuilder()
+        x, y = b.input('X'), b.input('Y')
+        self.assertEqual(b.nand(x, y), b.nand(y, x))
+        self.assertEqual(b.xor(x, y), b.xor(x, y))
+        acc = b.input('X0')
+        for k in range(1, 200):
+            acc = b.xor(acc, b.input(f'X{k}'))
+        b.assign('P', acc)
+        circuit = b.build()
+        # The NAND shared inside each XOR and each XOR output are named once
+        self.assertEqual(ScoringFramework().count_circuit_gates(Simulator(circuit)), {'NAND': 4 * 199, 'D': 0})
+        inputs = {f'X{k}': '1' if k % 3 else '0' for k in range(200)}
+        expected = str(sum(int(bit) for bit in inputs.values()) % 2)
+        self.assertEqual(Simulator(circuit).run(inputs, 1)['P'], expected)
+
+    def test_macro_body_reusing_gates(self):
+        b = CircuitBuilder()
+        params = [f'p{k}' for k in range(41)]
+
+        def chain(m, *ps):
+            acc = ps[0]
+            for p in ps[1:]:
+                acc = m.xor(acc, p)
+            return acc
+        b.define_macro('CHAIN', params, chain)
+        b.assign('P', b.call('CHAIN', *[b.input(f'X{k}') for k in range(41)]))
+        text = format_circuit(b.build())
+        # Shared gates are passed to generated helper macros instead of being
+        # inlined at every use, so the text grows linearly with the body
+        self.assertLess(len(text), 32 * 1024)
+        circuit = parse_string(text)
+        self.assertEqual(analyze(Simulator(circuit)).netlist_nodes, 4 * 40 + 41)
+        inputs = {f'X{k}': '1' if k % 3 else '0' for k in range(41)}
+        expected = str(sum(int(bit) for bit in inputs.values()) % 2)
+        self.assertEqual(CompiledSimulator(circuit).run(inputs, 1)['P'], expected)
+        with self.assertRaises(ValueError):
+            b.define_macro('_CHAIN_1', ['x'], lambda m, x: x)
+
+    def test_validation(self):
+        b = CircuitBuilder()
+        a = b.input('A')
+        b.assign('Y', b.not_(a))
+        with self.assertRaises(ValueError):
+            b.assign('Y', a)
+        with self.assertRaises(ValueError):
+            b.assign('A', a)
+        with self.assertRaises(ValueError):
+            b.input('_n3')
+        b.define_macro('BUF', ['x'], lambda m, x: m.not_(m.not_(x)))
+        with self.assertRaises(ValueError):
+            b.call('BUF', a, a)
+        with self.assertRaises(ValueError):
+            b.call('MISSING', a)
+        b.assign('Z', b.nand(a, b.signal('W')))
+        with self.assertRaises(ValueError):
+            b.build()
+        b.assign('W', b.dff())
+        with self.assertRaises(ValueError):
+            b.build()
+
+class TestBundle(unittest.TestCase):
+    def test_bundle_runs_without_lark(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            bundle = build_bundle(os.path.join(tmp, 'logicsim.pyz'))
+            circuit = os.path.join(tmp, 'toggle.cir')
+            with open(circuit, 'w') as f:
+                f.write("import std\nQ = NAND(I, REG(Q))\n")
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            run = lambda *command: subprocess.run([sys.executable, *command], capture_output=True,
+                                                  text=True, check=True).stdout
+            self.assertEqual(run(bundle, circuit, '-i', 'I=0110'),
+                             run(os.path.join(root, 'main.py'), circuit, '-i', 'I=0110'))
+            probe = (f"import sys; sys.path.insert(0, {bundle!r}); import circuit_parser; "
+                     "circuit_parser.parse_string('Y[1:0] = NAND(A[1:0], {B, 1})\\n'); "
+                     "print(circuit_parser.__file__.endswith('.pyc'), 'lark' in sys.modules)")
+            self.assertEqual(run('-c', probe).split(), ['True', 'False'])
+
+class TestBenchmarkCircuits(unittest.TestCase):
+    def simulate(self, case):
+        with tempfile.NamedTemporaryFile('w', suffix='.cir', delete=False) as f:
+            f.write(case.source)
+        try:
+            return Simulator(parse_file(f.name)).run(case.inputs, case.steps)
+        finally:
+            os.unlink(f.name)
+
+    def word(self, values, prefix, bits, t):
+        return sum(int(values[f"{prefix}{i}"][t]) << i for i in range(bits))
+
+    def test_adder_adds(self):
+        case = circuits.ripple_carry_adder(4, steps=16, seed=1)
+        results = self.simulate(case)
+        for t in range(case.steps):
+            a = self.word(case.inputs, 'A', 4, t)
+            b = self.word(case.inputs, 'B', 4, t)
+            self.assertEqual(self.word(results, 'S', 5, t), a + b)
+
+    def test_comparator_compares(self):
+        case = circuits.comparator(3, steps=16, seed=2)
+        results = self.simulate(case)
+        for t in range(case.steps):
+            a = self.word(case.inputs, 'A', 3, t)
+            b = self.word(case.inputs, 'B', 3, t)
+            self.assertEqual(results['GT'][t], str(int(a > b)))
+            self.assertEqual(results['EQ'][t], str(int(a == b)))
+
+    def test_counter_counts(self):
+        case = circuits.counter(3, steps=12)
+        results = self.simulate(case)
+        count = 0
+        for t, bit in enumerate(case.inputs['I']):
+            count = (count + int(bit)) % 8
+            self.assertEqual(self.word(results, 'O', 3, t), count)
+
+    def test_baseline_regressions(self):
+        baseline = {'c': {'interpreter': {'parse_s': 1.0, 'expand_s': 1.0, 'step_us': 10.0}}}
+        fast = {'c': {'interpreter': {'parse_s': 1.1, 'expand_s': 0.5, 'step_us': 10.0}}}
+        slow = {'c': {'interpreter': {'parse_s': 1.0, 'expand_s': 1.0, 'step_us': 20.0}}}
+        self.assertEqual(bench.compare_to_baseline(fast, baseline, 0.25), [])
+        regressions = bench.compare_to_baseline(slow, baseline, 0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('step_us', regressions[0])
+
+    def test_suite_runs_every_backend(self):
+        cases = [circuits.counter(2, steps=4), circuits.bus_adder(2, steps=4)]
+        results = bench.run_suite(cases, repeat=1)
+        for case in cases:
+            self.assertEqual(list(results[case.name]), list(BACKENDS))
+        self.assertIn('step_us', results['counter2']['hierarchical'])
+        self.assertIn('buses', results['bus_adder2']['hierarchical']['skipped'])
+        self.assertIn('skipped', bench.format_results(results))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,123 @@
+# File: transition_table.py
+# Simulation of small-state circuits by table lookup.
+#
+# After the first step, a step of a circuit is a function of its D-register
+# state and its input bits only. When those fit in a few bits, the
+# simulator memoizes that function: the key (state, input bits) maps to the
+# next state and the value of every signal. An entry is computed by the
+# compiled netlist on first use, and the table is kept across runs up to
+# `max_entries` entries, evicting the least recently used one when full.
+# Once the table is warm a step is a dictionary lookup, however many gates
+# the circuit has. Circuits whose state plus input bits exceed
+# `max_key_bits` are simulated gate by gate.
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from circuit_parser import Circuit
+from netlist import CompiledSimulator
+from simulator import Simulator
+
+DEFAULT_MAX_ENTRIES = 1 << 16
+MAX_KEY_BITS = 24
+_REPLAY_CHUNK = 4096
+
+
+class TransitionTableSimulator(CompiledSimulator):
+    """
+    Drop-in for CompiledSimulator whose single-lane run() looks steps up in
+    a lazily built transition table; run_packed() still evaluates the gates.
+    """
+    def __init__(self, circuit: Circuit, profile: bool = False, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_key_bits: int = MAX_KEY_BITS, simulator: Optional[Simulator] = None):
+        super().__init__(circuit, profile=profile, simulator=simulator)
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.input_names = list(self.netlist.inputs)
+        self.signal_names = list(self.netlist.signals)
+        self.key_bits = len(self.input_names) + len(self.netlist.registers)
+        self.tabulated = self.key_bits <= max_key_bits
+        # (state << input bits | input bits) -> (next state, '0'/'1' per signal and register output)
+        self._table: 'OrderedDict[int, Tuple[int, str]]' = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def entries(self) -> int:
+        return len(self._table)
+
+    def _evaluate(self, step, state: List[int], code: int) -> Tuple[List[int], str, int]:
+        """One gate-level step: (next state words, row of values, next state as bits)."""
+        words = [(code >> i) & 1 for i in range(len(self.input_names))]
+        values, state = step(words, state, 1)
+        row = "".join('1' if value else '0' for value in values)
+        return state, row, sum(bit << j for j, bit in enumerate(state))
+
+    def _input_codes(self, inputs: Dict[str, str], num_steps: int) -> List[int]:
+        """The input bits of every step, bit i being input i in netlist order; missing steps are 0."""
+        if not self.input_names:
+            return [0] * num_steps
+        columns = [inputs[name][:num_steps].ljust(num_steps, '0') for name in reversed(self.input_names)]
+        return [int("".join(bits), 2) for bits in zip(*columns)]
+
+    def _advance(self, state: int, codes: List[int], rows: List[str]) -> int:
+        """Appends the rows of the steps with input bits `codes` to `rows`; returns the final state."""
+        table, max_entries, shift = self._table, self.max_entries, len(self.input_names)
+        registers = len(self.netlist.registers)
+        for code in codes:
+            key = state << shift | code
+            entry = table.get(key)
+            if entry is None:
+                self.misses += 1
+                current = [(state >> j) & 1 for j in range(registers)]
+                _, row, next_state = self._evaluate(self._step, current, code)
+                entry = table[key] = (next_state, row)
+                if len(table) > max_entries:
+                    table.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self.hits += 1
+                table.move_to_end(key)
+            state, row = entry
+            rows.append(row)
+        return state
+
+    def _run(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+             coverage=None) -> Dict[str, str]:
+        if not self.tabulated:
+            return super()._run(inputs, num_steps, sinks=sinks, record=record, coverage=coverage)
+        self.check_inputs(inputs)
+        codes = self._input_codes(inputs, num_steps)
+        rows: List[str] = []
+        state = 0
+        observed = bool(sinks) or coverage is not None
+        # With sinks the steps are simulated in chunks, replayed to the sinks after each
+        chunk = _REPLAY_CHUNK if observed else max(num_steps, 1)
+        for start in range(0, num_steps, chunk):
+            done = len(rows)
+            if start == 0:
+                # The first step outputs the register defaults, so it is not a table entry
+                _, row, state = self._evaluate(self._first, [], codes[0])
+                rows.append(row)
+            state = self._advance(state, codes[max(start, 1):start + chunk], rows)
+            if observed:
+                self._replay(rows[done:], codes, start, sinks, coverage)
+                if not record:
+                    del rows[done:]
+        if not record:
+            return {}
+        columns = dict(zip(self.signal_names, zip(*rows))) if rows else {}
+        return {name: "".join(columns.get(name, ())) for name in self.output_names}
+
+    def _replay(self, rows: List[str], codes: List[int], start: int, sinks, coverage) -> None:
+        """Feeds steps `start`, `start + 1`, ... to the sinks and the coverage collector, as run_packed does."""
+        signals = len(self.signal_names)
+        for t, row in enumerate(rows, start):
+            code = codes[t]
+            sample = {name: (code >> i) & 1 for i, name in enumerate(self.input_names)}
+            sample.update((name, int(bit)) for name, bit in zip(self.signal_names, row))
+            for sink in sinks:
+                sink.sample(t, sample)
+            if coverage is not None:
+                coverage.sample(t, sample)
+                coverage.sample_registers(t, [int(bit) for bit in row[signals:]], 1)
@@ -0,0 +1,223 @@
+# File: unroll.py
+# Superstep simulation: the netlist unrolled over k steps.
+#
+# Every step of CompiledSimulator.run pays for a call of the step function,
+# a list of input words and one history append per signal, whatever the
+# size of the circuit. unroll_netlist() substitutes each register's
+# next-state logic into the following step k - 1 times, giving one
+# combinational function of the register state and k input frames. Nodes
+# are hash-consed across all frames and simplified on the way (constants,
+# double negation, x NAND NOT x), so logic repeated between frames (shift
+# registers, unchanged state) is built once. The generated superstep reads
+# each input as one int holding k steps (bit j = frame j) and returns one
+# such int per signal, so a run converts strings to ints once per k steps.
+#
+# k is chosen as the largest number of frames whose unrolled netlist stays
+# within `max_nodes` nodes, up to MAX_FRAMES.
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from circuit_parser import Circuit
+from netlist import CONST, INPUT, NAND, CompiledSimulator, Netlist
+from simulator import Simulator
+
+STATE = 'state'     # (STATE, register index): the register output entering the superstep
+# Unrolled inputs are (INPUT, input index, frame)
+
+MAX_FRAMES = 64
+DEFAULT_MAX_NODES = 4096
+
+
+@dataclass
+class UnrolledNetlist:
+    """The k-step function: node ids are topologically ordered."""
+    frames: int
+    nodes: List[tuple] = field(default_factory=list)
+    outputs: Dict[str, List[int]] = field(default_factory=dict)   # signal -> node of every frame
+    next_state: List[int] = field(default_factory=list)           # register -> node after the last frame
+
+
+class _Unroller:
+    def __init__(self, netlist: Netlist, signals: List[str]):
+        self.netlist = netlist
+        self.signals = signals
+        self.nodes: List[tuple] = []
+        self._table: Dict[tuple, int] = {}
+        self.zero, self.one = self._add((CONST, 0)), self._add((CONST, 1))
+        self._input_index = {node: i for i, node in enumerate(netlist.inputs.values())}
+        self._register_index = {node: r for r, node in enumerate(netlist.registers)}
+        # Register outputs of the next frame to build: the state entering the superstep
+        self._state = [self._add((STATE, r)) for r in range(len(netlist.registers))]
+        self.frames: List[List[int]] = []
+
+    def _add(self, node: tuple) -> int:
+        existing = self._table.get(node)
+        if existing is not None:
+            return existing
+        self._table[node] = len(self.nodes)
+        self.nodes.append(node)
+        return len(self.nodes) - 1
+
+    def _negated(self, a: int) -> Optional[int]:
+        """x when node a is NOT x, else None."""
+        node = self.nodes[a]
+        return node[1] if node[0] == NAND and node[1] == node[2] else None
+
+    def nand(self, a: int, b: int) -> int:
+        if a == self.zero or b == self.zero:
+            return self.one
+        if a == self.one:
+            a = b
+        elif b == self.one:
+            b = a
+        if a == b:
+            if a == self.one:
+                return self.zero
+            inner = self._negated(a)
+            if inner is not None:
+                return inner
+        elif self._negated(a) == b or self._negated(b) == a:
+            return self.one
+        a, b = min(a, b), max(a, b)
+        return self._add((NAND, a, b))
+
+    def add_frame(self) -> None:
+        """Appends one step: every netlist node of frame len(self.frames)."""
+        frame_index = len(self.frames)
+        frame: List[int] = []
+        for node_id, node in enumerate(self.netlist.nodes):
+            kind = node[0]
+            if kind == INPUT:
+                frame.append(self._add((INPUT, self._input_index[node_id], frame_index)))
+            elif kind == CONST:
+                frame.append(self.one if node[1] else self.zero)
+            elif kind == NAND:
+                frame.append(self.nand(frame[node[1]], frame[node[2]]))
+            else:
+                frame.append(self._state[self._register_index[node_id]])
+        self._state = [frame[self.netlist.nodes[r][1]] for r in self.netlist.registers]
+        self.frames.append(frame)
+
+    def result(self) -> UnrolledNetlist:
+        outputs = {name: [frame[self.netlist.signals[name]] for frame in self.frames] for name in self.signals}
+        return UnrolledNetlist(len(self.frames), list(self.nodes), outputs, list(self._state))
+
+
+def _reachable(nodes: List[tuple], roots: List[int]) -> set:
+    seen = set()
+    stack = list(roots)
+    while stack:
+        node_id = stack.pop()
+        if node_id in seen:
+            continue
+        seen.add(node_id)
+        if nodes[node_id][0] == NAND:
+            stack.extend(nodes[node_id][1:])
+    return seen
+
+
+def unroll_netlist(netlist: Netlist, frames: Optional[int] = None, signals: Optional[List[str]] = None,
+                   max_nodes: int = DEFAULT_MAX_NODES) -> UnrolledNetlist:
+    """
+    The netlist unrolled over `frames` steps after the first, or over as many
+    (up to MAX_FRAMES) as stay within `max_nodes` nodes. Only `signals`
+    (default: all) are kept as outputs.
+    """
+    unroller = _Unroller(netlist, list(netlist.signals) if signals is None else signals)
+    if frames is not None:
+        for _ in range(frames):
+            unroller.add_frame()
+        return unroller.result()
+    unroller.add_frame()
+    best = unroller.result()
+    while best.frames < MAX_FRAMES:
+        unroller.add_frame()
+        if len(unroller.nodes) > max_nodes:
+            break
+        best = unroller.result()
+    return best
+
+
+def generate_superstep_source(unrolled: UnrolledNetlist) -> str:
+    """
+    Python source for `superstep(I, S) -> (outputs, next state)` on a single
+    lane. I holds one int per input whose bit j is its value in frame j, S
+    the register bits; `outputs` holds one such int per output signal.
+    """
+    nodes = unrolled.nodes
+    live = _reachable(nodes, [node for frames in unrolled.outputs.values() for node in frames]
+                      + unrolled.next_state)
+    lines = ["def superstep(I, S):"]
+    for i in sorted(live):
+        node = nodes[i]
+        kind = node[0]
+        if kind == INPUT:
+            expr = f"I[{node[1]}] & 1" if node[2] == 0 else f"(I[{node[1]}] >> {node[2]}) & 1"
+        elif kind == STATE:
+            expr = f"S[{node[1]}]"
+        elif kind == CONST:
+            expr = str(node[1])
+        else:
+            expr = f"1 ^ (n{node[1]} & n{node[2]})"
+        lines.append(f"    n{i} = {expr}")
+    outputs = []
+    for frames in unrolled.outputs.values():
+        terms = [f"n{node}" if j == 0 else f"n{node} << {j}" for j, node in enumerate(frames)]
+        outputs.append(" | ".join(terms) or "0")
+    next_state = ", ".join(f"n{node}" for node in unrolled.next_state)
+    lines.append(f"    return ({''.join(f'{out}, ' for out in outputs)}), [{next_state}]")
+    return "\n".join(lines) + "\n"
+
+
+def build_superstep(unrolled: UnrolledNetlist):
+    namespace = {}
+    exec(compile(generate_superstep_source(unrolled), '<unrolled>', 'exec'), namespace)
+    return namespace['superstep']
+
+
+class UnrolledSimulator(CompiledSimulator):
+    """
+    Drop-in for CompiledSimulator whose single-lane run() advances `frames`
+    steps per call of an unrolled superstep; run_packed() and runs with
+    sinks or coverage step one at a time.
+    """
+    def __init__(self, circuit: Circuit, profile: bool = False, frames: Optional[int] = None,
+                 max_nodes: int = DEFAULT_MAX_NODES, simulator: Optional[Simulator] = None):
+        super().__init__(circuit, profile=profile, simulator=simulator)
+        if frames is not None and frames <= 0:
+            raise ValueError("frames must be positive")
+        self.outputs = [name for name in self.netlist.signals if name in set(self.output_names)]
+        with self._phase('compile'):
+            self.unrolled = unroll_netlist(self.netlist, frames, self.outputs, max_nodes)
+            self._superstep = build_superstep(self.unrolled)
+        self.frames = self.unrolled.frames
+
+    def _run(self, inputs: Dict[str, str], num_steps: int, sinks=(), record: bool = True,
+             coverage=None) -> Dict[str, str]:
+        if sinks or coverage is not None or num_steps <= self.frames:
+            return super()._run(inputs, num_steps, sinks=sinks, record=record, coverage=coverage)
+        self.check_inputs(inputs)
+        if not record:
+            return {}
+        sequences = [inputs[name] for name in self.netlist.inputs]
+        # Step 0 outputs the register defaults, then supersteps of k frames
+        values, state = self._first([1 if seq[:1] == '1' else 0 for seq in sequences], [], 1)
+        signal_index = {name: i for i, name in enumerate(self.netlist.signals)}
+        parts = {name: ['1' if values[signal_index[name]] else '0'] for name in self.outputs}
+        columns = [parts[name] for name in self.outputs]
+        k, superstep = self.frames, self._superstep
+        t = 1
+        while t + k <= num_steps:
+            words = [int(seq[t:t + k][::-1] or '0', 2) for seq in sequences]
+            outputs, state = superstep(words, state)
+            for column, output in zip(columns, outputs):
+                column.append(format(output, f'0{k}b')[::-1])
+            t += k
+        # The last steps that do not fill a superstep
+        for t in range(t, num_steps):
+            words = [1 if seq[t:t + 1] == '1' else 0 for seq in sequences]
+            values, state = self._step(words, state, 1)
+            for name, column in zip(self.outputs, columns):
+                column.append('1' if values[signal_index[name]] else '0')
+        return {name: "".join(parts[name]) if name in parts else '' for name in self.output_names}
@@ -0,0 +1,350 @@
+# File: waveform.py
+# Streaming waveform writers used as Simulator.run sinks, and random access
+# to packed waveform files.
+#
+# Both writers receive one sample per simulated step and write their output
+# incrementally through a buffer that is flushed in chunks, so memory stays
+# bounded no matter how many steps are simulated. PackedWaveform memory-maps
+# a packed file, finished or still being written, and reads only the chunks
+# a query touches.
+#
+#   python waveform.py run.lsw -s O0 --window 1000000:1000064
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, Optional
+
+# --- Packed waveform format ---
+# header:  MAGIC, u8 version, u8 reserved, u16 reserved, u32 signal count,
+#          u32 steps per chunk, then each name as u16 length + UTF-8 bytes
+# chunks:  for every chunk of CHUNK steps, an index of two bitmaps of
+#          ceil(signals/8) bytes (bit i set if signal i is 1, resp. 0, at
+#          some step of the chunk; version 2 only), then one column of
+#          CHUNK/8 bytes per signal (bit k of the column is the value at step
+#          chunk_start + k, least significant bit first); the last chunk is
+#          zero padded
+# trailer: u64 total steps, END_MAGIC
+# Every chunk has the same size, so the column for any (signal, chunk) is at a
+# computable offset and can be read without scanning the file. A file without
+# trailer (a run still going, or interrupted) holds its complete chunks.
+PACKED_MAGIC = b'LSWF'
+PACKED_END_MAGIC = b'LSWE'
+PACKED_VERSION = 2
+_READABLE_VERSIONS = (1, 2)
+_HEADER = struct.Struct('<4sBBHII')
+_TRAILER = struct.Struct('<Q4s')
+
+
+class WaveformError(Exception):
+    """Raised for malformed or unsupported waveform files."""
+    pass
+
+
+class VCDWriter:
+    """
+    Writes a Value Change Dump readable by standard waveform viewers. One
+    simulation step is one `timescale` unit and only value changes are written.
+    """
+    def __init__(self, path: str, signals: List[str], timescale: str = '1ns',
+                 buffer_size: int = 1 << 16):
+        self.path = path
+        self.signals = list(signals)
+        self.buffer_size = buffer_size
+        self._file = open(path, 'w')
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._ids = [self._identifier(i) for i in range(len(self.signals))]
+        self._last = [None] * len(self.signals)
+        self._steps = 0
+
+        header = [f"$timescale {timescale} $end", "$scope module top $end"]
+        for ident, name in zip(self._ids, self.signals):
+            header.append(f"$var wire 1 {ident} {name} $end")
+        header += ["$upscope $end", "$enddefinitions $end", ""]
+        self._write("\n".join(header))
+
+    @staticmethod
+    def _identifier(index: int) -> str:
+        """VCD short identifiers drawn from the printable ASCII range."""
+        chars = []
+        while True:
+            index, rem = divmod(index, 94)
+            chars.append(chr(33 + rem))
+            if index == 0:
+                return "".join(chars)
+            index -= 1
+
+    def _write(self, text: str) -> None:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.write("".join(self._buffer))
+        self._buffer.clear()
+        self._buffered = 0
+
+    def sample(self, t: int, state: Dict[str, int]) -> None:
+        """Records the values of all traced signals at step `t`."""
+        changes = []
+        last = self._last
+        for i, name in enumerate(self.signals):
+            value = state.get(name)
+            if value != last[i]:
+                last[i] = value
+                changes.append(f"{'x' if value is None else value}{self._ids[i]}")
+        if t == 0:
+            self._write("#0\n$dumpvars\n" + "".join(c + "\n" for c in changes) + "$end\n")
+        elif changes:
+            self._write(f"#{t}\n" + "".join(c + "\n" for c in changes))
+        self._steps = t + 1
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._write(f"#{self._steps}\n")
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PackedWaveformWriter:
+    """
+    Writes signals as packed bit columns, one bit per step, in fixed-size
+    chunks of `chunk_steps` steps (a multiple of 8).
+    """
+    def __init__(self, path: str, signals: List[str], chunk_steps: int = 4096):
+        if chunk_steps <= 0 or chunk_steps % 8:
+            raise ValueError("chunk_steps must be a positive multiple of 8")
+        self.path = path
+        self.signals = list(signals)
+        self.chunk_steps = chunk_steps
+        self._file = open(path, 'wb')
+        self._columns = [0] * len(self.signals)
+        self._offset = 0   # step index within the current chunk
+        self._steps = 0
+
+        header = bytearray(_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, 0, 0,
+                                        len(self.signals), chunk_steps))
+        for name in self.signals:
+            encoded = name.encode('utf-8')
+            header += struct.pack('<H', len(encoded)) + encoded
+        self._file.write(header)
+
+    def sample(self, t: int, state: Dict[str, int]) -> None:
+        """Records the values of all traced signals at step `t`."""
+        offset = self._offset
+        columns = self._columns
+        for i, name in enumerate(self.signals):
+            if state.get(name):
+                columns[i] |= 1 << offset
+        self._offset = offset + 1
+        self._steps = t + 1
+        if self._offset == self.chunk_steps:
+            self._flush_chunk()
+
+    def _flush_chunk(self) -> None:
+        width = self.chunk_steps // 8
+        full = (1 << self._offset) - 1
+        ones = zeros = 0
+        for i, column in enumerate(self._columns):
+            if column:
+                ones |= 1 << i
+            if column != full:
+                zeros |= 1 << i
+        index_width = _index_width(len(self.signals))
+        self._file.write(ones.to_bytes(index_width, 'little') + zeros.to_bytes(index_width, 'little')
+                         + b"".join(column.to_bytes(width, 'little') for column in self._columns))
+        self._columns = [0] * len(self.signals)
+        self._offset = 0
+
+    def flush(self) -> None:
+        """Makes the complete chunks written so far visible to readers."""
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        if self._offset:
+            self._flush_chunk()
+        self._file.write(_TRAILER.pack(self._steps, PACKED_END_MAGIC))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _index_width(count: int) -> int:
+    """Bytes of each of the two index bitmaps of a chunk."""
+    return (count + 7) // 8
+
+
+def read_packed_header(f):
+    """
+    Reads the header of an open packed waveform file.
+    Returns (signals, chunk_steps, data_offset).
+    """
+    signals, chunk_steps, data_offset, _ = _read_header(f)
+    return signals, chunk_steps, data_offset
+
+
+def _read_header(f):
+    raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise WaveformError("File is too short to be a packed waveform")
+    magic, version, _, _, count, chunk_steps = _HEADER.unpack(raw)
+    if magic != PACKED_MAGIC:
+        raise WaveformError("Not a packed waveform file")
+    if version not in _READABLE_VERSIONS:
+        raise WaveformError(f"Unsupported packed waveform version {version}")
+    signals = []
+    for _ in range(count):
+        (length,) = struct.unpack('<H', f.read(2))
+        signals.append(f.read(length).decode('utf-8'))
+    return signals, chunk_steps, f.tell(), version
+
+
+class PackedWaveform:
+    """
+    Random access to a packed waveform file through a read-only memory map:
+    queries read only the columns of the chunks they cover, so files much
+    larger than memory can be analysed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.signals, self.chunk_steps, self._data_offset, self.version = _read_header(self._file)
+            size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        self._index = {name: i for i, name in enumerate(self.signals)}
+        self._width = self.chunk_steps // 8
+        self._index_width = _index_width(len(self.signals)) if self.version >= 2 else 0
+        self._record = 2 * self._index_width + len(self.signals) * self._width
+        data = size - self._data_offset
+        trailer = self._map[size - _TRAILER.size:] if data >= _TRAILER.size else b''
+        if len(trailer) == _TRAILER.size and trailer[-4:] == PACKED_END_MAGIC \
+                and (data - _TRAILER.size) % max(self._record, 1) == 0:
+            self.steps = _TRAILER.unpack(trailer)[0]
+            self.complete = True
+        else:
+            self.steps = (data // self._record) * self.chunk_steps if self._record else 0
+            self.complete = False
+        self.chunks = -(-self.steps // self.chunk_steps)
+
+    def _signal(self, name: str) -> int:
+        if name not in self._index:
+            raise KeyError(f"Signal '{name}' is not in {self.path}")
+        return self._index[name]
+
+    def _column(self, signal: int, chunk: int) -> int:
+        start = self._data_offset + chunk * self._record + 2 * self._index_width + signal * self._width
+        return int.from_bytes(self._map[start:start + self._width], 'little')
+
+    def _chunk_has(self, signal: int, chunk: int, value: int) -> bool:
+        """Whether the signal takes `value` somewhere in the chunk, from its index."""
+        if not self._index_width:
+            return True
+        start = self._data_offset + chunk * self._record + (0 if value else self._index_width)
+        return bool(self._map[start + signal // 8] >> (signal % 8) & 1)
+
+    def window(self, name: str, t0: int, t1: int) -> str:
+        """The values of a signal at steps t0 <= t < t1 as a '0'/'1' string."""
+        signal = self._signal(name)
+        if not 0 <= t0 <= t1 <= self.steps:
+            raise IndexError(f"Window {t0}:{t1} is outside the {self.steps} recorded steps")
+        parts = []
+        for chunk in range(t0 // self.chunk_steps, -(-t1 // self.chunk_steps)):
+            start = chunk * self.chunk_steps
+            bits = format(self._column(signal, chunk), f'0{self.chunk_steps}b')[::-1]
+            parts.append(bits[max(t0 - start, 0):t1 - start])
+        return "".join(parts)
+
+    def value(self, name: str, t: int) -> int:
+        """The value of a signal at step t."""
+        if not 0 <= t < self.steps:
+            raise IndexError(f"Step {t} is outside the {self.steps} recorded steps")
+        chunk, bit = divmod(t, self.chunk_steps)
+        return self._column(self._signal(name), chunk) >> bit & 1
+
+    def find(self, name: str, value: int, start: int = 0) -> Optional[int]:
+        """The first step >= start at which the signal has `value`, or None; skips chunks by their index."""
+        signal = self._signal(name)
+        for chunk in range(start // self.chunk_steps, self.chunks):
+            if not self._chunk_has(signal, chunk, value):
+                continue
+            column = self._column(signal, chunk)
+            if not value:
+                column ^= (1 << self.chunk_steps) - 1
+            column &= ~((1 << max(start - chunk * self.chunk_steps, 0)) - 1)
+            if column:
+                t = chunk * self.chunk_steps + (column & -column).bit_length() - 1
+                return t if t < self.steps else None
+        return None
+
+    def read(self) -> Dict[str, str]:
+        """Every signal over all recorded steps."""
+        return {name: self.window(name, 0, self.steps) for name in self.signals}
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._map.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_packed_waveform(path: str) -> Dict[str, str]:
+    """Decodes a whole packed waveform file into '0'/'1' strings per signal."""
+    with PackedWaveform(path) as waveform:
+        if not waveform.complete:
+            raise WaveformError("Packed waveform is truncated (missing trailer)")
+        return waveform.read()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect a packed waveform file.")
+    parser.add_argument('path', help='Packed waveform (.lsw) file')
+    parser.add_argument('-s', '--signal', action='append', metavar='SIGNAL',
+                        help='Signal to show; can be repeated (default: all)')
+    parser.add_argument('--window', metavar='T0:T1', help='Steps to show (default: the first 64)')
+    args = parser.parse_args(argv)
+
+    try:
+        with PackedWaveform(args.path) as waveform:
+            state = "" if waveform.complete else ", incomplete"
+            print(f"{args.path}: {len(waveform.signals)} signals, {waveform.steps} steps "
+                  f"in {waveform.chunks} chunks of {waveform.chunk_steps}{state}")
+            if args.window:
+                t0, t1 = (int(part) for part in args.window.split(':'))
+            else:
+                t0, t1 = 0, min(64, waveform.steps)
+            for name in args.signal or waveform.signals:
+                print(f"  {f'{name}:'.ljust(6)} {waveform.window(name, t0, t1)}")
+    except (OSError, ValueError, KeyError, IndexError, WaveformError) as e:
+        print(f"{type(e).__name__}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -561,45 +561,64 @@ if (window.appInitialized) {
             const pyodide = await loadPyodide({
                 indexURL: 'https://cdn.jsdelivr.net/pyodide/v0.25.1/full/'
             });
-            log('Installing lark via micropip...');
-            await pyodide.loadPackage('micropip');
-            await pyodide.runPythonAsync(`import micropip; await micropip.install('lark-parser')`);
-            log('Fetching project sources...');
-
-            async function fetchText(path) {
-                const r = await fetch(path);
-                if (!r.ok) throw new Error('fetch failed ' + path);
-                return await r.text();
+            // The prebuilt bundle (python bundle.py) holds every module as
+            // bytecode plus a standalone parser, so it is one download and
+            // needs neither lark nor per-file fetches.
+            let bundled = false;
+            try {
+                const r = await fetchWithPagesFallback('dist/logicsim.pyz');
+                if (r.ok) {
+                    pyodide.FS.writeFile('logicsim.pyz', new Uint8Array(await r.arrayBuffer()));
+                    pyodide.runPython(`import sys; sys.path.insert(0, 'logicsim.pyz')`);
+                    log('Loaded prebuilt bundle dist/logicsim.pyz');
+                    bundled = true;
+                }
+            } catch (e) {
+                log('No prebuilt bundle, loading sources');
             }
 
-            // Load project files using the same base logic
-            const rootPrefix = basePrefix;
-            const files = ['circuit_parser.py', 'simulator.py', 'grammar.lark', 'scoring_framework.py'];
-            for (const f of files) {
-                let ok = false;
-                try {
-                    const path = buildUrl(f);
-                    const txt = await fetchText(path);
-                    pyodide.FS.writeFile(f, txt);
-                    log('Loaded ' + f + ' from ' + path);
-                    ok = true;
-                } catch (e) {
-                    log('FAILED to load ' + f + ' (adjust paths if hosting structure differs)');
+            if (!bundled) {
+                log('Installing lark via micropip...');
+                await pyodide.loadPackage('micropip');
+                await pyodide.runPythonAsync(`import micropip; await micropip.install('lark')`);
+                log('Fetching project sources...');
+
+                async function fetchText(path) {
+                    const r = await fetch(path);
+                    if (!r.ok) throw new Error('fetch failed ' + path);
+                    return await r.text();
+                }
+
+                // Load project files using the same base logic
+                const files = ['circuit_parser.py', 'buses.py', 'simulator.py', 'incremental.py', 'netlist.py',
+                               'circuit_coverage.py', 'library.py', 'grammar.lark', 'scoring_framework.py',
+                               'stdlib/std.cir'];
+                pyodide.FS.mkdir('stdlib');
+                for (const f of files) {
+                    try {
+                        const path = buildUrl(f);
+                        const txt = await fetchText(path);
+                        pyodide.FS.writeFile(f, txt);
+                        log('Loaded ' + f + ' from ' + path);
+                    } catch (e) {
+                        log('FAILED to load ' + f + ' (adjust paths if hosting structure differs)');
+                    }
                 }
             }
 
             // Provide a lightweight wrapper for simulate in Python
             await pyodide.runPythonAsync(`
 import json
-from circuit_parser import parse_file
-from simulator import Simulator
+from circuit_parser import parse_string
+from incremental import IncrementalCompiler
+
+# Kept across edits so only changed statements are re-expanded
+_compiler = IncrementalCompiler()
 
 def simulate_inline(code:str, inputs:dict, steps:int):
     try:
-        with open('_inline.cir','w') as f:
-            f.write(code)
-        circuit = parse_file('_inline.cir')
-        sim = Simulator(circuit)
+        circuit = parse_string(code)
+        sim = _compiler.update(circuit)
         outputs = sim.run(inputs, steps)
         result = {'outputs': outputs, 'history': sim.history}
         return json.dumps(result)
@@ -620,8 +639,8 @@ def simulate_inline(code:str, inputs:dict, steps:int):
             }
             editor.clearGutter("syntax-errors");
             try {
-                pyodide.FS.writeFile('_inline.cir', code);
-                await pyodide.runPythonAsync(`from circuit_parser import parse_file\nparse_file('_inline.cir')`);
+                pyodide.globals.set('_inline_code', code);
+                await pyodide.runPythonAsync(`from circuit_parser import parse_string\nparse_string(_inline_code)`);
             } catch (e) {
                 let fullMsg = (e && e.message) ? String(e.message) : String(e);
                 let lineColMatch = fullMsg.match(/at Line (\d+), Column (\d+)|line (\d+) col (\d+)/);